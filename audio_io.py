@@ -0,0 +1,127 @@
+"""
+Shared audio loader for the asset scripts.
+
+Reads through soundfile with frame-offset seeks, so a 2.5s window or the last
+5s of a file is read without decoding the rest. Resampling only happens when
+the requested rate differs from the file's native rate (all assets are 16 kHz
+already). Decoded arrays are kept in a small in-process LRU, so a file (or
+window) requested by several stages of the same run is decoded once. With a
+process pool, the cache is per worker process.
+
+Returned arrays are shared with the cache and therefore read-only; copy
+before modifying in place.
+"""
+
+import os
+from collections import OrderedDict
+
+import numpy as np
+import soundfile as sf
+
+from profiling import stage
+
+CACHE_SIZE = 64
+
+_cache = OrderedDict()
+
+
+def _file_key(path):
+    st = os.stat(path)
+    return (os.path.abspath(path), st.st_mtime_ns, st.st_size)
+
+
+def _cache_get(key):
+    if key in _cache:
+        _cache.move_to_end(key)
+        return _cache[key]
+    return None
+
+
+def _cache_put(key, value):
+    _cache[key] = value
+    _cache.move_to_end(key)
+    while len(_cache) > CACHE_SIZE:
+        _cache.popitem(last=False)
+
+
+def clear_cache():
+    """Drop all cached decodes."""
+    _cache.clear()
+
+
+def _read_frames(path, start, frames):
+    """Decode frames [start, start + frames) as mono float32 (frames=-1 reads to the end)."""
+    with stage('decode', path=path), sf.SoundFile(path) as f:
+        start = min(start, f.frames)
+        if start:
+            f.seek(start)
+        y = f.read(frames, dtype='float32', always_2d=True)
+        sr = f.samplerate
+    # Downmix like librosa.load(mono=True)
+    y = y[:, 0] if y.shape[1] == 1 else y.mean(axis=1)
+    return np.ascontiguousarray(y, dtype=np.float32), sr
+
+
+def _decode(path, start=0, frames=-1):
+    """Cached native-rate decode of a frame window."""
+    file_key = _file_key(path)
+    full = _cache_get((file_key, 0, -1))
+    if full is not None:
+        y, sr = full
+        stop = len(y) if frames < 0 else start + frames
+        return y[start:stop], sr
+
+    key = (file_key, start, frames)
+    hit = _cache_get(key)
+    if hit is not None:
+        return hit
+    y, sr = _read_frames(path, start, frames)
+    y.setflags(write=False)
+    _cache_put(key, (y, sr))
+    return y, sr
+
+
+def _resample(y, orig_sr, target_sr):
+    if target_sr is None or target_sr == orig_sr:
+        return y, orig_sr
+    import librosa
+    with stage('resample', orig_sr=orig_sr, target_sr=target_sr):
+        return librosa.resample(y, orig_sr=orig_sr, target_sr=target_sr), target_sr
+
+
+def audio_info(path):
+    """(native sample rate, number of frames) without decoding."""
+    info = sf.info(path)
+    return info.samplerate, info.frames
+
+
+def load_audio(path, sr=None, offset=0.0, duration=None):
+    """
+    Load mono float32 audio, like librosa.load(path, sr=sr, offset=offset, duration=duration).
+
+    sr=None keeps the native sample rate. offset/duration are in seconds.
+    """
+    native_sr, _ = audio_info(path)
+    start = int(offset * native_sr)
+    frames = -1 if duration is None else int(duration * native_sr)
+    y, native_sr = _decode(path, start, frames)
+    return _resample(y, native_sr, sr)
+
+
+def _last_seconds_frames(path, seconds):
+    native_sr, total = audio_info(path)
+    start = max(0, total - int(native_sr * seconds))
+    return native_sr, start, total - start
+
+
+def last_seconds_span(path, seconds):
+    """(offset, duration) in seconds of the window load_last_seconds reads."""
+    native_sr, start, frames = _last_seconds_frames(path, seconds)
+    return start / native_sr, frames / native_sr
+
+
+def load_last_seconds(path, seconds, sr=None):
+    """Load only the last `seconds` of a file (the whole file if it is shorter)."""
+    _, start, frames = _last_seconds_frames(path, seconds)
+    y, native_sr = _decode(path, start, frames)
+    return _resample(y, native_sr, sr)
@@ -0,0 +1,96 @@
+"""
+Process-pool batch runner shared by the asset generation scripts.
+
+Every job is an argument tuple for a single module-level function (so it can be
+pickled into a worker process). Jobs are independent: each one writes its own
+output file, which is why running them in parallel produces exactly the same
+files as running them one after another.
+"""
+
+import os
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from profiling import stage
+
+
+def default_jobs():
+    """Number of worker processes to use when --jobs is not given."""
+    return os.cpu_count() or 1
+
+
+def _call(func, args):
+    """Run one job and turn any exception into a printable traceback string."""
+    start = time.perf_counter()
+    try:
+        with stage(func.__name__, job=_describe(args)):
+            result = func(*args)
+        return result, None, time.perf_counter() - start
+    except Exception:
+        return None, traceback.format_exc(), time.perf_counter() - start
+
+
+def _describe(args):
+    """Short label for a job, used in progress lines (the output path when present)."""
+    if len(args) > 1 and isinstance(args[1], str):
+        return args[1]
+    return str(args[0]) if args else '<job>'
+
+
+def run_batch(func, jobs, n_jobs=None, title=None):
+    """
+    Run func(*job) for every job tuple, fanning out over n_jobs processes.
+
+    n_jobs=1 runs the jobs serially in this process. Progress is reported as
+    each job finishes; a failing job is reported with its traceback and does
+    not stop the remaining jobs.
+
+    Returns a list of (job, result, error) in the same order as jobs, where
+    error is None on success and the formatted traceback otherwise.
+    """
+    jobs = [tuple(job) for job in jobs]
+    total = len(jobs)
+    if total == 0:
+        if title:
+            print(f"✓ {title}: nothing to do")
+        return []
+    n_jobs = max(1, min(n_jobs or default_jobs(), total))
+    outcomes = [None] * total
+
+    if title:
+        print(f"\n{title}: {total} jobs on {n_jobs} worker(s)")
+
+    def report(done, idx, error, elapsed):
+        label = _describe(jobs[idx])
+        if error is None:
+            print(f"[{done}/{total}] ✓ {label} ({elapsed:.2f}s)")
+        else:
+            print(f"[{done}/{total}] ✗ {label} failed:\n{error}")
+
+    if n_jobs == 1:
+        for idx, args in enumerate(jobs):
+            result, error, elapsed = _call(func, args)
+            outcomes[idx] = (args, result, error)
+            report(idx + 1, idx, error, elapsed)
+    else:
+        with ProcessPoolExecutor(max_workers=n_jobs) as pool:
+            futures = {pool.submit(_call, func, args): idx for idx, args in enumerate(jobs)}
+            for done, future in enumerate(as_completed(futures), start=1):
+                idx = futures[future]
+                try:
+                    result, error, elapsed = future.result()
+                except Exception:
+                    # The worker itself died (e.g. killed or unpicklable result)
+                    result, error, elapsed = None, traceback.format_exc(), 0.0
+                outcomes[idx] = (jobs[idx], result, error)
+                report(done, idx, error, elapsed)
+
+    failed = [o for o in outcomes if o[2] is not None]
+    if failed:
+        print(f"✗ {len(failed)} of {total} jobs failed:")
+        for args, _, _ in failed:
+            print(f"  - {_describe(args)}")
+    elif title:
+        print(f"✓ {title}: all {total} jobs done")
+    return outcomes
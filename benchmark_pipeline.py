@@ -0,0 +1,297 @@
+"""
+Stage-level benchmarks of the asset pipeline.
+
+    python benchmark_pipeline.py run -o bench_before.json
+    python benchmark_pipeline.py run -o bench_after.json
+    python benchmark_pipeline.py compare bench_before.json bench_after.json
+
+run times every stage on its own, on deterministic synthetic fixtures written
+to a temporary directory: a 10 s drum-like clip (kick / snare / hi-hat / crash
+voices at 120 BPM, seeded noise) and the matching General MIDI drum file. Each
+stage gets its inputs precomputed, one untimed warm-up call and --repeat timed
+calls; the median, min and every run are saved as JSON together with the
+Python / library versions and CPU count.
+
+    decode                audio_io.load_audio (decode cache cleared per call)
+    decode_librosa        librosa.load, for reference
+    stft                  batched dB STFT of generate_spectrograms
+    mel                   log-mel of the video segments (visualize_spectograms)
+    spectrogram_matplotlib  generate_spectrograms.render_spectrogram (specshow + savefig)
+    spectrogram_raster    direct colormap lookup (colorize)
+    png_encode            save_png of the raster spectrogram
+    frame_matplotlib      FrameRenderer, matplotlib path, with MIDI onset overlay
+    frame_raster          FrameRenderer, raster path, with MIDI onset overlay
+    pianoroll_matplotlib  generate_midi_pianoroll.generate_piano_roll
+    pianoroll_raster      generate_midi_pianoroll.render_piano_roll_raster
+    video_encode          ffmpeg_render.render_sections_video, two 1 s 1080p sections
+
+compare reports the change of every stage's median and exits with status 1 if
+any stage got slower by more than --threshold (relative) and --min-delta
+(absolute seconds, so sub-millisecond jitter is not flagged).
+
+Everything runs offline on the CPU; matplotlib uses the Agg backend.
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import statistics
+import tempfile
+import time
+import warnings
+
+import numpy as np
+
+SR = 16000
+FIXTURE_SECONDS = 10.0
+FIXTURE_BPM = 120
+DEFAULT_REPEAT = 5
+DEFAULT_THRESHOLD = 0.10
+DEFAULT_MIN_DELTA = 0.005  # seconds
+RESULTS_VERSION = 1
+
+# (step in 16ths, General MIDI pitch, base velocity) of one bar
+DRUM_PATTERN = (
+    [(0, 36, 110), (8, 36, 100), (10, 36, 80), (4, 38, 105), (12, 38, 110), (14, 46, 70)]
+    + [(step, 42, 60 + 20 * (step % 4 == 0)) for step in range(0, 16, 2) if step != 14]
+)
+CRASH = (49, 100)  # on the first beat of every fourth bar
+
+
+# ==========================================
+# Fixtures
+# ==========================================
+
+def _voice(pitch, sr, rng):
+    """One drum hit: a pitched decaying sine sweep (kick), noise + tone (snare) or filtered noise."""
+    if pitch == 36:
+        t = np.arange(int(0.25 * sr)) / sr
+        freq = 50 + 100 * np.exp(-t * 30)
+        return np.sin(2 * np.pi * np.cumsum(freq) / sr) * np.exp(-t * 12)
+    if pitch == 38:
+        t = np.arange(int(0.2 * sr)) / sr
+        return 0.6 * rng.standard_normal(len(t)) * np.exp(-t * 25) + 0.5 * np.sin(2 * np.pi * 180 * t) * np.exp(-t * 20)
+    decay, seconds = {42: (80, 0.05), 46: (12, 0.3), 49: (3, 1.5)}[pitch]
+    t = np.arange(int(seconds * sr)) / sr
+    noise = np.diff(rng.standard_normal(len(t) + 1))  # first difference: high-passed noise
+    return 0.3 * noise * np.exp(-t * decay)
+
+
+def synth_drums(seconds=FIXTURE_SECONDS, sr=SR, bpm=FIXTURE_BPM, seed=0):
+    """Deterministic drum-like audio and its notes [(time, pitch, velocity)]."""
+    rng = np.random.default_rng(seed)
+    sixteenth = 60.0 / bpm / 4
+    bar = 16 * sixteenth
+    notes = []
+    for b in range(int(np.ceil(seconds / bar))):
+        if b % 4 == 0:
+            notes.append((b * bar, CRASH[0], CRASH[1]))
+        for step, pitch, velocity in DRUM_PATTERN:
+            jitter = int(rng.integers(-8, 9))
+            notes.append((b * bar + step * sixteenth, pitch, int(np.clip(velocity + jitter, 1, 127))))
+    notes = sorted(n for n in notes if n[0] < seconds)
+
+    y = np.zeros(int(seconds * sr) + sr)
+    for time_s, pitch, velocity in notes:
+        hit = _voice(pitch, sr, rng) * (velocity / 127)
+        start = int(time_s * sr)
+        y[start:start + len(hit)] += hit
+    y = y[:int(seconds * sr)]
+    return (0.9 * y / np.max(np.abs(y))).astype(np.float32), notes
+
+
+def write_fixtures(directory, seed=0):
+    """Write drums.wav and drums.mid into directory; returns their paths."""
+    import pretty_midi
+    import soundfile as sf
+
+    y, notes = synth_drums(seed=seed)
+    wav_path = os.path.join(directory, 'drums.wav')
+    sf.write(wav_path, y, SR, subtype='PCM_16')
+
+    midi = pretty_midi.PrettyMIDI(initial_tempo=FIXTURE_BPM)
+    drums = pretty_midi.Instrument(program=0, is_drum=True, name='Drums')
+    drums.notes = [pretty_midi.Note(velocity=v, pitch=p, start=t, end=t + 0.1) for t, p, v in notes]
+    midi.instruments.append(drums)
+    midi_path = os.path.join(directory, 'drums.mid')
+    midi.write(midi_path)
+    return wav_path, midi_path
+
+
+# ==========================================
+# Stages
+# ==========================================
+
+def build_stages(tmp, wav_path, midi_path):
+    """[(name, zero-argument callable)] of every stage, with their inputs precomputed."""
+    import matplotlib
+    matplotlib.use('Agg')
+    import librosa
+
+    import generate_midi_pianoroll as pianoroll
+    import generate_spectrograms as spectrograms
+    import visualize_spectograms as video
+    from audio_io import clear_cache, load_audio
+    from ffmpeg_render import render_sections_video, sawtooth_cursor_x
+    from midi_onsets import window_onsets
+    from spectrogram import stft_db_grouped
+    from spectrogram_raster import colorize, save_png
+
+    y, sr = load_audio(wav_path)
+    S_db = stft_db_grouped([y], n_fft=spectrograms.N_FFT, hop_length=spectrograms.HOP_LENGTH)[0]
+    duration = len(y) / sr
+    size = (int(round(spectrograms.figure_width_inches(duration) * spectrograms.DPI)),
+            spectrograms.FIG_HEIGHT_IN * spectrograms.DPI)
+    image = colorize(S_db, size, y_axis='log', sr=sr, n_fft=spectrograms.N_FFT, cmap=spectrograms.COLORMAP)
+
+    config = video.VizConfig()
+    segment = np.asarray(y[:int(config.DURATION_PER_CLIP * sr)])
+    mel_db = video.AudioEngine.compute_mel_spectrogram(segment, sr, config)
+    onsets = window_onsets(midi_path, 0.0, config.DURATION_PER_CLIP)
+
+    def frame(renderer):
+        config.RENDERER = renderer
+        return video.FrameRenderer(config).render_spectrogram_image(mel_db, 'Benchmark', onsets)
+
+    config.RENDERER = 'raster'
+    frame_image = frame('raster')
+    out = lambda name: os.path.join(tmp, name)
+
+    def decode():
+        clear_cache()
+        load_audio(wav_path)
+
+    return [
+        ('decode', decode),
+        ('decode_librosa', lambda: librosa.load(wav_path, sr=None)),
+        ('stft', lambda: stft_db_grouped([y], n_fft=spectrograms.N_FFT, hop_length=spectrograms.HOP_LENGTH)),
+        ('mel', lambda: video.AudioEngine.compute_mel_spectrogram(segment, sr, config)),
+        ('spectrogram_matplotlib',
+         lambda: spectrograms.render_spectrogram(S_db, sr, out('spec_mpl.png'), duration, tiles=False)),
+        ('spectrogram_raster',
+         lambda: colorize(S_db, size, y_axis='log', sr=sr, n_fft=spectrograms.N_FFT, cmap=spectrograms.COLORMAP)),
+        ('png_encode', lambda: save_png(image, out('spec_raster.png'))),
+        ('frame_matplotlib', lambda: frame('matplotlib')),
+        ('frame_raster', lambda: frame('raster')),
+        ('pianoroll_matplotlib', lambda: pianoroll.generate_piano_roll(midi_path, out('roll_mpl.png'))),
+        ('pianoroll_raster', lambda: pianoroll.render_piano_roll_raster(midi_path, out('roll_raster.png'))),
+        ('video_encode', lambda: render_sections_video(
+            [(frame_image, 1.0), (frame_image, 1.0)], y[:2 * sr], sr, out('video.mp4'),
+            cursor_x=sawtooth_cursor_x(frame_image.shape[1], 1.0), fps=config.FPS)),
+    ]
+
+
+def time_stage(fn, repeat=DEFAULT_REPEAT, warmup=1):
+    """Wall-clock seconds of repeat calls of fn, after warmup untimed calls (stage output and warnings silenced)."""
+    runs = []
+    with contextlib.redirect_stdout(io.StringIO()), warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        for _ in range(warmup):
+            fn()
+        for _ in range(repeat):
+            start = time.perf_counter()
+            fn()
+            runs.append(time.perf_counter() - start)
+    return runs
+
+
+def machine_info():
+    import librosa
+    import matplotlib
+    return {'python': platform.python_version(), 'platform': platform.platform(),
+            'processor': platform.processor(), 'cpu_count': os.cpu_count(),
+            'numpy': np.__version__, 'librosa': librosa.__version__, 'matplotlib': matplotlib.__version__}
+
+
+def run_benchmarks(repeat=DEFAULT_REPEAT, only=None, seed=0):
+    """Benchmark results document (see the module docstring)."""
+    results = {'version': RESULTS_VERSION, 'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+               'repeat': repeat, 'seed': seed, 'machine': machine_info(), 'stages': {}}
+    with tempfile.TemporaryDirectory(prefix='midiff_bench_') as tmp:
+        wav_path, midi_path = write_fixtures(tmp, seed)
+        with contextlib.redirect_stdout(io.StringIO()), warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            stages = build_stages(tmp, wav_path, midi_path)
+        for name, fn in stages:
+            if only and name not in only:
+                continue
+            runs = time_stage(fn, repeat)
+            results['stages'][name] = {'median': statistics.median(runs), 'min': min(runs),
+                                       'mean': statistics.fmean(runs), 'runs': runs}
+            print(f"{name:>24}: {statistics.median(runs) * 1000:9.1f} ms (min {min(runs) * 1000:.1f})")
+    return results
+
+
+# ==========================================
+# Comparison
+# ==========================================
+
+def compare_results(baseline, current, threshold=DEFAULT_THRESHOLD, min_delta=DEFAULT_MIN_DELTA):
+    """[(stage, baseline median, current median, relative change, regressed)] of the stages in both."""
+    rows = []
+    for name, base in baseline['stages'].items():
+        if name not in current['stages']:
+            continue
+        before, after = base['median'], current['stages'][name]['median']
+        change = (after - before) / before if before > 0 else 0.0
+        rows.append((name, before, after, change, change > threshold and after - before > min_delta))
+    return rows
+
+
+def print_comparison(rows, threshold):
+    print(f"{'stage':>24}  {'baseline':>10}  {'current':>10}  {'change':>8}")
+    for name, before, after, change, regressed in rows:
+        flag = '  REGRESSION' if regressed else ('  faster' if change < -threshold else '')
+        print(f"{name:>24}  {before * 1000:8.1f}ms  {after * 1000:8.1f}ms  {change:+8.1%}{flag}")
+
+
+def _load(path):
+    with open(path) as fh:
+        return json.load(fh)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the asset pipeline stage by stage.")
+    commands = parser.add_subparsers(dest='command', required=True)
+    run = commands.add_parser('run', help="Time every stage on synthetic fixtures")
+    run.add_argument('-o', '--output', default='benchmark_results.json', help="Results JSON")
+    run.add_argument('--repeat', type=int, default=DEFAULT_REPEAT, help="Timed calls per stage")
+    run.add_argument('--stage', action='append', dest='stages', help="Only this stage (repeatable)")
+    run.add_argument('--seed', type=int, default=0, help="Fixture seed")
+    compare = commands.add_parser('compare', help="Flag stages that got slower than a baseline")
+    compare.add_argument('baseline', help="Results JSON of the reference run")
+    compare.add_argument('current', help="Results JSON of the run to check")
+    compare.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                         help="Relative slowdown of a stage's median that counts as a regression")
+    compare.add_argument('--min-delta', type=float, default=DEFAULT_MIN_DELTA,
+                         help="Ignore slowdowns smaller than this many seconds")
+    args = parser.parse_args(argv)
+
+    if args.command == 'run':
+        results = run_benchmarks(args.repeat, args.stages, args.seed)
+        tmp_path = args.output + '.tmp'
+        with open(tmp_path, 'w') as fh:
+            json.dump(results, fh, indent=1)
+        os.replace(tmp_path, args.output)
+        print(f"\n✓ Benchmark results written to {args.output}")
+        return 0
+
+    baseline, current = _load(args.baseline), _load(args.current)
+    if baseline['machine'] != current['machine']:
+        print("Warning: results come from different machines or library versions")
+    rows = compare_results(baseline, current, args.threshold, args.min_delta)
+    print_comparison(rows, args.threshold)
+    regressed = [row[0] for row in rows if row[4]]
+    if regressed:
+        print(f"\n✗ {len(regressed)} stage(s) slower than {args.baseline} by more than {args.threshold:.0%}: "
+              + ", ".join(regressed))
+        return 1
+    print(f"\n✓ No stage slower than {args.baseline} by more than {args.threshold:.0%}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,91 @@
+"""
+Content-hash build manifest for incremental asset generation.
+
+For every generated output the manifest records the content hash of each
+source file plus the parameters it was rendered with, and the secondary outputs written alongside it (tile
+pyramids, ...). An output is only rebuilt when it or one of its secondary
+outputs is missing, a source changed, or a parameter changed.
+
+Source hashes are memoised by (size, mtime) so unchanged files are not
+re-read on every run.
+"""
+
+import hashlib
+import json
+import os
+
+DEFAULT_MANIFEST_PATH = ".asset_manifest.json"
+_CHUNK_SIZE = 1 << 20
+
+
+def file_sha256(path):
+    """SHA-256 of a file's contents, read in 1 MB chunks."""
+    h = hashlib.sha256()
+    with open(path, 'rb') as fh:
+        for chunk in iter(lambda: fh.read(_CHUNK_SIZE), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+class BuildManifest:
+    """
+    Tracks which outputs are up to date with respect to their sources and parameters.
+    """
+    def __init__(self, path=DEFAULT_MANIFEST_PATH):
+        self.path = path
+        self.files = {}    # source path -> {'size', 'mtime_ns', 'sha256'}
+        # output path -> {'sources': {path: sha256}, 'params': {...}[, 'extra_outputs': [path, ...]]}
+        self.outputs = {}
+        if os.path.exists(path):
+            try:
+                with open(path) as fh:
+                    data = json.load(fh)
+                self.files = data.get('files', {})
+                self.outputs = data.get('outputs', {})
+            except (OSError, ValueError) as e:
+                print(f"Warning: ignoring unreadable manifest {path}: {e}")
+
+    def content_hash(self, path):
+        """Content hash of a source file, reusing the cached value if size and mtime match."""
+        st = os.stat(path)
+        cached = self.files.get(path)
+        if cached and cached['size'] == st.st_size and cached['mtime_ns'] == st.st_mtime_ns:
+            return cached['sha256']
+        digest = file_sha256(path)
+        self.files[path] = {'size': st.st_size, 'mtime_ns': st.st_mtime_ns, 'sha256': digest}
+        return digest
+
+    def _signature(self, sources, params, extra_outputs=()):
+        signature = {
+            'sources': {src: self.content_hash(src) for src in sources},
+            # Round-trip through JSON so tuples/lists compare equal to what was stored
+            'params': json.loads(json.dumps(params, sort_keys=True)),
+        }
+        if extra_outputs:
+            signature['extra_outputs'] = sorted(extra_outputs)
+        return signature
+
+    def is_stale(self, output, sources, params, extra_outputs=()):
+        """
+        True if output must be (re)built from sources with params.
+
+        extra_outputs are the other files / directories the same build writes
+        (e.g. a tile pyramid); if any of them is missing the output is stale too.
+        """
+        entry = self.outputs.get(output)
+        if entry is None or not os.path.exists(output):
+            return True
+        if not all(os.path.exists(path) for path in entry.get('extra_outputs', [])):
+            return True
+        return entry != self._signature(sources, params, extra_outputs)
+
+    def record(self, output, sources, params, extra_outputs=()):
+        """Mark output (and its extra_outputs) as freshly built from sources with params."""
+        self.outputs[output] = self._signature(sources, params, extra_outputs)
+
+    def save(self):
+        """Write the manifest atomically."""
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w') as fh:
+            json.dump({'files': self.files, 'outputs': self.outputs}, fh, indent=1, sort_keys=True)
+        os.replace(tmp_path, self.path)
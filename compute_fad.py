@@ -0,0 +1,179 @@
+"""
+Frechet Audio Distance between a clean reference set and enhanced output directories.
+
+    python compute_fad.py CLEAN_DIR ENHANCED_DIR [ENHANCED_DIR ...]
+    python compute_fad.py --sweep velocity_sweep_fad_results.json --root <training repo>
+
+Every audio file is embedded with a pluggable backend (audio_embeddings.py;
+the default 'mel-stats' needs no downloads) and the embedding is cached on
+disk under its content hash, so re-scoring a sweep only embeds files that
+changed. All files of all directories are embedded in one process-pool batch.
+Set statistics are accumulated in streaming shards (frechet_stats.py), one per
+worker, and merged, so no set is ever held in memory as a whole; sets with
+fewer than MIN_SHARD_FILES files per shard are folded in the main process,
+without a pool. The clean reference statistics are computed once per run and
+stored next to the embeddings, keyed by the hashes of the clean files, so
+every enhanced directory (and the next run) reuses them.
+
+--sweep re-scores a velocity_sweep_fad_results.json-style file: its clean_dir
+and every velocities[].enhanced_dir are read from it, and the same structure is
+written back to --output with the new FAD values.
+"""
+
+import argparse
+import hashlib
+import json
+import os
+
+import numpy as np
+
+import profiling
+from audio_embeddings import (DEFAULT_BACKEND, DEFAULT_CACHE_DIR, EmbeddingCache,
+                              embed_to_cache, get_backend)
+from batch_runner import default_jobs, run_batch
+from build_manifest import DEFAULT_MANIFEST_PATH, BuildManifest
+from frechet_stats import FrechetStats, frechet_distance
+
+AUDIO_EXTENSIONS = ('.wav', '.flac')
+# Smallest shard worth a worker: below this, starting the pool costs more
+# than folding the cached embeddings in the main process
+MIN_SHARD_FILES = 500
+
+
+def list_audio(directory):
+    """Audio files under directory, recursively, in a stable order."""
+    paths = []
+    for dirpath, dirnames, filenames in os.walk(directory):
+        dirnames.sort()
+        paths.extend(os.path.join(dirpath, name) for name in sorted(filenames)
+                     if name.lower().endswith(AUDIO_EXTENSIONS))
+    if not paths:
+        raise FileNotFoundError(f"No audio files under {directory}")
+    return paths
+
+
+def embed_missing(paths, cache, backend_spec, n_jobs=None):
+    """Embed every file whose content is not in the cache yet (each distinct content once)."""
+    missing = {}
+    for path in paths:
+        digest, cache_path, cached = cache.lookup(path)
+        if not cached and digest not in missing:
+            missing[digest] = (path, cache_path, backend_spec)
+    if len(missing) < len(paths):
+        print(f"Reusing cached embeddings for {len(paths) - len(missing)} files")
+    outcomes = run_batch(embed_to_cache, missing.values(), n_jobs=n_jobs, title="Embedding audio")
+    failed = [job[0] for job, _, error in outcomes if error is not None]
+    if failed:
+        raise RuntimeError(f"Embedding failed for {len(failed)} file(s): {', '.join(failed[:5])}")
+
+
+def accumulate_files(label, cache_paths):
+    """Streaming statistics of one shard of cached embeddings (worker side)."""
+    stats = FrechetStats()
+    for path in cache_paths:
+        stats.update(np.load(path))
+    return stats
+
+
+def set_stats(paths, cache, n_jobs=None, label='set'):
+    """Frechet statistics of a set of (already embedded) files, from merged per-shard states."""
+    cache_paths = [cache.lookup(path)[1] for path in paths]
+    n_shards = max(1, min(n_jobs or default_jobs(), len(cache_paths) // MIN_SHARD_FILES))
+    shards = [(f"{label} [{i + 1}/{n_shards}]", tuple(cache_paths[i::n_shards])) for i in range(n_shards)]
+    outcomes = run_batch(accumulate_files, shards, n_jobs=n_jobs) if n_shards > 1 else \
+        [(shards[0], accumulate_files(*shards[0]), None)]
+    failed = [job[0] for job, _, error in outcomes if error is not None]
+    if failed:
+        raise RuntimeError(f"Statistics failed for {', '.join(failed)}")
+    return FrechetStats.merged(stats for _, stats, _ in outcomes)
+
+
+def reference_stats(paths, cache, n_jobs=None):
+    """
+    Frechet statistics of the clean reference set, stored in the cache under
+    the hash of the sorted content hashes of its files.
+    """
+    digests = sorted(cache.lookup(path)[0] for path in paths)
+    key = hashlib.sha256('\n'.join(digests).encode()).hexdigest()
+    stats_path = os.path.join(cache.dir, 'stats', key + '.npz')
+    if os.path.exists(stats_path):
+        print(f"Reusing clean reference statistics ({len(paths)} files)")
+        return FrechetStats.load(stats_path)
+    stats = set_stats(paths, cache, n_jobs, label='clean')
+    os.makedirs(os.path.dirname(stats_path), exist_ok=True)
+    tmp_path = stats_path + '.tmp.npz'
+    stats.save(tmp_path)
+    os.replace(tmp_path, stats_path)
+    return stats
+
+
+def score_dirs(clean_dir, enhanced_dirs, backend_spec=DEFAULT_BACKEND, cache_dir=DEFAULT_CACHE_DIR,
+               manifest_path=DEFAULT_MANIFEST_PATH, n_jobs=None):
+    """FAD of every enhanced directory against clean_dir; returns [{'enhanced_dir', 'fad', 'files'}]."""
+    hasher = BuildManifest(manifest_path)
+    cache = EmbeddingCache(get_backend(backend_spec), hasher, cache_dir)
+    clean = list_audio(clean_dir)
+    enhanced = {d: list_audio(d) for d in enhanced_dirs}
+    try:
+        embed_missing(clean + [p for paths in enhanced.values() for p in paths], cache, backend_spec, n_jobs)
+    finally:
+        hasher.save()
+
+    clean_stats = reference_stats(clean, cache, n_jobs)
+    results = []
+    for directory, paths in enhanced.items():
+        fad = frechet_distance(clean_stats, set_stats(paths, cache, n_jobs, label=directory))
+        print(f"FAD {fad:10.6f}  {directory} ({len(paths)} files)")
+        results.append({'enhanced_dir': directory, 'fad': round(fad, 6), 'files': len(paths)})
+    return results
+
+
+def rescore_sweep(sweep_path, root='.', **kwargs):
+    """A sweep results file with its FAD values recomputed."""
+    with open(sweep_path) as fh:
+        sweep = json.load(fh)
+    resolve = lambda path: path if os.path.isabs(path) else os.path.join(root, path)
+    results = score_dirs(resolve(sweep['clean_dir']),
+                         [resolve(entry['enhanced_dir']) for entry in sweep['velocities']], **kwargs)
+    for entry, result in zip(sweep['velocities'], results):
+        entry['fad'] = result['fad']
+    sweep['embedding_backend'] = kwargs.get('backend_spec', DEFAULT_BACKEND)
+    return sweep
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Frechet Audio Distance of enhanced directories against a clean set.")
+    parser.add_argument('clean_dir', nargs='?', help="Clean reference directory")
+    parser.add_argument('enhanced_dirs', nargs='*', help="Enhanced output directories to score")
+    parser.add_argument('--sweep', help="Re-score a velocity_sweep_fad_results.json-style file")
+    parser.add_argument('--root', default='.', help="Base of the relative paths in --sweep")
+    parser.add_argument('--backend', default=DEFAULT_BACKEND,
+                        help="Embedding backend: a registered name or 'module:Class'")
+    parser.add_argument('--cache-dir', default=DEFAULT_CACHE_DIR, help="Embedding cache directory")
+    parser.add_argument('-o', '--output', default='fad_results.json', help="Results JSON")
+    parser.add_argument('-j', '--jobs', type=int, default=default_jobs(),
+                        help="Number of worker processes (1 = serial, default: all cores)")
+    parser.add_argument('--manifest', default=DEFAULT_MANIFEST_PATH,
+                        help="Build manifest whose content-hash memo is reused")
+    profiling.add_profile_argument(parser)
+    args = parser.parse_args(argv)
+    profiling.start(args.profile)
+
+    options = dict(backend_spec=args.backend, cache_dir=args.cache_dir,
+                   manifest_path=args.manifest, n_jobs=args.jobs)
+    if args.sweep:
+        output = rescore_sweep(args.sweep, args.root, **options)
+    elif args.clean_dir and args.enhanced_dirs:
+        output = {'clean_dir': args.clean_dir, 'embedding_backend': args.backend,
+                  'results': score_dirs(args.clean_dir, args.enhanced_dirs, **options)}
+    else:
+        parser.error("give CLEAN_DIR and at least one ENHANCED_DIR, or --sweep")
+
+    with open(args.output, 'w') as fh:
+        json.dump(output, fh, indent=2)
+    print(f"\n✓ FAD results written to {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,289 @@
+"""
+Objective metrics for every enhanced output directory on the results page.
+
+For each enhanced file, against the clean recording of the same groove:
+
+  * si_sdr     scale-invariant signal-to-distortion ratio (dB, higher is better)
+  * lsd        log-spectral distance (dB, lower is better)
+  * onset_f1   F-measure of onsets detected in the audio against the note
+               onsets of the groove's MIDI file (50 ms tolerance)
+
+Every enhanced / clean pair is its own job over the process pool of
+batch_runner. Power spectrograms come from the shared spectrogram cache
+(spectrogram_cache.py, stored in dB): the clean ones are computed in the main
+process before the pool starts, so every pair of a groove reads the same
+clean STFT back, and each enhanced STFT feeds both the LSD and the onset
+detector (and is reused by the next run).
+
+Everything lands in one JSON (static/graphs/metrics.json) that the page's
+charts read directly: per-directory means, the velocity-ablation entries in
+chart order, and the Frechet training curves (read from the run exports of
+ingest_runs.py). FAD values are not computed here; they are read from FAD
+result files (compute_fad.py output, or a velocity sweep results file) and
+matched to the directories by name.
+"""
+
+import argparse
+import glob
+import json
+import os
+
+import librosa
+import numpy as np
+import pretty_midi
+
+import profiling
+from audio_io import load_audio
+from batch_runner import default_jobs, run_batch
+from ingest_runs import DEFAULT_OUT_DIR as RUNS_DIR, FRECHET_TAG
+from midi_note_index import extract_notes
+from midi_onsets import midi_for
+from spectrogram_cache import default_cache
+
+CLEAN_DIR = "static/audio/dataset/clean"
+MIDI_DIR = "static/audio/dataset/midi"
+OUTPUT_PATH = "static/graphs/metrics.json"
+SWEEP_DIR = "static/audio/midi_conditioned/velocity_sweep_v181"
+SWEEP_RESULTS = os.path.join(SWEEP_DIR, "velocity_sweep_fad_results.json")
+# Test-set Frechet VGGish scores of the baseline / MiDiff checkpoints (compute_fad.py format)
+REPORTED_FAD_RESULTS = "static/graphs/reported_fad.json"
+FAD_RESULTS = (SWEEP_RESULTS, REPORTED_FAD_RESULTS)
+# Runs of the Frechet chart, as exported by ingest_runs.py
+CURVES = {'baseline': 'version_180', 'midiff': 'version_181'}
+STEPS_PER_EPOCH = 1102
+
+SR = 16000
+N_FFT = 1024
+HOP_LENGTH = 256
+ONSET_TOLERANCE = 0.05   # seconds
+ONSET_MERGE = 0.03       # MIDI notes closer than this are one onset (e.g. kick + hi-hat)
+METRICS = ('si_sdr', 'lsd', 'onset_f1')
+
+
+def page_directories():
+    """(key, label, series, path) of every scored directory, in velocity-ablation chart order."""
+    dirs = [('baseline', 'Baseline', 'Baseline (No MIDI)', "static/audio/baseline/version_180"),
+            ('midiff', 'MiDiff', 'MiDiff', "static/audio/midi_conditioned/version_181"),
+            ('random_velocity', 'MiDiff (Random Velocity)', 'MiDiff (Random Velocity)',
+             os.path.join(SWEEP_DIR, 'random_velocity'))]
+    sweep = sorted((p for p in glob.glob(os.path.join(SWEEP_DIR, 'velocity_*')) if os.path.isdir(p)),
+                   key=lambda p: int(p.rsplit('_', 1)[1]))
+    dirs += [(os.path.basename(p), p.rsplit('_', 1)[1], 'MiDiff (Constant Velocity)', p) for p in sweep]
+    cfg = sorted(glob.glob("static/audio/midi_conditioned/cfg/w_*"), key=lambda p: float(p.rsplit('_', 1)[1]))
+    dirs += [(f"cfg_{os.path.basename(p)}", f"CFG w={p.rsplit('_', 1)[1]}", 'CFG', p) for p in cfg]
+    return dirs
+
+
+def _stems(directory, ext):
+    return {os.path.splitext(name)[0]: os.path.join(directory, name)
+            for name in sorted(os.listdir(directory)) if name.lower().endswith(ext)}
+
+
+def match_stem(stem, candidates):
+    """Candidate for stem: the same name, or the name with trailing _tokens (_v0, _midiff) dropped."""
+    parts = stem.split('_')
+    for end in range(len(parts), 0, -1):
+        match = candidates.get('_'.join(parts[:end]))
+        if match:
+            return match
+    return None
+
+
+def collect_pairs(directories, clean_dir=CLEAN_DIR, midi_dir=MIDI_DIR):
+    """
+    score_pair jobs: (key, enhanced path, clean path, midi path) for every
+    enhanced file, plus one ('clean', clean, clean, midi) job per matched
+    clean file for the clean onset F1.
+    """
+    cleans = _stems(clean_dir, '.wav')
+    midis = _stems(midi_dir, '.mid') if os.path.isdir(midi_dir) else {}
+    midi_of = lambda clean: midi_for(os.path.splitext(os.path.basename(clean))[0], midis)
+    pairs, matched, unmatched = [], set(), 0
+    for key, _, _, directory in directories:
+        for stem, path in _stems(directory, '.wav').items():
+            clean = match_stem(stem, cleans)
+            if clean is None:
+                unmatched += 1
+                continue
+            matched.add(clean)
+            pairs.append((key, path, clean, midi_of(clean)))
+    if unmatched:
+        print(f"Warning: {unmatched} enhanced files have no clean counterpart in {clean_dir}")
+    return [('clean', clean, clean, midi_of(clean)) for clean in sorted(matched)] + pairs
+
+
+def si_sdr(reference, estimate):
+    """Scale-invariant SDR in dB of estimate against reference (both zero-meaned)."""
+    n = min(len(reference), len(estimate))
+    reference = reference[:n] - reference[:n].mean()
+    estimate = estimate[:n] - estimate[:n].mean()
+    target = reference * (estimate.dot(reference) / max(reference.dot(reference), 1e-12))
+    noise = estimate - target
+    return float(10 * np.log10(max(target.dot(target), 1e-12) / max(noise.dot(noise), 1e-12)))
+
+
+def log_spectral_distance(power_ref, power_est):
+    """Mean over frames of the RMS (over frequency) difference of the log power spectra, in dB."""
+    n = min(power_ref.shape[1], power_est.shape[1])
+    diff = 10 * np.log10(power_ref[:, :n] + 1e-10) - 10 * np.log10(power_est[:, :n] + 1e-10)
+    return float(np.sqrt((diff ** 2).mean(axis=0)).mean())
+
+
+def detect_onsets(power):
+    """Onset times (s) from a power spectrogram, via librosa's spectral-flux detector."""
+    mel = librosa.feature.melspectrogram(S=power, sr=SR)
+    envelope = librosa.onset.onset_strength(S=librosa.power_to_db(mel), sr=SR)
+    return librosa.onset.onset_detect(onset_envelope=envelope, sr=SR, hop_length=HOP_LENGTH, units='time')
+
+
+def midi_onsets(midi_path, merge=ONSET_MERGE):
+    """Note onsets of a MIDI file, with near-simultaneous notes merged."""
+    start = np.unique(extract_notes(pretty_midi.PrettyMIDI(midi_path))[0].astype(np.float64))
+    if len(start) == 0:
+        return start
+    keep = np.concatenate([[True], np.diff(start) > merge])
+    return start[keep]
+
+
+def onset_f1(reference, estimated, tolerance=ONSET_TOLERANCE):
+    """F-measure of a one-to-one greedy matching of sorted onset lists within tolerance."""
+    if len(reference) == 0 or len(estimated) == 0:
+        return 0.0
+    matched, i, j = 0, 0, 0
+    while i < len(reference) and j < len(estimated):
+        if abs(reference[i] - estimated[j]) <= tolerance:
+            matched, i, j = matched + 1, i + 1, j + 1
+        elif estimated[j] < reference[i]:
+            j += 1
+        else:
+            i += 1
+    precision, recall = matched / len(estimated), matched / len(reference)
+    return 0.0 if matched == 0 else 2 * precision * recall / (precision + recall)
+
+
+POWER_CACHE_PARAMS = {'kind': 'power_db', 'sr': SR, 'n_fft': N_FFT, 'hop_length': HOP_LENGTH,
+                      'window': 'hann', 'center': True}
+
+
+def power_spectrogram(path):
+    """Power spectrogram of a file, through the shared spectrogram cache (stored as 10 log10(power))."""
+    def compute():
+        y, _ = load_audio(path, sr=SR)
+        return 10 * np.log10(np.abs(librosa.stft(y, n_fft=N_FFT, hop_length=HOP_LENGTH)) ** 2 + 1e-10)
+
+    return 10 ** (np.asarray(default_cache().get_or_compute(path, POWER_CACHE_PARAMS, compute),
+                             dtype=np.float64) / 10)
+
+
+def cache_clean_spectrograms(pairs):
+    """Compute the clean power spectrograms once, before the pairs sharing them fan out to the workers."""
+    for clean in sorted({pair[2] for pair in pairs}):
+        power_spectrogram(clean)
+
+
+def score_pair(key, path, clean_path, midi_path):
+    """Metrics of one enhanced file against its clean recording (key 'clean': the clean onset F1 only)."""
+    reference_onsets = midi_onsets(midi_path) if midi_path else None
+    power = power_spectrogram(path)
+    row = {'key': key, 'file': path,
+           'onset_f1': None if reference_onsets is None else onset_f1(reference_onsets, detect_onsets(power))}
+    if key != 'clean':
+        clean, _ = load_audio(clean_path, sr=SR)
+        y, _ = load_audio(path, sr=SR)
+        row.update(si_sdr=si_sdr(clean, y), lsd=log_spectral_distance(power_spectrogram(clean_path), power))
+    return row
+
+
+def _mean(values):
+    values = [v for v in values if v is not None]
+    return round(float(np.mean(values)), 4) if values else None
+
+
+def read_fad(paths=FAD_RESULTS):
+    """
+    FAD by enhanced directory name from result files: compute_fad.py output
+    ('results') or velocity sweep files ('velocities'). Later files win.
+    """
+    fad = {}
+    for path in paths:
+        if not os.path.exists(path):
+            print(f"Warning: FAD results not found: {path}")
+            continue
+        with open(path) as fh:
+            data = json.load(fh)
+        for entry in data.get('results', []) + data.get('velocities', []):
+            fad[os.path.basename(os.path.normpath(entry['enhanced_dir']))] = entry['fad']
+    return fad
+
+
+def training_curves(runs_dir=RUNS_DIR):
+    """Frechet VGGish score per epoch of the baseline and MiDiff runs, from their ingest_runs.py exports."""
+    curves = {}
+    for key, run in CURVES.items():
+        export = os.path.join(runs_dir, run + '.json')
+        try:
+            with open(export) as fh:
+                series = json.load(fh)['tags'][FRECHET_TAG]
+        except (FileNotFoundError, KeyError):
+            print(f"Warning: no {FRECHET_TAG} export for {run} in {runs_dir} (run ingest_runs.py); "
+                  f"skipping its training curve")
+            continue
+        curves[key] = [{'epoch': round(step / STEPS_PER_EPOCH - 1, 4), 'frechet': value}
+                       for step, value in zip(series['step'], series['value'])]
+    return curves
+
+
+def build_results(directories, outcomes, clean_dir, midi_dir, fad_paths=FAD_RESULTS):
+    """The metrics JSON document from score_pair outcomes."""
+    rows = [result for _, result, error in outcomes if error is None]
+    fad = read_fad(fad_paths)
+    entries = []
+    for key, label, series, path in directories:
+        mine = [row for row in rows if row['key'] == key]
+        entry = {'key': key, 'label': label, 'series': series, 'dir': path, 'files': len(mine),
+                 'fad': fad.get(os.path.basename(os.path.normpath(path)))}
+        entry.update({metric: _mean(row[metric] for row in mine) for metric in METRICS})
+        entries.append(entry)
+    clean_rows = [row for row in rows if row['key'] == 'clean']
+    return {
+        'version': 1,
+        'clean_dir': clean_dir,
+        'midi_dir': midi_dir,
+        'metrics': ['fad'] + list(METRICS),
+        'clean_onset_f1': _mean(row['onset_f1'] for row in clean_rows),
+        'directories': entries,
+        'training_curves': training_curves(),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Score the page's enhanced directories against the clean set.")
+    parser.add_argument('--clean-dir', default=CLEAN_DIR)
+    parser.add_argument('--midi-dir', default=MIDI_DIR, help="Directory of the grooves' .mid files")
+    parser.add_argument('--fad', nargs='*', default=list(FAD_RESULTS), metavar='RESULTS',
+                        help="FAD result files (compute_fad.py or velocity sweep JSON) to report FAD from")
+    parser.add_argument('-o', '--output', default=OUTPUT_PATH)
+    parser.add_argument('-j', '--jobs', type=int, default=default_jobs(),
+                        help="Number of worker processes (1 = serial, default: all cores)")
+    profiling.add_profile_argument(parser)
+    args = parser.parse_args(argv)
+    profiling.start(args.profile)
+
+    directories = page_directories()
+    pairs = collect_pairs(directories, args.clean_dir, args.midi_dir)
+    cache_clean_spectrograms(pairs)
+    outcomes = run_batch(score_pair, pairs, n_jobs=args.jobs, title="Scoring enhanced audio")
+    results = build_results(directories, outcomes, args.clean_dir, args.midi_dir, args.fad)
+
+    tmp_path = args.output + '.tmp'
+    with open(tmp_path, 'w') as fh:
+        json.dump(results, fh, indent=1)
+    os.replace(tmp_path, args.output)
+    for entry in results['directories']:
+        print(f"{entry['label']:>26}: " + ", ".join(f"{m}={entry[m]}" for m in results['metrics']))
+    print(f"\n✓ Metrics written to {args.output}")
+    return 1 if any(error is not None for _, _, error in outcomes) else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,124 @@
+"""
+ffmpeg filtergraph render backend for the comparison videos.
+
+The videos are static section backgrounds plus a moving cursor, so instead of
+compositing every frame in Python (moviepy), the pre-rendered section images,
+the audio samples and the cursor motion are handed to a single ffmpeg process:
+
+  * each section image is a looped still input of its own duration,
+  * the stills are joined with the concat filter,
+  * the cursor is a solid 'color' source placed by the overlay filter with an
+    x expression in t (evaluated per frame inside ffmpeg),
+  * the audio is streamed to stdin as raw float32 samples.
+
+Python never produces per-frame pixels.
+"""
+
+import os
+import subprocess
+import tempfile
+
+import numpy as np
+from PIL import Image
+
+from profiling import stage
+
+
+def ffmpeg_exe():
+    """The ffmpeg binary moviepy uses (imageio-ffmpeg), or ffmpeg from PATH."""
+    try:
+        import imageio_ffmpeg
+        return imageio_ffmpeg.get_ffmpeg_exe()
+    except (ImportError, RuntimeError):
+        return 'ffmpeg'
+
+
+def sawtooth_cursor_x(width, period):
+    """Overlay x expression: sweeps 0..width every `period` seconds, then resets."""
+    return f"floor(mod(t\\,{period})/{period}*{width})"
+
+
+def linear_cursor_x(width, total_duration):
+    """Overlay x expression: sweeps 0..width once over `total_duration` seconds."""
+    return f"floor(t*{width}/{total_duration})"
+
+
+def _color_hex(rgb):
+    return '0x' + ''.join(f"{int(c):02X}" for c in rgb)
+
+
+def render_sections_video(sections, audio, sr, output_path, cursor_x, fps=30,
+                          cursor_color=(255, 255, 255), cursor_width=4, cursor_alpha=0.8,
+                          codec='libx264', audio_codec='aac', bitrate='8000k', preset='medium'):
+    """
+    Encode a video of static sections with a moving cursor in one ffmpeg call.
+
+    sections: list of (RGB uint8 image (H, W, 3), duration in seconds), all the same size.
+    audio:    mono float samples for the whole video, at sample rate sr (None: no audio track).
+    cursor_x: ffmpeg expression in t for the cursor's left edge (see *_cursor_x).
+    """
+    if not sections:
+        raise ValueError("render_sections_video needs at least one section")
+    h, w = sections[0][0].shape[:2]
+    total = sum(duration for _, duration in sections)
+
+    with tempfile.TemporaryDirectory(prefix='midiff_ffmpeg_') as tmp:
+        cmd = [ffmpeg_exe(), '-y', '-loglevel', 'error']
+        for i, (image, duration) in enumerate(sections):
+            path = os.path.join(tmp, f"section_{i:03d}.png")
+            # Lossless and tiny per section; compression level 1 keeps this fast
+            Image.fromarray(np.ascontiguousarray(image[:, :, :3])).save(path, compress_level=1)
+            cmd += ['-loop', '1', '-framerate', str(fps), '-t', f"{duration}", '-i', path]
+        audio_idx = len(sections)
+        if audio is not None:
+            cmd += ['-f', 'f32le', '-ar', str(sr), '-ac', '1', '-i', 'pipe:0']
+
+        concat_in = ''.join(f"[{i}:v]" for i in range(len(sections)))
+        graph = (
+            f"{concat_in}concat=n={len(sections)}:v=1:a=0,format=rgb24[bg];"
+            f"color=c={_color_hex(cursor_color)}@{cursor_alpha}:s={cursor_width}x{h}:r={fps}:d={total},"
+            f"format=rgba[cur];"
+            f"[bg][cur]overlay=x='{cursor_x}':y=0:eval=frame:shortest=1,format=yuv420p[v]"
+        )
+        cmd += ['-filter_complex', graph, '-map', '[v]',
+                '-c:v', codec, '-b:v', bitrate, '-preset', preset, '-r', str(fps)]
+        if audio is not None:
+            cmd += ['-map', f"{audio_idx}:a", '-c:a', audio_codec]
+        cmd += ['-t', f"{total}", output_path]
+
+        stdin = None if audio is None else np.ascontiguousarray(audio, dtype='<f4').tobytes()
+        with stage('ffmpeg_encode', path=output_path, sections=len(sections)):
+            proc = subprocess.run(cmd, input=stdin, capture_output=True)
+        if proc.returncode != 0:
+            raise RuntimeError(f"ffmpeg failed ({proc.returncode}):\n{proc.stderr.decode(errors='replace')}")
+    print(f"✓ Rendered {output_path} ({len(sections)} sections, {total:.1f}s, {w}x{h})")
+    return output_path
+
+
+def concat_videos(segment_paths, output_path, audio=None, sr=None, audio_codec='aac'):
+    """
+    Join encoded segments losslessly with the concat demuxer (stream copy, no re-encode).
+
+    All segments must share codecs and encoding parameters. If audio samples
+    are given, they are encoded once as the output's audio track: joining
+    separately encoded AAC segments would add priming gaps at every boundary.
+    """
+    with tempfile.TemporaryDirectory(prefix='midiff_concat_') as tmp:
+        list_path = os.path.join(tmp, 'segments.txt')
+        with open(list_path, 'w') as fh:
+            for path in segment_paths:
+                escaped = os.path.abspath(path).replace("'", "'\\''")
+                fh.write(f"file '{escaped}'\n")
+        cmd = [ffmpeg_exe(), '-y', '-loglevel', 'error', '-f', 'concat', '-safe', '0', '-i', list_path]
+        stdin = None
+        if audio is not None:
+            cmd += ['-f', 'f32le', '-ar', str(sr), '-ac', '1', '-i', 'pipe:0',
+                    '-map', '0:v', '-map', '1:a', '-c:a', audio_codec, '-shortest']
+            stdin = np.ascontiguousarray(audio, dtype='<f4').tobytes()
+        cmd += ['-c:v', 'copy', '-movflags', '+faststart', output_path]
+        with stage('ffmpeg_concat', path=output_path, segments=len(segment_paths)):
+            proc = subprocess.run(cmd, input=stdin, capture_output=True)
+        if proc.returncode != 0:
+            raise RuntimeError(f"ffmpeg concat failed ({proc.returncode}):\n{proc.stderr.decode(errors='replace')}")
+    print(f"✓ Concatenated {len(segment_paths)} segments into {output_path}")
+    return output_path
@@ -0,0 +1,32 @@
+"""
+Matplotlib figure -> NumPy image without an encode/decode round trip.
+
+The figure is drawn once on its Agg canvas and the RGBA render buffer is
+exposed as a NumPy view, so there is no PNG compression, no PIL decode, no
+resample and no extra copy. Figures are sized to the exact target pixel size
+up front, so bbox_inches='tight' cropping is never needed; the renderers use
+full-bleed axes ([0, 0, 1, 1]) for that reason.
+"""
+
+import numpy as np
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+
+def figure_to_array(fig, size=None):
+    """
+    RGB (H, W, 3) uint8 view of the figure's Agg render buffer.
+
+    size=(width, height) in pixels resizes the figure (at its dpi) before drawing,
+    so the buffer comes out at exactly that resolution. The view shares memory
+    with the canvas: copy it before drawing the same figure again.
+    """
+    if size is not None:
+        width, height = size
+        fig.set_size_inches(width / fig.dpi, height / fig.dpi)
+    if not isinstance(fig.canvas, FigureCanvasAgg):
+        FigureCanvasAgg(fig)
+    fig.canvas.draw()
+    rgba = np.asarray(fig.canvas.buffer_rgba())
+    if size is not None and rgba.shape[:2] != (size[1], size[0]):
+        raise ValueError(f"figure rendered at {rgba.shape[1]}x{rgba.shape[0]}, expected {size[0]}x{size[1]}")
+    return rgba[:, :, :3]
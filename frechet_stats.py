@@ -0,0 +1,94 @@
+"""
+Streaming Frechet statistics (mean and covariance of embeddings).
+
+FrechetStats accumulates embeddings batch by batch without keeping them:
+each batch is reduced to its count, mean and centred scatter matrix and folded
+into the running state with the pairwise update of Chan et al. (the batched
+form of Welford's algorithm), which stays accurate where the textbook
+sum / sum-of-squares formula cancels catastrophically. Two states merge the
+same way, so a large evaluation set can be split into shards, accumulated in
+parallel (states pickle and save to .npz) and combined; memory is O(dim^2)
+whatever the size of the set.
+
+The matrix square root of frechet_distance runs once, on the final merged
+statistics.
+"""
+
+import numpy as np
+from scipy import linalg
+
+
+class FrechetStats:
+    """Running count, mean and scatter matrix (sum of centred outer products)."""
+
+    def __init__(self, dim=None):
+        self.n = 0
+        self.mean = None if dim is None else np.zeros(dim)
+        self.m2 = None if dim is None else np.zeros((dim, dim))
+
+    def _combine(self, n, mean, m2):
+        if n == 0:
+            return self
+        if self.n == 0:
+            self.n, self.mean, self.m2 = n, mean.copy(), m2.copy()
+            return self
+        total = self.n + n
+        delta = mean - self.mean
+        self.mean = self.mean + delta * (n / total)
+        self.m2 = self.m2 + m2 + np.outer(delta, delta) * (self.n * n / total)
+        self.n = total
+        return self
+
+    def update(self, batch):
+        """Fold a (rows, dim) batch of embeddings into the statistics."""
+        batch = np.asarray(batch, dtype=np.float64)
+        if batch.ndim != 2 or len(batch) == 0:
+            return self
+        mean = batch.mean(axis=0)
+        centred = batch - mean
+        return self._combine(len(batch), mean, centred.T @ centred)
+
+    def merge(self, other):
+        """Fold another (partial) state into this one."""
+        return self._combine(other.n, other.mean, other.m2) if other.n else self
+
+    @classmethod
+    def merged(cls, states):
+        """One state combining all of states."""
+        total = cls()
+        for state in states:
+            total.merge(state)
+        return total
+
+    @property
+    def covariance(self):
+        """Unbiased covariance (np.cov(..., rowvar=False))."""
+        if self.n < 2:
+            raise ValueError("Need at least two embeddings for a covariance")
+        return self.m2 / (self.n - 1)
+
+    def save(self, path):
+        np.savez(path, n=self.n, mean=self.mean, m2=self.m2)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            stats = cls()
+            stats.n, stats.mean, stats.m2 = int(data['n']), data['mean'], data['m2']
+        return stats
+
+
+def frechet_distance(stats1, stats2, eps=1e-6):
+    """||mu1 - mu2||^2 + Tr(sigma1 + sigma2 - 2 sqrt(sigma1 sigma2)) of two FrechetStats."""
+    mu1, sigma1 = stats1.mean, stats1.covariance
+    mu2, sigma2 = stats2.mean, stats2.covariance
+    diff = mu1 - mu2
+    covmean = linalg.sqrtm(sigma1.dot(sigma2))
+    if not np.isfinite(covmean).all():
+        # Near-singular product: regularise both covariances slightly
+        offset = np.eye(sigma1.shape[0]) * eps
+        covmean = linalg.sqrtm((sigma1 + offset).dot(sigma2 + offset))
+    covmean = covmean.real
+    distance = diff.dot(diff) + np.trace(sigma1) + np.trace(sigma2) - 2.0 * np.trace(covmean)
+    # Rounding in sqrtm can push the distance of (nearly) identical sets below zero
+    return max(0.0, float(distance))
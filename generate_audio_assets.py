@@ -0,0 +1,141 @@
+"""
+Web audio assets for the results page.
+
+Every WAV under static/audio gets, next to it (the WAV itself is not touched):
+
+  * <name>.opus        Ogg Opus, the source the page prefers
+  * <name>.m4a         AAC, for browsers without Opus
+  * <name>.peaks.json  waveform peaks in the audiowaveform JSON layout
+                       (min/max pairs of int8 per `samples_per_pixel` samples)
+
+The page lists the sources as opus, m4a, wav, so the WAV stays the fallback.
+Each WAV is decoded once; its samples feed a single ffmpeg process that writes
+both encodings, and the peaks come from the same samples. Jobs run in
+parallel, and the build manifest skips clips whose WAV and settings are unchanged.
+"""
+
+import argparse
+import json
+import os
+import subprocess
+
+import numpy as np
+
+import profiling
+from audio_io import load_audio
+from batch_runner import default_jobs, run_batch
+from build_manifest import DEFAULT_MANIFEST_PATH, BuildManifest
+from ffmpeg_render import ffmpeg_exe
+
+AUDIO_ROOT = "static/audio"
+OPUS_BITRATE = '64k'
+AAC_BITRATE = '96k'
+SAMPLES_PER_PIXEL = 160   # 100 peak pairs per second at 16 kHz
+VARIANTS = ('.opus', '.m4a', '.peaks.json')
+
+
+def variant_paths(wav_path):
+    """(opus, m4a, peaks) paths that go with a WAV."""
+    stem = os.path.splitext(wav_path)[0]
+    return tuple(stem + ext for ext in VARIANTS)
+
+
+def compute_peaks(y, sr, samples_per_pixel=SAMPLES_PER_PIXEL):
+    """audiowaveform-style peaks dict (version 2, 8 bit, mono) for float samples in [-1, 1]."""
+    n = -(-len(y) // samples_per_pixel)
+    padded = np.zeros(n * samples_per_pixel, dtype=np.float32)
+    padded[:len(y)] = y
+    blocks = padded.reshape(n, samples_per_pixel)
+    pairs = np.stack([blocks.min(axis=1), blocks.max(axis=1)], axis=1)
+    data = np.clip(np.round(pairs * 127), -128, 127).astype(np.int8)
+    return {
+        'version': 2,
+        'channels': 1,
+        'sample_rate': int(sr),
+        'samples_per_pixel': samples_per_pixel,
+        'bits': 8,
+        'length': int(n),
+        'data': data.ravel().tolist(),
+    }
+
+
+def encode_clip(wav_path, opus_path, m4a_path, peaks_path,
+                opus_bitrate=OPUS_BITRATE, aac_bitrate=AAC_BITRATE):
+    """Write the Opus and AAC encodings and the peaks file of one WAV."""
+    y, sr = load_audio(wav_path)
+    cmd = [ffmpeg_exe(), '-y', '-loglevel', 'error',
+           '-f', 'f32le', '-ar', str(sr), '-ac', '1', '-i', 'pipe:0',
+           # libopus only takes 8/12/16/24/48 kHz; 48 kHz is what decoders output anyway
+           '-map', '0:a', '-c:a', 'libopus', '-b:a', opus_bitrate, '-ar', '48000', opus_path,
+           '-map', '0:a', '-c:a', 'aac', '-b:a', aac_bitrate, '-movflags', '+faststart', m4a_path]
+    with profiling.stage('audio_encode', path=wav_path):
+        proc = subprocess.run(cmd, input=np.ascontiguousarray(y, dtype='<f4').tobytes(), capture_output=True)
+    if proc.returncode != 0:
+        raise RuntimeError(f"ffmpeg failed ({proc.returncode}):\n{proc.stderr.decode(errors='replace')}")
+    with open(peaks_path, 'w') as fh:
+        json.dump(compute_peaks(y, sr), fh, separators=(',', ':'))
+    sizes = [os.path.getsize(p) for p in (wav_path, opus_path, m4a_path)]
+    print(f"✓ Encoded {wav_path}: {sizes[0] // 1024} KB wav -> "
+          f"{sizes[1] // 1024} KB opus, {sizes[2] // 1024} KB m4a")
+
+
+def collect_jobs(root=AUDIO_ROOT, opus_bitrate=OPUS_BITRATE, aac_bitrate=AAC_BITRATE):
+    """encode_clip argument tuples for every WAV under root, in a stable order."""
+    jobs = []
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames.sort()
+        for name in sorted(filenames):
+            if name.lower().endswith('.wav'):
+                wav_path = os.path.join(dirpath, name)
+                jobs.append((wav_path, *variant_paths(wav_path), opus_bitrate, aac_bitrate))
+    return jobs
+
+
+def encode_params(job):
+    """Parameters that determine the content of a clip's web assets."""
+    return {'opus_bitrate': job[4], 'aac_bitrate': job[5], 'samples_per_pixel': SAMPLES_PER_PIXEL}
+
+
+def stale_jobs(jobs, manifest, force=False):
+    """Keep only clips with at least one missing or out of date output."""
+    if force:
+        return list(jobs)
+    stale = [job for job in jobs
+             if any(manifest.is_stale(out, [job[0]], encode_params(job)) for out in job[1:4])]
+    if len(stale) < len(jobs):
+        print(f"Skipping {len(jobs) - len(stale)} up-to-date clips")
+    return stale
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Encode the page's WAVs to Opus/AAC and write waveform peaks.")
+    parser.add_argument('--root', default=AUDIO_ROOT, help="Directory searched for WAVs")
+    parser.add_argument('-j', '--jobs', type=int, default=default_jobs(),
+                        help="Number of worker processes (1 = serial, default: all cores)")
+    parser.add_argument('--opus-bitrate', default=OPUS_BITRATE)
+    parser.add_argument('--aac-bitrate', default=AAC_BITRATE)
+    parser.add_argument('--force', action='store_true',
+                        help="Re-encode every clip even if the manifest says it is up to date")
+    parser.add_argument('--manifest', default=DEFAULT_MANIFEST_PATH,
+                        help="Path of the incremental build manifest")
+    profiling.add_profile_argument(parser)
+    args = parser.parse_args(argv)
+    profiling.start(args.profile)
+
+    manifest = BuildManifest(args.manifest)
+    jobs = stale_jobs(collect_jobs(args.root, args.opus_bitrate, args.aac_bitrate), manifest, force=args.force)
+    outcomes = run_batch(encode_clip, jobs, n_jobs=args.jobs, title="Encoding audio")
+    for job, _, error in outcomes:
+        if error is None:
+            for out in job[1:4]:
+                manifest.record(out, [job[0]], encode_params(job))
+    manifest.save()
+
+    if any(error is not None for _, _, error in outcomes):
+        return 1
+    print("\n✓ All audio assets encoded successfully!")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
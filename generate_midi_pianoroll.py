@@ -1,10 +1,33 @@
-import pretty_midi
-import matplotlib.pyplot as plt
+import argparse
 import numpy as np
 import os
 
+import profiling
+from batch_runner import default_jobs, run_batch
+from build_manifest import DEFAULT_MANIFEST_PATH, BuildManifest
+from midi_note_index import extract_notes, write_note_index
+from spectrogram_raster import save_png
+
+# Style shared by the matplotlib and raster renderers
+BACKGROUND = '#1a1a2e'
+NOTE_FACE = '#28a745'
+NOTE_EDGE = '#20c997'
+FRAME_ALPHA = 0.3
+NOTE_HEIGHT = 0.8          # fraction of a semitone row covered by a note
+DPI = 150
+INCHES_PER_SECOND = 2
+FIGURE_HEIGHT = 2.85       # inches
+MIN_WIDTH_INCHES = 10
+PAD_PX = 8                 # savefig(pad_inches=0.05) at 150 dpi
+RASTER_CHUNK_COLUMNS = 8192
+OUTLINE = 256              # pixel code flag of note outlines in the raster renderer
+MIDI_EXTENSIONS = ('.mid', '.midi')
+
 def generate_piano_roll(midi_path, output_path, duration=None):
     """Generate a compact piano roll visualization from MIDI file"""
+    import matplotlib.pyplot as plt
+    import pretty_midi
+
     print(f"Loading MIDI: {midi_path}")
     
     # Load MIDI file
@@ -89,9 +112,10 @@ def generate_piano_roll(midi_path, output_path, duration=None):
         spine.set_alpha(0.3)
     
     # Save with transparent edges
-    plt.tight_layout(pad=0.1)
-    plt.savefig(output_path, facecolor='#1a1a2e', edgecolor='none', 
-                bbox_inches='tight', pad_inches=0.05, dpi=150, transparent=False)
+    with profiling.stage('savefig', path=output_path):
+        plt.tight_layout(pad=0.1)
+        plt.savefig(output_path, facecolor='#1a1a2e', edgecolor='none', 
+                    bbox_inches='tight', pad_inches=0.05, dpi=150, transparent=False)
     plt.close()
     
     print(f"  Saved piano roll to: {output_path}")
@@ -100,7 +124,175 @@ def generate_piano_roll(midi_path, output_path, duration=None):
     
     return total_duration  # Return duration for HTML metadata
 
-if __name__ == '__main__':
+def _rgb(hex_color):
+    return np.array([int(hex_color[i:i + 2], 16) for i in (1, 3, 5)], dtype=np.float32)
+
+
+def pitch_range(pitch):
+    """Displayed (min_pitch, max_pitch): the notes' range plus 2 semitones, 36-84 without notes."""
+    if len(pitch) == 0:
+        return 36, 84
+    return max(0, int(pitch.min()) - 2), min(127, int(pitch.max()) + 2)
+
+
+def note_color_lut():
+    """
+    (2 * OUTLINE, 3) uint8 colours by pixel code: 0 is the background,
+    1 + velocity a note's fill and OUTLINE + 1 + velocity its outline, blended
+    at alpha 0.4-1.0 by velocity.
+    """
+    alpha = (0.4 + np.arange(128) / 127.0 * 0.6)[:, None]
+    background = _rgb(BACKGROUND)
+    lut = np.empty((2 * OUTLINE, 3), dtype=np.float32)
+    lut[:] = background
+    lut[1:129] = background * (1 - alpha) + _rgb(NOTE_FACE) * alpha
+    lut[OUTLINE + 1:OUTLINE + 129] = background * (1 - alpha) + _rgb(NOTE_EDGE) * alpha
+    return np.round(lut).astype(np.uint8)
+
+
+def rasterize_piano_roll(start, end, pitch, velocity, duration, width, height, pitch_lo, pitch_hi,
+                         out=None, chunk=RASTER_CHUNK_COLUMNS):
+    """
+    Piano roll of note arrays as an RGB uint8 image (height, width, 3), in the
+    style of generate_piano_roll: notes NOTE_HEIGHT of a row tall, filled with
+    NOTE_FACE and outlined with NOTE_EDGE at alpha 0.4-1.0 by velocity.
+
+    Notes are written into a (pitch, column) matrix of pixel codes with one
+    scatter over all their columns; image rows index that matrix and the codes
+    go through note_color_lut(), so no Python code runs per note or per pixel.
+    If given, out is the (height, width, 3) array written to.
+    """
+    n_rows = pitch_hi - pitch_lo + 1
+    sx = width / max(duration, 1e-9)
+    sy = height / max(pitch_hi - pitch_lo, 1)
+
+    keep = (pitch >= pitch_lo) & (pitch <= pitch_hi) & (start < duration)
+    rows = pitch[keep].astype(np.intp) - pitch_lo
+    x0 = np.clip(np.floor(start[keep] * sx).astype(np.intp), 0, width - 1)
+    x1 = np.clip(np.round(end[keep] * sx).astype(np.intp), x0 + 1, width)
+    code = velocity[keep].astype(np.uint16) + 1
+
+    # Loudest note covering every (pitch, column); outline flag at both note ends
+    lengths = x1 - x0
+    offsets = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+    codes = np.zeros((n_rows + 1, width), dtype=np.uint16)   # last row: between notes
+    np.maximum.at(codes, (np.repeat(rows, lengths), np.repeat(x0, lengths) + offsets),
+                  np.repeat(code, lengths))
+    edge = np.zeros((n_rows + 1, width), dtype=np.uint16)
+    edge[rows, x0] = OUTLINE
+    edge[rows, x1 - 1] = OUTLINE
+
+    # Image row -> pitch row (n_rows between notes); the top / bottom row of each band is outline
+    value = pitch_hi - (np.arange(height) + 0.5) / sy
+    row_of = np.floor(value).astype(np.intp)
+    inside = (value - row_of < NOTE_HEIGHT) & (row_of >= pitch_lo) & (row_of <= pitch_hi)
+    row_of = np.where(inside, row_of - pitch_lo, n_rows)
+    band_edge = inside & ((np.roll(row_of, 1) != row_of) | (np.roll(row_of, -1) != row_of))
+    band_edge[[0, -1]] = inside[[0, -1]]
+    fill = np.where(codes > 0, codes | edge, 0)
+    outline = np.where(codes > 0, codes | OUTLINE, 0)
+
+    # Colour each pitch row once, then copy rows into the image
+    lut = note_color_lut()
+    if out is None:
+        out = np.empty((height, width, 3), dtype=np.uint8)
+    for c0 in range(0, width, chunk):
+        c1 = min(width, c0 + chunk)
+        colored = np.stack([lut[fill[:, c0:c1]], lut[outline[:, c0:c1]]])
+        out[:, c0:c1] = colored[band_edge.astype(np.intp), row_of]
+    return out
+
+
+def framed_canvas(width, height, pad=PAD_PX):
+    """
+    Background image with room for an axes of (height, width) and the faint
+    frame around it, as savefig(bbox_inches='tight') leaves it; returns
+    (image, axes view).
+    """
+    background = _rgb(BACKGROUND)
+    image = np.empty((height + 2 * pad, width + 2 * pad, 3), dtype=np.uint8)
+    # Only the margins: the axes area is drawn over completely
+    for margin in (image[:pad], image[-pad:], image[:, :pad], image[:, -pad:]):
+        margin[:] = background.astype(np.uint8)
+    frame = np.round(background * (1 - FRAME_ALPHA) + _rgb(NOTE_FACE) * FRAME_ALPHA).astype(np.uint8)
+    image[[pad - 1, pad + height], pad - 1:pad + width + 1] = frame
+    image[pad - 1:pad + height + 1, [pad - 1, pad + width]] = frame
+    return image, image[pad:pad + height, pad:pad + width]
+
+
+def render_piano_roll_raster(midi_path, output_path, inches_per_second=INCHES_PER_SECOND, dpi=DPI):
+    """Rasterized counterpart of generate_piano_roll for batch use; returns the MIDI duration."""
+    import pretty_midi
+    midi_data = pretty_midi.PrettyMIDI(midi_path)
+    start, end, pitch, velocity = extract_notes(midi_data)
+    duration = midi_data.get_end_time()
+    width = int(round(max(MIN_WIDTH_INCHES, duration * inches_per_second) * dpi)) - 2 * PAD_PX
+    height = int(round(FIGURE_HEIGHT * dpi)) - 2 * PAD_PX
+    pitch_lo, pitch_hi = pitch_range(pitch)
+    image, axes = framed_canvas(width, height)
+    with profiling.stage('rasterize_piano_roll', notes=len(start)):
+        rasterize_piano_roll(start, end, pitch, velocity, duration, width, height, pitch_lo, pitch_hi, out=axes)
+    os.makedirs(os.path.dirname(output_path) or '.', exist_ok=True)
+    save_png(image, output_path)
+    return duration
+
+
+def collect_batch_jobs(midi_dir, out_dir, inches_per_second=INCHES_PER_SECOND, dpi=DPI):
+    """render_piano_roll_raster jobs for every MIDI file under midi_dir, mirrored into out_dir."""
+    jobs = []
+    for dirpath, dirnames, filenames in os.walk(midi_dir):
+        dirnames.sort()
+        for name in sorted(filenames):
+            if name.lower().endswith(MIDI_EXTENSIONS):
+                midi_path = os.path.join(dirpath, name)
+                rel = os.path.splitext(os.path.relpath(midi_path, midi_dir))[0] + '.png'
+                jobs.append((midi_path, os.path.join(out_dir, rel), inches_per_second, dpi))
+    return jobs
+
+
+def raster_params(job):
+    """Parameters that determine the content of a batch piano roll."""
+    return {'renderer': 'raster', 'inches_per_second': job[2], 'dpi': job[3]}
+
+
+def render_batch(midi_dir, out_dir, n_jobs=None, force=False, manifest_path=DEFAULT_MANIFEST_PATH,
+                 inches_per_second=INCHES_PER_SECOND, dpi=DPI):
+    """Render every MIDI file under midi_dir over a process pool; returns run_batch outcomes."""
+    manifest = BuildManifest(manifest_path)
+    jobs = collect_batch_jobs(midi_dir, out_dir, inches_per_second, dpi)
+    stale = [job for job in jobs if force or manifest.is_stale(job[1], [job[0]], raster_params(job))]
+    if len(stale) < len(jobs):
+        print(f"Skipping {len(jobs) - len(stale)} up-to-date piano rolls")
+    outcomes = run_batch(render_piano_roll_raster, stale, n_jobs=n_jobs, title="Rendering piano rolls")
+    for job, _, error in outcomes:
+        if error is None:
+            manifest.record(job[1], [job[0]], raster_params(job))
+    manifest.save()
+    return outcomes
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Piano-roll images and the page's note index.")
+    parser.add_argument('--batch', metavar='MIDI_DIR',
+                        help="Rasterize every MIDI file under this directory (e.g. the stem-gmd base_dir)")
+    parser.add_argument('--out-dir', default='static/images/piano_rolls',
+                        help="Output directory of --batch (mirrors the input tree)")
+    parser.add_argument('-j', '--jobs', type=int, default=default_jobs(),
+                        help="Number of worker processes (1 = serial, default: all cores)")
+    parser.add_argument('--inches-per-second', type=float, default=INCHES_PER_SECOND)
+    parser.add_argument('--force', action='store_true',
+                        help="Re-render every file even if the manifest says it is up to date")
+    parser.add_argument('--manifest', default=DEFAULT_MANIFEST_PATH,
+                        help="Path of the incremental build manifest")
+    profiling.add_profile_argument(parser)
+    args = parser.parse_args(argv)
+    profiling.start(args.profile)
+
+    if args.batch:
+        outcomes = render_batch(args.batch, args.out_dir, n_jobs=args.jobs, force=args.force,
+                                manifest_path=args.manifest, inches_per_second=args.inches_per_second)
+        return 1 if any(error is not None for _, _, error in outcomes) else 0
+
     # Path to MIDI file
     midi_file = 'static/1_funk-groove1_138_beat_4-4.mid'
     output_file = 'static/images/piano_roll_midi.png'
@@ -115,3 +307,15 @@ if __name__ == '__main__':
         print(f"Duration: {duration:.2f}s")
     else:
         print(f"Error: MIDI file not found: {midi_file}")
+
+    # Note index the page's piano roll draws from (instead of parsing the MIDI in the browser)
+    page_midi_file = 'static/audio/dataset/midi/1_funk-groove1_138_beat_4-4.mid'
+    if os.path.exists(page_midi_file):
+        write_note_index(page_midi_file)
+    else:
+        print(f"Error: MIDI file not found: {page_midi_file}")
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
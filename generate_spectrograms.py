@@ -1,53 +1,114 @@
-import librosa
-import librosa.display
-import matplotlib.pyplot as plt
-import numpy as np
+import argparse
+import json
 import os
-import soundfile as sf
+from functools import partial
 
-def trim_audio_last_seconds(audio_path, output_path, last_seconds=5):
-    """Trim audio to last N seconds and save to output_path."""
-    y, sr = librosa.load(audio_path, sr=None)
-    n_samples = int(sr * last_seconds)
-    y_trimmed = y[-n_samples:] if len(y) > n_samples else y
-    os.makedirs(os.path.dirname(output_path), exist_ok=True)
-    sf.write(output_path, y_trimmed, sr)
-    print(f"✓ Trimmed to last {last_seconds}s: {output_path}")
+import profiling
+from audio_io import audio_info, last_seconds_span, load_audio, load_last_seconds
+from batch_runner import default_jobs, run_batch
+from build_manifest import DEFAULT_MANIFEST_PATH, BuildManifest
+from spectrogram import stft_db_grouped
+from spectrogram_cache import default_cache
+from spectrogram_raster import colorize, save_png
+from spectrogram_tiles import DESCRIPTOR, tile_image_file, tiles_dir_for, write_tile_pyramid
+from streaming_spectrogram import generate_spectrogram_streaming
 
+# Rendering parameters (recorded in the build manifest for every output)
+N_FFT = 1024
+HOP_LENGTH = 128
+DPI = 150
+COLORMAP = 'magma'
+FIG_HEIGHT_IN = 3
+RENDERERS = ('raster', 'matplotlib')
+# Clips longer than this are rendered block by block with bounded memory
+STREAM_MIN_SECONDS = 120
+# Offset/duration of the clip windows the page plays (read by static/js/audio-assets.js)
+SEGMENTS_PATH = "static/audio/segments.json"
+PAGE_CLIP_SECONDS = 5
 
-def generate_spectrogram(audio_path, output_path, duration=None, last_seconds=None):
-    """Generate a spectrogram from audio. If last_seconds is set, use only the last N seconds."""
+
+def write_segment_manifest(sources, path=SEGMENTS_PATH, last_seconds=PAGE_CLIP_SECONDS):
+    """
+    Write {source: {offset, duration}} for the last `last_seconds` of every source.
+
+    The page plays these windows straight from the original files, so no
+    trimmed copy of the audio is written.
+    """
+    segments = {}
+    for src in sources:
+        offset, duration = last_seconds_span(src, last_seconds)
+        segments[src] = {'offset': round(offset, 6), 'duration': round(duration, 6)}
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as fh:
+        json.dump({'version': 1, 'segments': segments}, fh, indent=1, sort_keys=True)
+    os.replace(tmp_path, path)
+    print(f"✓ Wrote {len(segments)} clip segments (last {last_seconds}s) to {path}")
+    return segments
+
+
+def load_clip(audio_path, last_seconds=None):
+    """Load a clip for a spectrogram. If last_seconds is set, read only the last N seconds."""
     print(f"Loading audio: {audio_path}")
     
-    # Load full audio
-    y, sr = librosa.load(audio_path, sr=None)
-    total_duration = len(y) / sr
-    
     if last_seconds is not None:
-        # Trim to last N seconds
-        n_samples = int(sr * last_seconds)
-        y = y[-n_samples:] if len(y) > n_samples else y
-        total_duration = len(y) / sr
-        print(f"  Total duration: {total_duration:.2f}s (last {last_seconds}s of file)")
+        # Read only the last N seconds
+        y, sr = load_last_seconds(audio_path, last_seconds)
+        print(f"  Total duration: {len(y) / sr:.2f}s (last {last_seconds}s of file)")
     else:
-        print(f"  Total duration: {total_duration:.2f}s")
-    print(f"  Generating spectrogram")
-    
-    # Compute STFT
-    D = librosa.stft(y, n_fft=1024, hop_length=128)
-    stft_db = librosa.amplitude_to_db(np.abs(D), ref=np.max)
-    
-    # Calculate width based on duration (wider for longer audio)
+        # Load full audio
+        y, sr = load_audio(audio_path)
+        print(f"  Total duration: {len(y) / sr:.2f}s")
+    return y, sr
+
+
+def clip_info(audio_path, last_seconds=None):
+    """(native sample rate, samples) of the clip load_clip reads, without decoding it."""
+    sr, frames = audio_info(audio_path)
+    if last_seconds is not None:
+        frames = min(frames, int(sr * last_seconds))
+    return sr, frames
+
+
+def spectrogram_cache_params(sr, last_seconds=None):
+    """Transform parameters of a page spectrogram, as keyed in the spectrogram cache."""
+    return {'kind': 'stft_db', 'sr': sr, 'n_fft': N_FFT, 'hop_length': HOP_LENGTH,
+            'window': 'hann', 'center': True, 'last_seconds': last_seconds}
+
+
+def figure_width_inches(total_duration):
+    """Width of a spectrogram image, wider for longer audio (at least 8 inches)."""
     # Use approximately 100 pixels per second for good detail
-    width_in_inches = max(8, total_duration * 1.2)  # At least 8 inches, scale with duration
+    return max(8, total_duration * 1.2)
+
+
+def render_spectrogram_raster(stft_db, sr, output_path, total_duration, tiles=True):
+    """Render a precomputed dB spectrogram straight to PNG pixels (same look as render_spectrogram)."""
+    width_in_inches = figure_width_inches(total_duration)
+    size = (int(round(width_in_inches * DPI)), FIG_HEIGHT_IN * DPI)
+    image = colorize(stft_db, size, y_axis='log', sr=sr, n_fft=N_FFT, cmap=COLORMAP)
+    save_png(image, output_path)
+    print(f"✓ Saved full-length spectrogram: {output_path} ({size[0]}x{size[1]} px)")
+    if tiles:
+        write_tile_pyramid(image, tiles_dir_for(output_path))
+
+
+def render_spectrogram(stft_db, sr, output_path, total_duration, tiles=True):
+    """Render a precomputed dB spectrogram to an axis-less PNG."""
+    # Matplotlib is only loaded for this renderer
+    import librosa.display
+    import matplotlib.pyplot as plt
+
+    # Calculate width based on duration (wider for longer audio)
+    width_in_inches = figure_width_inches(total_duration)
     
     # Create figure with dynamic width
-    fig = plt.figure(figsize=(width_in_inches, 3), facecolor='none')
+    fig = plt.figure(figsize=(width_in_inches, FIG_HEIGHT_IN), facecolor='none')
     ax = fig.add_subplot(111)
     
     # Plot spectrogram with better color scheme
-    img = librosa.display.specshow(stft_db, x_axis='time', y_axis='log', 
-                                    ax=ax, sr=sr, cmap='magma')
+    with profiling.stage('specshow'):
+        img = librosa.display.specshow(stft_db, x_axis='time', y_axis='log', 
+                                        ax=ax, sr=sr, cmap=COLORMAP)
     
     # Remove axes for cleaner look
     ax.set_xlabel('')
@@ -62,14 +123,96 @@ def generate_spectrogram(audio_path, output_path, duration=None, last_seconds=No
     ax.spines['left'].set_visible(False)
     
     # Save with tight layout
-    plt.tight_layout(pad=0)
-    plt.savefig(output_path, dpi=150, bbox_inches='tight', 
-                pad_inches=0, transparent=False, facecolor='#1a1a2e')
+    with profiling.stage('savefig', path=output_path):
+        plt.tight_layout(pad=0)
+        plt.savefig(output_path, dpi=DPI, bbox_inches='tight', 
+                    pad_inches=0, transparent=False, facecolor='#1a1a2e')
     plt.close()
     
     print(f"✓ Saved full-length spectrogram: {output_path} ({width_in_inches:.1f} inches wide)")
+    if tiles:
+        tile_image_file(output_path)
 
-if __name__ == "__main__":
+
+def generate_spectrogram(audio_path, output_path, duration=None, last_seconds=None, renderer='raster',
+                         tiles=True):
+    """Generate a spectrogram from audio. If last_seconds is set, use only the last N seconds."""
+    generate_spectrogram_group([(audio_path, output_path, duration, last_seconds)], renderer=renderer,
+                               tiles=tiles)
+
+
+def generate_spectrogram_group(items, label=None, renderer='raster', tiles=True):
+    """
+    Generate spectrograms for a group of (audio_path, output_path, duration, last_seconds) items.
+
+    Clips of equal length share one batched STFT pass. renderer='raster' writes
+    the pixels directly; 'matplotlib' goes through specshow/savefig. Clips
+    longer than STREAM_MIN_SECONDS are always streamed (raster) block by block.
+    With tiles=True every image also gets its tile pyramid (spectrogram_tiles.py).
+    """
+    render = render_spectrogram_raster if renderer == 'raster' else render_spectrogram
+    in_memory = []
+    for item in items:
+        sr, frames = audio_info(item[0])
+        seconds = frames / sr if item[3] is None else min(frames / sr, item[3])
+        if seconds > STREAM_MIN_SECONDS:
+            # Long recording: never hold the whole signal or STFT in memory
+            generate_spectrogram_streaming(
+                item[0], item[1], px_per_second=1.2 * DPI, height=FIG_HEIGHT_IN * DPI,
+                min_width=8 * DPI, n_fft=N_FFT, hop_length=HOP_LENGTH, cmap=COLORMAP,
+                last_seconds=item[3], tiles_dir=tiles_dir_for(item[1]) if tiles else None
+            )
+        else:
+            in_memory.append(item)
+    items = in_memory
+    if not items:
+        return
+
+    print(f"  Generating {len(items)} spectrogram(s)")
+    clips = [clip_info(item[0], item[3]) for item in items]
+
+    def compute_missing(indices):
+        # Compute STFT (batched per clip length)
+        signals = [load_clip(items[i][0], items[i][3])[0] for i in indices]
+        return stft_db_grouped(signals, n_fft=N_FFT, hop_length=HOP_LENGTH)
+
+    requests = [(item[0], spectrogram_cache_params(sr, item[3])) for item, (sr, _) in zip(items, clips)]
+    specs = default_cache().get_or_compute_many(requests, compute_missing)
+    for item, (sr, n_samples), stft_db in zip(items, clips, specs):
+        render(stft_db, sr, item[1], n_samples / sr, tiles=tiles)
+
+# Best FAD Comparison files (Baseline v180, MiDiff v181)
+BEST_FAD_FILENAMES = [
+    'drummer1_1_funk-groove1_138_beat_4-4_bluebird.wav',
+    'drummer1_2_funk-groove2_105_beat_4-4_brooklyn.wav',
+    'drummer1_3_soul-groove3_86_beat_4-4_detroit_garage.wav',
+    'drummer1_4_soul-groove4_80_beat_4-4_east_bay.wav',
+    'drummer1_5_funk-groove5_84_beat_4-4_heavy.wav',
+    'drummer1_6_hiphop-groove6_87_beat_4-4_motown_revisited.wav',
+    'drummer1_7_pop-groove7_138_beat_4-4_portland.wav',
+    'drummer1_8_rock-groove8_65_beat_4-4_retro_rock.wav',
+    'drummer1_9_soul-groove9_105_beat_4-4_roots.wav',
+    'drummer1_10_soul-groove10_102_beat_4-4_socal.wav',
+]
+
+VELOCITY_SWEEP_FILENAME = "drummer1_1_funk-groove1_138_beat_4-4_bluebird.wav"
+VELOCITY_SWEEP_DIRS = ["velocity_0", "velocity_1", "velocity_20", "velocity_40", "velocity_60", "velocity_80", "velocity_100", "velocity_127", "random_velocity"]
+
+
+def collect_segment_sources():
+    """Source WAVs the page plays only the last PAGE_CLIP_SECONDS of."""
+    # Velocity sweep v181 (drummer1_1_funk-groove1_138_beat_4-4_bluebird)
+    sources = [f"static/audio/midi_conditioned/velocity_sweep_v181/{d}/{VELOCITY_SWEEP_FILENAME}"
+               for d in VELOCITY_SWEEP_DIRS]
+    # Best FAD comparison (Baseline v180, MiDiff v181)
+    for f in BEST_FAD_FILENAMES:
+        sources.append(f"static/audio/baseline/version_180/{f}")
+        sources.append(f"static/audio/midi_conditioned/version_181/{f}")
+    return sources
+
+
+def collect_spectrogram_jobs():
+    """(audio_path, output_path, duration, last_seconds) jobs for every spectrogram on the page."""
     # Generate spectrograms for clean and noisy audio
     # audio_files = [
     #     ("static/clean_10_soul-groove10_102_4-4_bluebird.wav", 
@@ -77,14 +220,6 @@ if __name__ == "__main__":
     #     ("static/noisy_10_soul-groove10_102_4-4_bluebird_v1_noisy.wav", 
     #      "static/images/spec_noisy.png")
     # ]
-    
-    # # Add baseline folder spectrograms
-    baseline_files = [
-        "epoch=0_10_soul-groove10_102_4-4_bluebird_v1_noisy.wav",
-        "epoch=10_10_soul-groove10_102_4-4_bluebird_v1_noisy.wav",
-        "epoch=20_10_soul-groove10_102_4-4_bluebird_v1_noisy.wav",
-        "epoch=30_10_soul-groove10_102_4-4_bluebird_v1_noisy.wav"
-    ]
     audio_files = []
     epochs = [0, 10, 20, 30, 40, 50]
     for epoch in epochs:
@@ -97,59 +232,12 @@ if __name__ == "__main__":
         output_path = f"static/images/midi_film_conditioned_epoch_{epoch}.png"
         audio_files.append((audio_path, output_path))
 
-    # Velocity sweep v181: trim to last 5s and generate spectrograms (drummer1_1_funk-groove1_138_beat_4-4_bluebird)
-    velocity_sweep_f = "drummer1_1_funk-groove1_138_beat_4-4_bluebird.wav"
-    velocity_sweep_dirs = ["velocity_0", "velocity_1", "velocity_20", "velocity_40", "velocity_60", "velocity_80", "velocity_100", "velocity_127", "random_velocity"]
-    for d in velocity_sweep_dirs:
-        src = f"static/audio/midi_conditioned/velocity_sweep_v181/{d}/{velocity_sweep_f}"
-        dst = f"static/audio/midi_conditioned/velocity_sweep_v181_last5/{d}/{velocity_sweep_f}"
-        if os.path.exists(src):
-            trim_audio_last_seconds(src, dst, last_seconds=5)
-    for d in velocity_sweep_dirs:
-        audio_path = f"static/audio/midi_conditioned/velocity_sweep_v181/{d}/{velocity_sweep_f}"
+    # Velocity sweep v181 spectrograms
+    for d in VELOCITY_SWEEP_DIRS:
+        audio_path = f"static/audio/midi_conditioned/velocity_sweep_v181/{d}/{VELOCITY_SWEEP_FILENAME}"
         output_path = f"static/images/velocity_sweep_v181_{d}.png"
         audio_files.append((audio_path, output_path, 5))  # last_seconds=5 for spectrogram
 
-    # Add Best FAD Comparison spectrograms (Baseline v180, MiDiff v181)
-    best_fad_filenames = [
-        'drummer1_1_funk-groove1_138_beat_4-4_bluebird.wav',
-        'drummer1_2_funk-groove2_105_beat_4-4_brooklyn.wav',
-        'drummer1_3_soul-groove3_86_beat_4-4_detroit_garage.wav',
-        'drummer1_4_soul-groove4_80_beat_4-4_east_bay.wav',
-        'drummer1_5_funk-groove5_84_beat_4-4_heavy.wav',
-        'drummer1_6_hiphop-groove6_87_beat_4-4_motown_revisited.wav',
-        'drummer1_7_pop-groove7_138_beat_4-4_portland.wav',
-        'drummer1_8_rock-groove8_65_beat_4-4_retro_rock.wav',
-        'drummer1_9_soul-groove9_105_beat_4-4_roots.wav',
-        'drummer1_10_soul-groove10_102_beat_4-4_socal.wav',
-    ]
-    # Create 5-second trimmed audio for Best FAD (play only last 5s)
-    for f in best_fad_filenames:
-        trim_audio_last_seconds(
-            f"static/audio/baseline/version_180/{f}",
-            f"static/audio/baseline/version_180_last5/{f}",
-            last_seconds=5
-        )
-        trim_audio_last_seconds(
-            f"static/audio/midi_conditioned/version_181/{f}",
-            f"static/audio/midi_conditioned/version_181_last5/{f}",
-            last_seconds=5
-        )
-
-    best_fad_entries = []
-    for f in best_fad_filenames:
-        base = f.replace('.wav', '')
-        best_fad_entries.append((
-            f"static/audio/baseline/version_180/{f}",
-            f"static/images/baseline_v180_{base}.png",
-            5  # last_seconds for spectrogram
-        ))
-        best_fad_entries.append((
-            f"static/audio/midi_conditioned/version_181/{f}",
-            f"static/images/midiff_v181_{base}.png",
-            5  # last_seconds for spectrogram
-        ))
-
     # Add CFG spectrograms
     cfg_files = [
         # Baseline (w=0)
@@ -174,19 +262,148 @@ if __name__ == "__main__":
     ]
     audio_files.extend(dataset_files)
 
+    # Best FAD Comparison spectrograms (Baseline v180, MiDiff v181)
+    for f in BEST_FAD_FILENAMES:
+        base = f.replace('.wav', '')
+        audio_files.append((
+            f"static/audio/baseline/version_180/{f}",
+            f"static/images/baseline_v180_{base}.png",
+            5  # last_seconds for spectrogram
+        ))
+        audio_files.append((
+            f"static/audio/midi_conditioned/version_181/{f}",
+            f"static/images/midiff_v181_{base}.png",
+            5  # last_seconds for spectrogram
+        ))
+
+    jobs = []
     for item in audio_files:
         audio_path, output_path = item[0], item[1]
         last_seconds = item[2] if len(item) > 2 else None
-        if os.path.exists(audio_path):
-            generate_spectrogram(audio_path, output_path, last_seconds=last_seconds)
-        else:
-            print(f"Warning: Audio file not found: {audio_path}")
+        jobs.append((audio_path, output_path, None, last_seconds))
+    return jobs
+
+
+def spectrogram_params(job, renderer='raster', tiles=True):
+    """Parameters that determine the content of a spectrogram image (and its tile pyramid)."""
+    return {'n_fft': N_FFT, 'hop_length': HOP_LENGTH, 'duration': job[2],
+            'last_seconds': job[3], 'dpi': DPI, 'cmap': COLORMAP, 'renderer': renderer,
+            'tiles': tiles}
+
+
+def extra_outputs(job, params):
+    """Files a spectrogram job writes besides its PNG: the tile pyramid directory and its descriptor."""
+    if not params.get('tiles'):
+        return ()
+    tiles_dir = tiles_dir_for(job[1])
+    return (tiles_dir, os.path.join(tiles_dir, DESCRIPTOR))
+
 
-    for item in best_fad_entries:
-        audio_path, output_path, last_seconds = item
-        if os.path.exists(audio_path):
-            generate_spectrogram(audio_path, output_path, last_seconds=last_seconds)
+def stale_jobs(jobs, manifest, params_fn, force=False):
+    """Keep only jobs whose output (or one of its extra outputs) is missing or out of date in the manifest."""
+    if force:
+        return list(jobs)
+    stale = [job for job in jobs
+             if manifest.is_stale(job[1], [job[0]], params_fn(job), extra_outputs(job, params_fn(job)))]
+    if len(stale) < len(jobs):
+        print(f"Skipping {len(jobs) - len(stale)} up-to-date outputs")
+    return stale
+
+
+def group_jobs(jobs, n_jobs, renderer='raster', tiles=True):
+    """
+    Pack spectrogram jobs into (items, label, renderer, tiles) group jobs for generate_spectrogram_group.
+
+    Jobs sharing last_seconds (hence clip length) go together so they share a
+    batched STFT; groups are split so every worker still gets work.
+    """
+    buckets = {}
+    for job in jobs:
+        buckets.setdefault(job[3], []).append(job)
+    chunk = max(1, -(-len(jobs) // max(1, n_jobs)))
+    groups = []
+    for bucket in buckets.values():
+        for i in range(0, len(bucket), chunk):
+            items = tuple(bucket[i:i + chunk])
+            label = items[0][1] if len(items) == 1 else f"{items[0][1]} (+{len(items) - 1} more)"
+            groups.append((items, label, renderer, tiles))
+    return groups
+
+
+def record_outcomes(outcomes, manifest, params_fn):
+    """Record every successfully built output in the manifest."""
+    for job, _, error in outcomes:
+        if error is None:
+            params = params_fn(job)
+            manifest.record(job[1], [job[0]], params, extra_outputs(job, params))
+
+
+def ungroup_outcomes(outcomes):
+    """Expand group outcomes back into per-item outcomes."""
+    return [(item, result, error) for (items, *_), result, error in outcomes for item in items]
+
+
+def existing_jobs(jobs):
+    """Drop jobs whose source audio is missing, with a warning for each."""
+    kept = []
+    for job in jobs:
+        if os.path.exists(job[0]):
+            kept.append(job)
         else:
-            print(f"Warning: Audio file not found: {audio_path}")
-    
+            print(f"Warning: Audio file not found: {job[0]}")
+    return kept
+
+
+def page_segment_sources():
+    """collect_segment_sources() that exist on disk."""
+    return [job[0] for job in existing_jobs((src,) for src in collect_segment_sources())]
+
+
+def segments_main(argv=None):
+    """Only (re)write the clip segment manifest: the page's "trimmed" clips, without any rendering."""
+    parser = argparse.ArgumentParser(description="Write the clip segment manifest the page's players trim their sources with.")
+    parser.add_argument('sources', nargs='*',
+                        help="Source WAVs (default: the velocity sweep and best-FAD clips of the page)")
+    parser.add_argument('--last-seconds', type=float, default=PAGE_CLIP_SECONDS,
+                        help="Length of the window at the end of every source")
+    parser.add_argument('-o', '--output', default=SEGMENTS_PATH, help="Segment manifest path")
+    args = parser.parse_args(argv)
+    write_segment_manifest(args.sources or page_segment_sources(), args.output, args.last_seconds)
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate the clip segment manifest and spectrogram images for the results page.")
+    parser.add_argument('-j', '--jobs', type=int, default=default_jobs(),
+                        help="Number of worker processes (1 = serial, default: all cores)")
+    parser.add_argument('--renderer', choices=RENDERERS, default='raster',
+                        help="raster: direct colormap lookup (fast, default); matplotlib: specshow + savefig")
+    parser.add_argument('--force', action='store_true',
+                        help="Rebuild every output even if the manifest says it is up to date")
+    parser.add_argument('--manifest', default=DEFAULT_MANIFEST_PATH,
+                        help="Path of the incremental build manifest")
+    parser.add_argument('--no-tiles', dest='tiles', action='store_false',
+                        help="Skip the tile pyramids used by the page's lazy spectrogram viewer")
+    profiling.add_profile_argument(parser)
+    args = parser.parse_args(argv)
+    profiling.start(args.profile)
+
+    manifest = BuildManifest(args.manifest)
+
+    write_segment_manifest(page_segment_sources())
+
+    spec_params = partial(spectrogram_params, renderer=args.renderer, tiles=args.tiles)
+    jobs = stale_jobs(existing_jobs(collect_spectrogram_jobs()), manifest, spec_params, force=args.force)
+    spec_outcomes = ungroup_outcomes(run_batch(generate_spectrogram_group, group_jobs(jobs, args.jobs, args.renderer, args.tiles),
+                                               n_jobs=args.jobs, title="Generating spectrograms"))
+    record_outcomes(spec_outcomes, manifest, spec_params)
+    manifest.save()
+
+    if any(error is not None for _, _, error in spec_outcomes):
+        return 1
     print("\n✓ All spectrograms generated successfully!")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
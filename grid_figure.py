@@ -0,0 +1,306 @@
+"""
+Grid figures of spectrograms for the paper: any N x M layout of (path, label) cells.
+
+A figure is described by a FigureSpec: its cells in row-major order, the
+number of columns, the audio window every cell shows (a fixed time range or
+the last N seconds of each file) and the output path without extension.
+paper_figures.py defines the paper's figures with it.
+
+Rendering keeps the vector outputs small and fast to draw:
+
+  * the spectrograms come from the shared on-disk cache (spectrogram_cache.py),
+    computed in one batched STFT on a miss, so they are computed once for all
+    formats and all worker processes;
+  * every cell is colourised with the raster renderer
+    (spectrogram_raster.colorize) at one pixel column per STFT frame and one
+    row per output pixel of axes height, and placed as an image in axes
+    coordinates: the vector formats (PDF, EPS, SVG) embed a RASTER_DPI image
+    instead of one vector quad per STFT bin, while the axes, ticks, labels
+    and colorbar stay vector; raster formats get the cells colourised at their
+    own dpi, so no frequency bin is dropped. The axes themselves are set up
+    by specshow (on a 1x1 placeholder spanning the same cell edges), so
+    scales and tick labels are exactly those of a full specshow;
+  * a figure's raster formats and its vector formats are two jobs over the
+    process pool, so the slow high-dpi PNG is saved while another worker
+    writes the PDF / EPS. Each worker lays a figure out once and saves every
+    format it is given from that layout (only the cell images are swapped
+    between resolutions), and the build manifest skips outputs whose audio
+    and settings are unchanged.
+
+Text uses Computer Modern mathtext unless usetex is asked for.
+"""
+
+import math
+import os
+from collections import namedtuple
+
+import numpy as np
+
+import profiling
+from audio_io import load_audio, load_last_seconds
+from batch_runner import run_batch
+from spectrogram import stft_db_grouped
+from spectrogram_cache import default_cache
+
+SR = 16000
+N_FFT = 1024
+HOP_LENGTH = 256
+COLORMAP = 'magma'
+FORMATS = ('png', 'pdf', 'eps')
+VECTOR_FORMATS = ('pdf', 'eps', 'svg')
+PNG_DPI = 600
+RASTER_DPI = 100           # image rows per inch of cell height in the vector formats
+STYLE_VERSION = 2          # bump when the drawing code changes the output
+
+Cell = namedtuple('Cell', ['path', 'label'])
+
+# cells: tuple of Cell, row-major. time_range: (start, end) seconds of every
+# file, or None; last_seconds: the last N seconds of every file instead.
+# cell_size: (width, height) inches per grid cell, spacing included.
+FigureSpec = namedtuple('FigureSpec', ['cells', 'cols', 'output_base', 'time_range', 'last_seconds',
+                                       'cell_size', 'formats', 'png_dpi'],
+                        defaults=((0, 2), None, (6, 4), FORMATS, PNG_DPI))
+
+
+def text_style(usetex=False):
+    """rcParams of the figure text: LaTeX, or the same Computer Modern look through mathtext."""
+    style = {'font.family': 'serif', 'text.usetex': usetex}
+    if usetex:
+        style['font.serif'] = ['Computer Modern Roman']
+    else:
+        style.update({'font.serif': ['cmr10'], 'mathtext.fontset': 'cm',
+                      'axes.formatter.use_mathtext': True})
+    return style
+
+
+def cache_params(spec):
+    """Transform parameters of a figure's spectrograms, as keyed in the spectrogram cache."""
+    params = {'kind': 'stft_db', 'sr': SR, 'n_fft': N_FFT, 'hop_length': HOP_LENGTH, 'window': 'hann',
+              'center': True}
+    if spec.last_seconds is not None:
+        params['last_seconds'] = spec.last_seconds
+    else:
+        params.update(offset=spec.time_range[0], duration=spec.time_range[1] - spec.time_range[0])
+    return params
+
+
+def load_window(path, spec):
+    """The samples of a cell at SR: its time range or its last seconds."""
+    if spec.last_seconds is not None:
+        return load_last_seconds(path, spec.last_seconds, sr=SR)[0]
+    start, end = spec.time_range
+    return load_audio(path, sr=SR, offset=start, duration=end - start)[0]
+
+
+def load_spectrograms(spec):
+    """dB spectrograms of every cell, from the shared on-disk cache when possible."""
+    def compute_missing(indices):
+        # All missing windows in one batched STFT pass
+        clips = [load_window(spec.cells[i].path, spec) for i in indices]
+        return stft_db_grouped(clips, n_fft=N_FFT, hop_length=HOP_LENGTH)
+
+    params = cache_params(spec)
+    return default_cache().get_or_compute_many([(cell.path, params) for cell in spec.cells], compute_missing)
+
+
+def grid_shape(spec):
+    """(rows, cols) of a figure."""
+    cols = max(1, min(spec.cols, len(spec.cells)))
+    return math.ceil(len(spec.cells) / cols), cols
+
+
+def _cell_edges(S_db):
+    """Outer (time, frequency) cell edges of a spectrogram, as specshow's autoscaled limits."""
+    from spectrogram_raster import _nearest_edges, bin_centers
+    times = np.arange(S_db.shape[1]) * HOP_LENGTH / SR
+    freqs = bin_centers(S_db.shape[0], 'log', SR, N_FFT)
+    return _nearest_edges(times)[[0, -1]], _nearest_edges(freqs)[[0, -1]]
+
+
+def draw_cell(ax, S_db):
+    """
+    One spectrogram: specshow-style log-frequency axes holding an (empty) image
+    in axes coordinates; set_cell_rows colourises it.
+    """
+    import librosa.display
+    from matplotlib.image import AxesImage
+
+    # Axes scales, limits and tick formatters from specshow, without drawing the data
+    x_edges, y_edges = _cell_edges(S_db)
+    placeholder = librosa.display.specshow(np.zeros((1, 1)), x_coords=x_edges, y_coords=y_edges, sr=SR,
+                                           hop_length=HOP_LENGTH, x_axis='time', y_axis='log', ax=ax)
+    placeholder.remove()
+
+    # In axes coordinates: the rows are spaced on the symlog frequency scale by colorize
+    artist = AxesImage(ax, interpolation='none', origin='upper', extent=(0, 1, 0, 1), transform=ax.transAxes)
+    ax.add_image(artist)
+    return artist
+
+
+class GridFigure:
+    """A laid-out grid figure whose cell images can be colourised for any output dpi."""
+
+    def __init__(self, fig, cells, vmin, vmax):
+        self.fig = fig
+        self.cells = cells      # [(AxesImage, S_db)]
+        self.vmin, self.vmax = vmin, vmax
+        self.rows = None
+        self.bbox = None
+
+    def set_dpi(self, dpi):
+        """Colourise every cell with one image row per output pixel of its axes height at dpi."""
+        from spectrogram_raster import colorize
+
+        height = self.cells[0][0].axes.get_position().height * self.fig.get_figheight()
+        rows = max(2, int(round(height * dpi)))
+        if rows == self.rows:
+            return
+        with profiling.stage('cell_images', cells=len(self.cells), rows=rows):
+            for artist, S_db in self.cells:
+                artist.set_data(colorize(S_db, (S_db.shape[1], rows), y_axis='log', sr=SR, n_fft=N_FFT,
+                                         cmap=COLORMAP, vmin=self.vmin, vmax=self.vmax))
+        self.rows = rows
+
+    def save(self, path, fmt, dpi, raster_dpi=RASTER_DPI):
+        """Save in one format: raster formats at dpi; vector formats embed the cells at raster_dpi."""
+        dpi = raster_dpi if fmt in VECTOR_FORMATS else dpi
+        self.set_dpi(dpi)
+        if self.bbox is None:
+            # Measured once: bbox_inches='tight' would draw the whole figure an extra time on every save
+            self.bbox = self.fig.get_tightbbox(self.fig.canvas.get_renderer()).padded(0.05)
+        with profiling.stage('savefig', path=path):
+            self.fig.savefig(path, format=fmt, dpi=dpi, bbox_inches=self.bbox, facecolor='white',
+                             edgecolor='none')
+
+    def close(self):
+        import matplotlib.pyplot as plt
+        plt.close(self.fig)
+
+
+def plot_grid(spec, spectrograms):
+    """The GridFigure of a spec: labelled cells, axis labels on the outer row / column and a shared colorbar."""
+    import matplotlib.pyplot as plt
+    from matplotlib.cm import ScalarMappable
+    from matplotlib.colors import Normalize
+
+    n_rows, n_cols = grid_shape(spec)
+    fig, axes = plt.subplots(n_rows, n_cols, figsize=(n_cols * spec.cell_size[0], n_rows * spec.cell_size[1]),
+                             squeeze=False)
+    fig.subplots_adjust(right=0.88, hspace=0.25 + 0.1 * (n_rows > 2), wspace=0.15)
+
+    # One colour scale for every cell, so the colorbar holds for all of them
+    vmin = min(float(np.min(S)) for S in spectrograms)
+    vmax = max(float(np.max(S)) for S in spectrograms)
+
+    cells = []
+    for idx, ax in enumerate(axes.flat):
+        if idx >= len(spec.cells):
+            ax.set_visible(False)
+            continue
+        row, col = divmod(idx, n_cols)
+        cells.append((draw_cell(ax, spectrograms[idx]), spectrograms[idx]))
+
+        # Add title (regular weight: Computer Modern has no bold face here, and LaTeX ignored it)
+        ax.set_title(spec.cells[idx].label, fontsize=14)
+
+        # Axis labels on the bottom row and the left column only
+        bottom = row == n_rows - 1 or idx + n_cols >= len(spec.cells)
+        ax.set_xlabel('Time (s)' if bottom else '', fontsize=11)
+        ax.set_ylabel('Frequency (Hz)' if col == 0 else '', fontsize=11)
+
+    # Add colorbar
+    cbar_ax = fig.add_axes([0.90, 0.15, 0.02, 0.7])
+    cbar = fig.colorbar(ScalarMappable(Normalize(vmin, vmax), cmap=COLORMAP), cax=cbar_ax)
+    cbar.set_label('Magnitude (dB)', fontsize=11)
+    return GridFigure(fig, cells, vmin, vmax)
+
+
+_grids = {}  # (spec, usetex) -> GridFigure, per process: laid out once for every job it gets
+
+
+def _grid(spec, usetex):
+    key = (spec, usetex)
+    if key not in _grids:
+        _grids[key] = plot_grid(spec, load_spectrograms(spec))
+    return _grids[key]
+
+
+def close_figures():
+    """Release the figures laid out by export_figure in this process."""
+    for grid in _grids.values():
+        grid.close()
+    _grids.clear()
+
+
+def export_figure(spec, label, formats, usetex=False, raster_dpi=RASTER_DPI):
+    """
+    Save a figure in each of formats (process-pool entry point; label only names
+    the job in progress lines); returns {format: file size}.
+
+    The spectrograms are read back from the cache build_figures filled.
+    """
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+
+    sizes = {}
+    with plt.rc_context(text_style(usetex)):
+        grid = _grid(spec, usetex)
+        for fmt in formats:
+            output_path = f"{spec.output_base}.{fmt}"
+            os.makedirs(os.path.dirname(output_path) or '.', exist_ok=True)
+            tmp_path = f"{output_path}.{os.getpid()}.tmp.{fmt}"
+            grid.save(tmp_path, fmt, spec.png_dpi, raster_dpi)
+            os.replace(tmp_path, output_path)
+            sizes[fmt] = os.path.getsize(output_path)
+    return sizes
+
+
+def export_jobs(spec, formats, usetex=False, raster_dpi=RASTER_DPI):
+    """export_figure jobs of a figure: its raster formats and its vector formats as separate jobs."""
+    groups = ([fmt for fmt in formats if fmt not in VECTOR_FORMATS],
+              [fmt for fmt in formats if fmt in VECTOR_FORMATS])
+    return [(spec, f"{spec.output_base}.{{{','.join(group)}}}", tuple(group), usetex, raster_dpi)
+            for group in groups if group]
+
+
+def output_paths(spec, formats=None):
+    """{format: path} of a figure."""
+    return {fmt: f"{spec.output_base}.{fmt}" for fmt in (formats or spec.formats)}
+
+
+def figure_params(spec, fmt, usetex=False, raster_dpi=RASTER_DPI):
+    """Parameters that determine the content of one output file of a figure."""
+    return {'style': STYLE_VERSION, 'format': fmt, 'labels': [cell.label for cell in spec.cells],
+            'cols': spec.cols, 'cell_size': list(spec.cell_size), 'spectrogram': cache_params(spec),
+            'usetex': usetex, 'raster_dpi': raster_dpi, 'png_dpi': spec.png_dpi}
+
+
+def build_figures(specs, manifest, formats=None, n_jobs=None, usetex=False, raster_dpi=RASTER_DPI,
+                  force=False):
+    """
+    Export the stale formats of every figure over the process pool (raster and
+    vector formats as separate jobs); returns run_batch outcomes.
+
+    The spectrograms are computed (or found in the cache) here first, so the
+    export jobs only read them back.
+    """
+    jobs = []
+    for spec in specs:
+        sources = [cell.path for cell in spec.cells]
+        stale = tuple(fmt for fmt, path in output_paths(spec, formats).items()
+                      if force or manifest.is_stale(path, sources, figure_params(spec, fmt, usetex, raster_dpi)))
+        if stale:
+            load_spectrograms(spec)
+            jobs.extend(export_jobs(spec, stale, usetex, raster_dpi))
+
+    outcomes = run_batch(export_figure, jobs, n_jobs=n_jobs, title="Exporting figures")
+    close_figures()
+    for (spec, _, _, usetex, raster_dpi), sizes, error in outcomes:
+        if error is not None:
+            continue
+        for fmt, size in sizes.items():
+            path = f"{spec.output_base}.{fmt}"
+            manifest.record(path, [cell.path for cell in spec.cells], figure_params(spec, fmt, usetex, raster_dpi))
+            print(f"✓ Saved: {path} ({size / 1024:.0f} KB)")
+    return outcomes
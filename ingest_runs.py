@@ -0,0 +1,240 @@
+"""
+Ingest training runs into a compact scalar store and export chart-sized series.
+
+    python ingest_runs.py static/audio/baseline/version_83 static/audio/midi_conditioned/version_86
+    python ingest_runs.py static/graphs/frechet_loss/tensorboard_logs_version_180.csv
+
+Each argument is one run:
+
+  * a log directory: every events.out.tfevents.* file under it is parsed with
+    tfevents.py (no TensorFlow needed); the run is named after the directory.
+  * a TensorBoard CSV export (Wall time, Step, Value): a single series, stored
+    under --csv-tag; tensorboard_logs_<run>.csv is named <run>.
+
+Every run is stored columnar in <store>/<run>.npz: the sorted tag names, the
+offset of each tag's rows, and one step / wall_time / value column for all
+series, so a run is a handful of flat arrays however many records it had. The
+store is rebuilt only when an event file changed (build manifest).
+
+For the page, the --tag series of each run are downsampled with
+largest-triangle-three-buckets to at most --points points and written to
+<out-dir>/<run>.json; <out-dir>/index.json lists every ingested run and its
+tags. Adding a run is a matter of pointing this script at its log directory.
+"""
+
+import argparse
+import csv
+import json
+import os
+
+import numpy as np
+
+import profiling
+from build_manifest import DEFAULT_MANIFEST_PATH, BuildManifest
+from tfevents import iter_scalars
+
+DEFAULT_STORE_DIR = '.run_store'
+DEFAULT_OUT_DIR = 'static/graphs/runs'
+FRECHET_TAG = 'validation/fad_enhanced_vs_clean'
+EXPORT_TAGS = (FRECHET_TAG, 'valid_loss', 'train_loss_epoch', 'train_loss_step')
+EXPORT_POINTS = 200
+CSV_PREFIX = 'tensorboard_logs_'
+STORE_VERSION = 1
+
+
+def event_files(logdir):
+    """TensorBoard event files under logdir, in write order (their names start with the creation time)."""
+    paths = []
+    for dirpath, dirnames, filenames in os.walk(logdir):
+        dirnames.sort()
+        paths.extend(os.path.join(dirpath, name) for name in filenames if name.startswith('events.out.tfevents.'))
+    return sorted(paths, key=lambda p: (int(os.path.basename(p).split('.')[3]), p))
+
+
+def run_name(source):
+    """Run name of a log directory or CSV export."""
+    name = os.path.splitext(os.path.basename(os.path.normpath(source)))[0]
+    return name[len(CSV_PREFIX):] if os.path.isfile(source) and name.startswith(CSV_PREFIX) else name
+
+
+def read_event_scalars(paths):
+    """{tag: (step, wall_time, value)} of event files; a step logged again in a later file wins."""
+    series = {}
+    for path in paths:
+        with profiling.stage('parse_events', path=path, bytes=os.path.getsize(path)):
+            for tag, step, wall_time, value in iter_scalars(path):
+                series.setdefault(tag, {})[step] = (wall_time, value)
+    out = {}
+    for tag, rows in series.items():
+        steps = np.fromiter(rows.keys(), dtype=np.int64, count=len(rows))
+        order = np.argsort(steps, kind='stable')
+        values = np.array(list(rows.values()), dtype=np.float64).reshape(-1, 2)[order]
+        out[tag] = (steps[order], values[:, 0], values[:, 1])
+    return out
+
+
+def read_csv_scalars(path, tag):
+    """{tag: (step, wall_time, value)} of a TensorBoard CSV export."""
+    with open(path) as fh:
+        rows = [(int(row['Step']), float(row['Wall time']), float(row['Value'])) for row in csv.DictReader(fh)]
+    rows.sort()
+    step = np.array([r[0] for r in rows], dtype=np.int64)
+    return {tag: (step, np.array([r[1] for r in rows]), np.array([r[2] for r in rows]))}
+
+
+def save_store(path, series):
+    """Write {tag: (step, wall_time, value)} as one set of columns plus per-tag offsets."""
+    tags = sorted(series)
+    lengths = [len(series[tag][0]) for tag in tags]
+    columns = {
+        'version': np.int32(STORE_VERSION),
+        'tags': np.array(tags, dtype=str),
+        'offsets': np.concatenate([[0], np.cumsum(lengths)]).astype(np.int64),
+        'step': np.concatenate([series[t][0] for t in tags]).astype(np.int64) if tags else np.zeros(0, np.int64),
+        'wall_time': np.concatenate([series[t][1] for t in tags]) if tags else np.zeros(0),
+        'value': np.concatenate([series[t][2] for t in tags]).astype(np.float32) if tags else np.zeros(0, np.float32),
+    }
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp_path = path + '.tmp.npz'
+    np.savez_compressed(tmp_path, **columns)
+    os.replace(tmp_path, path)
+
+
+def load_store(path):
+    """{tag: (step, wall_time, value)} of a stored run."""
+    with np.load(path) as data:
+        offsets = data['offsets']
+        step, wall_time, value = data['step'], data['wall_time'], data['value']
+        return {str(tag): (step[a:b], wall_time[a:b], value[a:b])
+                for tag, a, b in zip(data['tags'], offsets[:-1], offsets[1:])}
+
+
+def lttb(x, y, n_out):
+    """
+    Indices of the largest-triangle-three-buckets downsampling of (x, y) to
+    n_out points: the first and last point, plus in each of n_out - 2 equal
+    buckets the point forming the largest triangle with the previously kept
+    point and the mean of the next bucket.
+    """
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    edges = np.append(np.linspace(1, n - 1, n_out - 1).astype(np.int64), n)
+    kept = np.empty(n_out, dtype=np.int64)
+    kept[0], kept[-1] = 0, n - 1
+    a = 0
+    for i in range(n_out - 2):
+        lo, hi = edges[i], edges[i + 1]
+        next_x = x[edges[i + 1]:edges[i + 2]].mean()
+        next_y = y[edges[i + 1]:edges[i + 2]].mean()
+        area = np.abs((x[a] - next_x) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (next_y - y[a]))
+        a = lo + int(np.argmax(area))
+        kept[i + 1] = a
+    return kept
+
+
+def export_run(series, tags=EXPORT_TAGS, points=EXPORT_POINTS):
+    """The page's view of a run: each of tags that it has, LTTB-downsampled to points."""
+    exported = {}
+    for tag in tags:
+        if tag not in series:
+            continue
+        step, _, value = series[tag]
+        with profiling.stage('lttb', tag=tag, points=len(step)):
+            kept = lttb(step, value, points)
+        exported[tag] = {'points': len(step),
+                         'step': step[kept].tolist(),
+                         'value': [float(f"{v:.6g}") for v in value[kept]]}
+    return exported
+
+
+def _write_json(path, data):
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as fh:
+        json.dump(data, fh, separators=(',', ':'))
+    os.replace(tmp_path, path)
+
+
+def ingest(source, manifest, store_dir=DEFAULT_STORE_DIR, out_dir=DEFAULT_OUT_DIR,
+           csv_tag=FRECHET_TAG, tags=EXPORT_TAGS, points=EXPORT_POINTS, force=False):
+    """Store and export one run; returns its index entry."""
+    run = run_name(source)
+    is_csv = os.path.isfile(source)
+    sources = [source] if is_csv else event_files(source)
+    if not sources:
+        raise FileNotFoundError(f"No event files under {source}")
+
+    store_path = os.path.join(store_dir, run + '.npz')
+    store_params = {'version': STORE_VERSION, 'csv_tag': csv_tag if is_csv else None}
+    if force or manifest.is_stale(store_path, sources, store_params):
+        with profiling.stage('parse', run=run, files=len(sources)):
+            series = read_csv_scalars(source, csv_tag) if is_csv else read_event_scalars(sources)
+        with profiling.stage('store_write', run=run):
+            save_store(store_path, series)
+        manifest.record(store_path, sources, store_params)
+        print(f"✓ Stored {run}: {sum(len(s[0]) for s in series.values())} scalars in {len(series)} series")
+    else:
+        with profiling.stage('store_read', run=run):
+            series = load_store(store_path)
+        print(f"  {run} unchanged")
+
+    export_path = os.path.join(out_dir, run + '.json')
+    export_params = {'tags': list(tags), 'points': points}
+    if force or manifest.is_stale(export_path, [store_path], export_params):
+        os.makedirs(out_dir, exist_ok=True)
+        with profiling.stage('downsample', run=run, points=points):
+            exported = export_run(series, tags, points)
+        _write_json(export_path, {'run': run, 'tags': exported})
+        manifest.record(export_path, [store_path], export_params)
+        print(f"✓ Exported {export_path} ({os.path.getsize(export_path) / 1024:.1f} KB)")
+    return {'run': run, 'source': source, 'export': os.path.basename(export_path),
+            'tags': {tag: len(s[0]) for tag, s in sorted(series.items())}}
+
+
+def update_index(out_dir, entries):
+    """Merge run entries into <out_dir>/index.json (runs ingested earlier are kept)."""
+    path = os.path.join(out_dir, 'index.json')
+    runs = {}
+    if os.path.exists(path):
+        with open(path) as fh:
+            runs = {entry['run']: entry for entry in json.load(fh)['runs']}
+    runs.update((entry['run'], entry) for entry in entries)
+    os.makedirs(out_dir, exist_ok=True)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as fh:
+        json.dump({'runs': [runs[run] for run in sorted(runs)]}, fh, indent=1)
+    os.replace(tmp_path, path)
+    return path
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Ingest TensorBoard runs and export downsampled series for the page.")
+    parser.add_argument('sources', nargs='+', help="Run log directories and/or TensorBoard CSV exports")
+    parser.add_argument('--store-dir', default=DEFAULT_STORE_DIR, help="Columnar scalar store")
+    parser.add_argument('--out-dir', default=DEFAULT_OUT_DIR, help="Directory of the page's run exports")
+    parser.add_argument('--tag', action='append', dest='tags',
+                        help=f"Tag to export (repeatable, default: {', '.join(EXPORT_TAGS)})")
+    parser.add_argument('--points', type=int, default=EXPORT_POINTS, help="Maximum points per exported series")
+    parser.add_argument('--csv-tag', default=FRECHET_TAG, help="Tag of the series in a CSV export")
+    parser.add_argument('--force', action='store_true', help="Re-ingest even if nothing changed")
+    parser.add_argument('--manifest', default=DEFAULT_MANIFEST_PATH, help="Build manifest path")
+    profiling.add_profile_argument(parser)
+    args = parser.parse_args(argv)
+    profiling.start(args.profile)
+
+    manifest = BuildManifest(args.manifest)
+    entries = []
+    try:
+        for source in args.sources:
+            entries.append(ingest(source, manifest, args.store_dir, args.out_dir, args.csv_tag,
+                                  tuple(args.tags or EXPORT_TAGS), args.points, args.force))
+    finally:
+        manifest.save()
+    print(f"\n✓ {len(entries)} run(s) listed in {update_index(args.out_dir, entries)}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,139 @@
+"""
+Compact precomputed note index for the in-page piano roll.
+
+The page used to download a .mid file and parse it with @tonejs/midi before it
+could draw. The notes are parsed here with pretty_midi instead and written as
+one small binary file (<name>.notes.bin next to the MIDI) that the page maps
+straight onto typed arrays (static/js/note-index.js):
+
+    header    32 bytes, little endian
+              magic 'MNIX', version u32, n_notes u32, n_buckets u32,
+              bucket_seconds f32, duration f32, n_classes u32, reserved u32
+    start     f32[n_notes]   seconds, sorted ascending
+    end       f32[n_notes]
+    bucket    u32[n_buckets + 1]
+    pitch     u8[n_notes]
+    velocity  u8[n_notes]    0-127
+    drum      u8[n_notes]    index into DRUM_CLASSES, OTHER_CLASS if unmapped
+
+Every section starts at a multiple of 4 bytes, so the float and int arrays can
+be viewed in place. bucket[b] is the first note that is still sounding at
+b * bucket_seconds, so the notes overlapping a window [t0, t1) are found by
+starting at bucket[floor(t0 / bucket_seconds)] and scanning until start >= t1.
+"""
+
+import argparse
+import os
+import struct
+
+import numpy as np
+
+MAGIC = b'MNIX'
+VERSION = 1
+HEADER = struct.Struct('<4sIIIffII')
+BUCKET_SECONDS = 1.0
+SUFFIX = '.notes.bin'
+
+# Piano-roll rows, bottom to top, with the General MIDI drum notes drawn on each
+DRUM_CLASSES = (
+    ('Bass', (35, 36)),
+    ('Snare', (37, 38, 39, 40)),
+    ('HH Close', (42, 44)),
+    ('HH Open', (46,)),
+    ('Floor Tom', (41, 43)),
+    ('Mid Tom', (45, 47)),
+    ('High Tom', (48, 50)),
+    ('Crash', (49, 52, 55, 57)),
+    ('Ride', (51, 53, 59)),
+)
+OTHER_CLASS = 255
+
+
+def index_path_for(midi_path):
+    """Note index path that goes with a MIDI file."""
+    return os.path.splitext(midi_path)[0] + SUFFIX
+
+
+def drum_class_lut():
+    """uint8[128] mapping a MIDI pitch to its DRUM_CLASSES index (OTHER_CLASS if none)."""
+    lut = np.full(128, OTHER_CLASS, dtype=np.uint8)
+    for index, (_, pitches) in enumerate(DRUM_CLASSES):
+        lut[list(pitches)] = index
+    return lut
+
+
+def extract_notes(midi_data):
+    """(start, end, pitch, velocity) arrays of every note in a PrettyMIDI, sorted by start."""
+    notes = [(n.start, n.end, n.pitch, n.velocity)
+             for instrument in midi_data.instruments for n in instrument.notes]
+    table = np.array(notes, dtype=np.float64).reshape(-1, 4)
+    table = table[np.lexsort((table[:, 2], table[:, 0]))]
+    return (table[:, 0].astype(np.float32), table[:, 1].astype(np.float32),
+            table[:, 2].astype(np.uint8), table[:, 3].astype(np.uint8))
+
+
+def bucket_index(start, end, duration, bucket_seconds=BUCKET_SECONDS):
+    """First note still sounding at the start of every bucket, plus len(start) as the last entry."""
+    n_buckets = max(1, int(np.ceil(duration / bucket_seconds)))
+    # Notes are sorted by start, so the running maximum of the end times is
+    # monotonic: the first note ending after t is where it first exceeds t.
+    latest_end = np.maximum.accumulate(end) if len(end) else end
+    bounds = np.arange(n_buckets, dtype=np.float64) * bucket_seconds
+    first = np.searchsorted(latest_end, bounds, side='right')
+    return np.append(first, len(start)).astype(np.uint32)
+
+
+def _pad4(fh):
+    fh.write(b'\0' * (-fh.tell() % 4))
+
+
+def write_note_index(midi_path, output_path=None, bucket_seconds=BUCKET_SECONDS):
+    """Write the note index of a MIDI file (default: index_path_for(midi_path)); returns the path."""
+    import pretty_midi
+    output_path = output_path or index_path_for(midi_path)
+    midi_data = pretty_midi.PrettyMIDI(midi_path)
+    start, end, pitch, velocity = extract_notes(midi_data)
+    duration = max(midi_data.get_end_time(), float(end.max()) if len(end) else 0.0)
+    buckets = bucket_index(start, end, duration, bucket_seconds)
+
+    tmp_path = output_path + '.tmp'
+    with open(tmp_path, 'wb') as fh:
+        fh.write(HEADER.pack(MAGIC, VERSION, len(start), len(buckets) - 1,
+                             bucket_seconds, duration, len(DRUM_CLASSES), 0))
+        for array in (start, end, buckets, pitch, velocity, drum_class_lut()[pitch]):
+            fh.write(array.astype(array.dtype.newbyteorder('<'), copy=False).tobytes())
+            _pad4(fh)
+    os.replace(tmp_path, output_path)
+    print(f"✓ Note index: {output_path} ({len(start)} notes, {duration:.2f}s, "
+          f"{os.path.getsize(output_path)} bytes)")
+    return output_path
+
+
+def read_note_index(path):
+    """Read a note index back as a dict of arrays (the page's layout, for checks and tools)."""
+    with open(path, 'rb') as fh:
+        data = fh.read()
+    magic, version, n, n_buckets, bucket_seconds, duration, n_classes, _ = HEADER.unpack_from(data)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError(f"{path}: not a version {VERSION} note index")
+    index = {'bucket_seconds': bucket_seconds, 'duration': duration, 'n_classes': n_classes}
+    offset = HEADER.size
+    for name, dtype, count in (('start', '<f4', n), ('end', '<f4', n), ('bucket', '<u4', n_buckets + 1),
+                               ('pitch', 'u1', n), ('velocity', 'u1', n), ('drum', 'u1', n)):
+        index[name] = np.frombuffer(data, dtype=dtype, count=count, offset=offset)
+        offset += index[name].nbytes
+        offset += -offset % 4
+    return index
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Write compact note indexes for the page's piano roll.")
+    parser.add_argument('midi_files', nargs='+')
+    parser.add_argument('--bucket-seconds', type=float, default=BUCKET_SECONDS)
+    args = parser.parse_args(argv)
+    for path in args.midi_files:
+        write_note_index(path, bucket_seconds=args.bucket_seconds)
+
+
+if __name__ == "__main__":
+    main()
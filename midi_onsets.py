@@ -0,0 +1,107 @@
+"""
+MIDI onset overlays for the spectrogram video renderers.
+
+The onsets of a groove's MIDI file are read once per process: from its
+precomputed note index (<name>.notes.bin, see midi_note_index.py) when that is
+up to date, otherwise by parsing the .mid with pretty_midi. Onsets of a time
+window are cut out of that table with two binary searches and cached per
+(file, window), so every segment and worker asking for the same window shares
+one small array.
+
+An overlay is an Onsets(times, classes) pair: times in seconds relative to the
+window start, classes indexing midi_note_index.DRUM_CLASSES (OTHER_CLASS for
+unmapped pitches). overlay_colors turns it into one RGB colour per line, either
+a single colour or the page piano roll's per-class palette, so renderers can
+draw every line in one vectorized call.
+"""
+
+import os
+import re
+from collections import namedtuple
+from functools import lru_cache
+
+import numpy as np
+
+from midi_note_index import (DRUM_CLASSES, OTHER_CLASS, drum_class_lut, extract_notes,
+                             index_path_for, read_note_index)
+
+MIDI_DIR = "static/audio/dataset/midi"
+ONSET_COLOR = (0, 255, 255)
+# Same palette as the page piano roll's drum rows, in DRUM_CLASSES order
+DRUM_CLASS_COLORS = (
+    (126, 200, 227),  # Bass
+    (255, 166, 158),  # Snare
+    (162, 210, 255),  # HH Close
+    (184, 242, 230),  # HH Open
+    (160, 206, 217),  # Floor Tom
+    (224, 187, 228),  # Mid Tom
+    (255, 218, 193),  # High Tom
+    (253, 253, 150),  # Crash
+    (203, 170, 203),  # Ride
+)
+OTHER_COLOR = (255, 255, 255)
+
+Onsets = namedtuple('Onsets', ['times', 'classes'])
+
+
+def midi_for(stem, midis):
+    """Groove MIDI of a recording: drummer1_1_funk-groove1_138_beat_4-4_bluebird -> 1_funk-groove1_138_beat_4-4."""
+    m = re.search(r'(\d+_[^_]+_\d+_(?:beat|fill)_\d+-\d+)', stem)
+    if m and m.group(1) in midis:
+        return midis[m.group(1)]
+    matches = [name for name in midis if name in stem]
+    return midis[max(matches, key=len)] if matches else None
+
+
+def groove_midi(audio_path, midi_dir=MIDI_DIR):
+    """The .mid file of the groove an audio file was rendered from, or None."""
+    if not os.path.isdir(midi_dir):
+        return None
+    midis = {os.path.splitext(name)[0]: os.path.join(midi_dir, name)
+             for name in sorted(os.listdir(midi_dir)) if name.lower().endswith('.mid')}
+    return midi_for(os.path.splitext(os.path.basename(audio_path))[0], midis)
+
+
+@lru_cache(maxsize=32)
+def _onset_table(midi_path, mtime_ns):
+    index_path = index_path_for(midi_path)
+    if os.path.exists(index_path) and os.stat(index_path).st_mtime_ns >= mtime_ns:
+        index = read_note_index(index_path)
+        return index['start'].astype(np.float64), index['drum'].copy()
+    import pretty_midi
+    start, _, pitch, _ = extract_notes(pretty_midi.PrettyMIDI(midi_path))
+    return start.astype(np.float64), drum_class_lut()[pitch]
+
+
+def onset_table(midi_path):
+    """(start seconds, drum class) of every note of a MIDI file, sorted by start; cached per file."""
+    return _onset_table(midi_path, os.stat(midi_path).st_mtime_ns)
+
+
+@lru_cache(maxsize=256)
+def _window_onsets(midi_path, mtime_ns, t0, t1):
+    start, classes = _onset_table(midi_path, mtime_ns)
+    lo, hi = np.searchsorted(start, [t0, t1], side='left')
+    return Onsets(start[lo:hi] - t0, classes[lo:hi])
+
+
+def window_onsets(midi_path, t0=0.0, t1=np.inf):
+    """Onsets of midi_path in [t0, t1), relative to t0; cached per (file, window)."""
+    return _window_onsets(midi_path, os.stat(midi_path).st_mtime_ns, float(t0), float(t1))
+
+
+def as_onsets(overlay):
+    """An Onsets from an overlay given as Onsets or as a plain sequence of onset times."""
+    if isinstance(overlay, Onsets):
+        return overlay
+    times = np.asarray(overlay, dtype=np.float64).ravel()
+    return Onsets(times, np.full(len(times), OTHER_CLASS, dtype=np.uint8))
+
+
+def overlay_colors(onsets, by_class=False, color=ONSET_COLOR):
+    """(n, 3) uint8 colour of every onset line."""
+    if not by_class:
+        return np.tile(np.asarray(color, dtype=np.uint8), (len(onsets.times), 1))
+    palette = np.full((256, 3), OTHER_COLOR, dtype=np.uint8)
+    palette[:len(DRUM_CLASSES)] = DRUM_CLASS_COLORS
+    return palette[np.asarray(onsets.classes, dtype=np.uint8)]
@@ -0,0 +1,62 @@
+"""
+One command for the page and paper asset scripts.
+
+    python midiff_assets.py spectrograms [-j 4] [--renderer raster]
+    python midiff_assets.py pianoroll --batch <midi dir> [--out-dir ...]
+    python midiff_assets.py cfg-figure [--usetex] [--formats pdf]
+    python midiff_assets.py figures [cfg velocity-sweep best-fad] [-j 3]
+    python midiff_assets.py video [--composite] [--backend ffmpeg] [-o out.mp4]
+    python midiff_assets.py trim [sources ...] [--last-seconds 5]
+
+Every subcommand forwards its arguments to the main() of the script that
+implements it (`midiff_assets.py <command> -h` shows its options), so the
+scripts themselves keep working on their own. The repository is not an
+installable package, so there is no console entry point: run it as
+`python midiff_assets.py`.
+
+Only the module of the chosen subcommand is imported, and the scripts load
+matplotlib, moviepy and pretty_midi inside the functions that use them: a
+trim or a raster piano-roll run never pays for the plotting stack.
+"""
+
+import argparse
+import importlib
+import sys
+
+# subcommand -> (module, entry point, help)
+COMMANDS = {
+    'spectrograms': ('generate_spectrograms', 'main', "Clip segment manifest and page spectrograms (+ tiles)"),
+    'pianoroll': ('generate_midi_pianoroll', 'main', "Piano-roll images and the page's note index"),
+    'cfg-figure': ('generate_cfg_figure', 'main', "2x2 CFG comparison figure for the paper"),
+    'figures': ('paper_figures', 'main', "All of the paper's spectrogram grid figures"),
+    'video': ('visualize_spectograms', 'main',
+              "CFG comparison video (--composite: the single composite-spectrogram video)"),
+    'trim': ('generate_spectrograms', 'segments_main', "Only rewrite the page's clip segment manifest"),
+}
+COMPOSITE_VIDEO = ('visualize_spectograms_new', 'main')
+
+
+def resolve(command, args):
+    """(entry point, arguments) of a subcommand; the module is imported here."""
+    module_name, func_name, _ = COMMANDS[command]
+    if command == 'video' and '--composite' in args:
+        module_name, func_name = COMPOSITE_VIDEO
+        args = [arg for arg in args if arg != '--composite']
+    return getattr(importlib.import_module(module_name), func_name), args
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='midiff_assets.py', description="Build the MiDiff page and paper assets.",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="commands:\n" + "\n".join(f"  {name:<14}{help_text}" for name, (_, _, help_text) in COMMANDS.items()))
+    parser.add_argument('command', choices=COMMANDS, metavar='command')
+    parser.add_argument('args', nargs=argparse.REMAINDER, help="Arguments of the command (see <command> -h)")
+    args = parser.parse_args(argv)
+    func, forwarded = resolve(args.command, args.args)
+    sys.argv[0] = f"midiff_assets.py {args.command}"  # usage lines of the forwarded parser
+    return func(forwarded)
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,117 @@
+"""
+The paper's spectrogram grid figures.
+
+    python paper_figures.py                      # every figure
+    python paper_figures.py cfg velocity-sweep --formats pdf
+
+  * cfg             2x2: baseline (w=0) and CFG scales w=1..3, first 2 s
+  * velocity-sweep  3x3: the v181 velocity sweep, last 5 s of each clip
+  * best-fad        10x2: baseline v180 vs MiDiff v181 on the ten best-FAD
+                    grooves, last 5 s
+
+Every figure is a grid_figure.FigureSpec; a new figure is a list of
+(path, label) cells. Outputs whose audio and settings are unchanged are
+skipped (build manifest).
+"""
+
+import argparse
+import os
+
+import profiling
+from batch_runner import default_jobs
+from build_manifest import DEFAULT_MANIFEST_PATH, BuildManifest
+from generate_spectrograms import (BEST_FAD_FILENAMES, PAGE_CLIP_SECONDS, VELOCITY_SWEEP_DIRS,
+                                   VELOCITY_SWEEP_FILENAME)
+from grid_figure import FORMATS, RASTER_DPI, Cell, FigureSpec, build_figures
+
+FIGURES_DIR = 'static/figures'
+
+# CFG comparison
+CFG_FOLDER = "static/audio/midi_conditioned/cfg"
+BASELINE_FOLDER = "static/audio/baseline/version_83/enhancement/use_midi=False_epoch_50"
+AUDIO_FILENAME = "drummer1_1_funk-groove1_138_beat_4-4_bluebird.wav"
+
+
+def cfg_figure():
+    """Top-left: w=0 (Baseline), Top-right: w=1, Bottom-left: w=2, Bottom-right: w=3."""
+    cells = (
+        Cell(f"{BASELINE_FOLDER}/{AUDIO_FILENAME}", r'$w=0$ (Baseline)'),
+        Cell(f"{CFG_FOLDER}/w_1.0/{AUDIO_FILENAME}", r'$w=1$'),
+        Cell(f"{CFG_FOLDER}/w_2.0/{AUDIO_FILENAME}", r'$w=2$'),
+        Cell(f"{CFG_FOLDER}/w_3.0/{AUDIO_FILENAME}", r'$w=3$'),
+    )
+    return FigureSpec(cells, cols=2, output_base=os.path.join(FIGURES_DIR, 'cfg_comparison_2x2'),
+                      time_range=(0, 2), cell_size=(6, 4))
+
+
+def velocity_label(sweep_dir):
+    """velocity_20 -> Velocity 20, random_velocity -> Random velocity."""
+    return sweep_dir.replace('_', ' ').capitalize()
+
+
+def velocity_sweep_figure():
+    cells = tuple(Cell(f"static/audio/midi_conditioned/velocity_sweep_v181/{d}/{VELOCITY_SWEEP_FILENAME}",
+                       velocity_label(d))
+                  for d in VELOCITY_SWEEP_DIRS)
+    return FigureSpec(cells, cols=3, output_base=os.path.join(FIGURES_DIR, 'velocity_sweep_3x3'),
+                      time_range=None, last_seconds=PAGE_CLIP_SECONDS, cell_size=(5, 3.4),
+                      formats=('png', 'pdf'), png_dpi=300)
+
+
+def groove_label(filename):
+    """drummer1_3_soul-groove3_86_beat_4-4_detroit_garage.wav -> soul-groove3 (detroit garage)."""
+    parts = os.path.splitext(filename)[0].split('_')
+    return f"{parts[2]} ({' '.join(parts[6:])})" if len(parts) > 6 else parts[-1]
+
+
+def best_fad_figure():
+    cells = []
+    for f in BEST_FAD_FILENAMES:
+        cells.append(Cell(f"static/audio/baseline/version_180/{f}", f"Baseline: {groove_label(f)}"))
+        cells.append(Cell(f"static/audio/midi_conditioned/version_181/{f}", f"MiDiff: {groove_label(f)}"))
+    return FigureSpec(tuple(cells), cols=2, output_base=os.path.join(FIGURES_DIR, 'best_fad_10x2'),
+                      time_range=None, last_seconds=PAGE_CLIP_SECONDS, cell_size=(6, 2.8),
+                      formats=('png', 'pdf'), png_dpi=300)
+
+
+FIGURES = {
+    'cfg': cfg_figure,
+    'velocity-sweep': velocity_sweep_figure,
+    'best-fad': best_fad_figure,
+}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate the paper's spectrogram grid figures.")
+    parser.add_argument('figures', nargs='*', metavar='figure',
+                        help=f"Figures to build: {', '.join(FIGURES)} (default: all)")
+    parser.add_argument('--formats', nargs='+', choices=FORMATS,
+                        help="Output formats (default: each figure's own)")
+    parser.add_argument('-j', '--jobs', type=int, default=default_jobs(),
+                        help="Number of worker processes exporting figures (1 = serial, default: all cores)")
+    parser.add_argument('--usetex', action='store_true', help="Typeset text with LaTeX (needs a TeX installation)")
+    parser.add_argument('--raster-dpi', type=int, default=RASTER_DPI,
+                        help="Resolution of the spectrogram images inside PDF/EPS")
+    parser.add_argument('--force', action='store_true',
+                        help="Rebuild every figure even if the manifest says it is up to date")
+    parser.add_argument('--manifest', default=DEFAULT_MANIFEST_PATH,
+                        help="Path of the incremental build manifest")
+    profiling.add_profile_argument(parser)
+    args = parser.parse_args(argv)
+    profiling.start(args.profile)
+    unknown = [name for name in args.figures if name not in FIGURES]
+    if unknown:
+        parser.error(f"unknown figure(s): {', '.join(unknown)} (choose from {', '.join(FIGURES)})")
+
+    manifest = BuildManifest(args.manifest)
+    specs = [FIGURES[name]() for name in (args.figures or FIGURES)]
+    try:
+        outcomes = build_figures(specs, manifest, formats=args.formats, n_jobs=args.jobs, usetex=args.usetex,
+                                 raster_dpi=args.raster_dpi, force=args.force)
+    finally:
+        manifest.save()
+    return 1 if any(error is not None for _, _, error in outcomes) else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,217 @@
+"""
+Opt-in stage profiling with Chrome trace-event output.
+
+The asset scripts wrap their expensive stages (decode, STFT, specshow,
+savefig, PNG encode, video encode, ...) in
+
+    with profiling.stage('stft', clips=len(signals)):
+        ...
+
+Profiling is switched on with --profile [TRACE] on a script's command line or
+by setting MIDIFF_PROFILE to the trace path (any of 1 / true / yes / on means
+the default midiff_trace.json; 0 / false / no / off leave it off). When it is
+off, stage() returns one shared nullcontext: no clock reads, no allocation,
+nothing recorded.
+
+When it is on, every stage records its wall time, resident memory before and
+after, and the process's peak RSS so far. Each process appends its events to
+<trace>.parts/<pid>.jsonl as they finish; the environment variable is
+inherited by pool workers, so batch jobs are profiled too and every worker
+shows up as its own track. When the main process exits, the parts are merged
+into <trace> (open in chrome://tracing or ui.perfetto.dev) and a per-stage
+summary table is printed and written to <trace minus .json>.summary.txt.
+"""
+
+import atexit
+import contextlib
+import json
+import os
+import shutil
+import threading
+import time
+
+ENV_VAR = 'MIDIFF_PROFILE'
+OWNER_ENV_VAR = 'MIDIFF_PROFILE_OWNER'
+DEFAULT_TRACE_PATH = 'midiff_trace.json'
+_TRUE_VALUES = ('1', 'true', 'yes', 'on')
+_FALSE_VALUES = ('', '0', 'false', 'no', 'off')
+
+_NULL = contextlib.nullcontext()
+_trace = None
+
+
+def _rss_mb():
+    """Current resident set size in MB (Linux /proc; 0 where unavailable)."""
+    try:
+        with open('/proc/self/statm') as fh:
+            return int(fh.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2 ** 20
+    except (OSError, ValueError, IndexError):
+        return 0.0
+
+
+def _peak_rss_mb():
+    """Peak resident set size of this process so far, in MB."""
+    try:
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024  # KB on Linux
+    except (ImportError, OSError):
+        return 0.0
+
+
+class _Trace:
+    def __init__(self, path):
+        self.path = path
+        self.parts_dir = path + '.parts'
+
+    def emit(self, event):
+        os.makedirs(self.parts_dir, exist_ok=True)
+        with open(os.path.join(self.parts_dir, f"{os.getpid()}.jsonl"), 'a') as fh:
+            fh.write(json.dumps(event) + '\n')
+
+
+class _Stage:
+    __slots__ = ('trace', 'name', 'args', 'start', 'rss')
+
+    def __init__(self, trace, name, args):
+        self.trace, self.name, self.args = trace, name, args
+
+    def __enter__(self):
+        self.rss = _rss_mb()
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc):
+        end = time.perf_counter_ns()
+        rss = _rss_mb()
+        args = {k: v if isinstance(v, (int, float, bool, str)) or v is None else str(v)
+                for k, v in self.args.items()}
+        args.update(rss_start_mb=round(self.rss, 1), rss_end_mb=round(rss, 1), peak_rss_mb=round(_peak_rss_mb(), 1))
+        pid, tid = os.getpid(), threading.get_ident()
+        self.trace.emit({'name': self.name, 'cat': 'stage', 'ph': 'X', 'ts': self.start // 1000,
+                         'dur': (end - self.start) // 1000, 'pid': pid, 'tid': tid, 'args': args})
+        self.trace.emit({'name': 'RSS (MB)', 'ph': 'C', 'ts': end // 1000, 'pid': pid, 'args': {'rss': round(rss, 1)}})
+        return False
+
+
+def _env_trace_path():
+    """Trace path $MIDIFF_PROFILE asks for, or None if it is unset or off (0 / false / no / off)."""
+    env = os.environ.get(ENV_VAR, '').strip()
+    if env.lower() in _FALSE_VALUES:
+        return None
+    return DEFAULT_TRACE_PATH if env.lower() in _TRUE_VALUES else env
+
+
+def enabled():
+    return _trace is not None
+
+
+def stage(name, **args):
+    """Context manager timing one stage; a shared no-op when profiling is off."""
+    if _trace is None:
+        return _NULL
+    return _Stage(_trace, name, args)
+
+
+def enable(path=None):
+    """
+    Turn profiling on for this process and the workers it starts; the trace
+    is written when the process exits. path defaults to $MIDIFF_PROFILE (when
+    it names a trace) or DEFAULT_TRACE_PATH.
+    """
+    global _trace
+    if path is None or path is True:
+        path = _env_trace_path() or DEFAULT_TRACE_PATH
+    if _trace is not None and _trace.path == path:
+        return _trace
+    _trace = _Trace(path)
+    os.environ[ENV_VAR] = path
+    if os.environ.get(OWNER_ENV_VAR) != str(os.getpid()):
+        os.environ[OWNER_ENV_VAR] = str(os.getpid())
+        shutil.rmtree(_trace.parts_dir, ignore_errors=True)
+        atexit.register(finish)
+    return _trace
+
+
+def add_profile_argument(parser):
+    """The --profile [TRACE] option of the scripts."""
+    parser.add_argument('--profile', nargs='?', const=True, default=None, metavar='TRACE',
+                        help=f"Write a Chrome trace of the pipeline stages (default {DEFAULT_TRACE_PATH}; "
+                             f"or set {ENV_VAR})")
+
+
+def start(flag=None):
+    """Enable profiling if --profile was given (flag: True or a trace path)."""
+    if flag:
+        enable(flag)
+
+
+def _read_parts(parts_dir):
+    events = []
+    if not os.path.isdir(parts_dir):
+        return events
+    for name in sorted(os.listdir(parts_dir)):
+        with open(os.path.join(parts_dir, name)) as fh:
+            events.extend(json.loads(line) for line in fh if line.strip())
+    return events
+
+
+def summarize(events):
+    """[(stage, calls, total s, mean ms, max ms, peak RSS MB)] of the complete events, slowest first."""
+    stats = {}
+    for event in events:
+        if event.get('ph') != 'X':
+            continue
+        entry = stats.setdefault(event['name'], [0, 0, 0, 0.0])
+        entry[0] += 1
+        entry[1] += event['dur']
+        entry[2] = max(entry[2], event['dur'])
+        entry[3] = max(entry[3], event['args'].get('peak_rss_mb', 0.0))
+    rows = [(name, calls, total / 1e6, total / calls / 1e3, longest / 1e3, peak)
+            for name, (calls, total, longest, peak) in stats.items()]
+    return sorted(rows, key=lambda row: -row[2])
+
+
+def format_summary(rows):
+    lines = [f"{'stage':<28} {'calls':>6} {'total s':>9} {'mean ms':>9} {'max ms':>9} {'peak MB':>8}"]
+    lines += [f"{name:<28} {calls:>6} {total:>9.3f} {mean:>9.1f} {longest:>9.1f} {peak:>8.0f}"
+              for name, calls, total, mean, longest, peak in rows]
+    return '\n'.join(lines)
+
+
+def finish():
+    """Merge the per-process parts into the Chrome trace and write the summary table (main process only)."""
+    global _trace
+    if _trace is None or os.environ.get(OWNER_ENV_VAR) != str(os.getpid()):
+        return None
+    trace, _trace = _trace, None
+    events = _read_parts(trace.parts_dir)
+    if not events:
+        shutil.rmtree(trace.parts_dir, ignore_errors=True)
+        return None
+    origin = min(event['ts'] for event in events)
+    for event in events:
+        event['ts'] -= origin
+    pids = sorted({event['pid'] for event in events}, key=lambda pid: (pid != os.getpid(), pid))
+    workers = [pid for pid in pids if pid != os.getpid()]
+    meta = []
+    for rank, pid in enumerate(pids):
+        label = 'main' if pid == os.getpid() else f"worker {workers.index(pid) + 1}"
+        meta.append({'name': 'process_name', 'ph': 'M', 'pid': pid, 'args': {'name': f"{label} (pid {pid})"}})
+        meta.append({'name': 'process_sort_index', 'ph': 'M', 'pid': pid, 'args': {'sort_index': rank}})
+
+    tmp_path = trace.path + '.tmp'
+    with open(tmp_path, 'w') as fh:
+        json.dump({'traceEvents': meta + events, 'displayTimeUnit': 'ms'}, fh)
+    os.replace(tmp_path, trace.path)
+    shutil.rmtree(trace.parts_dir, ignore_errors=True)
+
+    table = format_summary(summarize(events))
+    summary_path = os.path.splitext(trace.path)[0] + '.summary.txt'
+    with open(summary_path, 'w') as fh:
+        fh.write(table + '\n')
+    print(f"\n{table}\n\n✓ Profile trace written to {trace.path} (summary: {summary_path})")
+    return trace.path
+
+
+if _env_trace_path():
+    enable()
@@ -0,0 +1,67 @@
+"""
+Batched spectrogram computation for groups of clips.
+
+Equal-length signals are stacked into a (batch, samples) array and go through
+a single librosa.stft call, which frames and FFTs the whole batch at once.
+n_fft / hop_length / window / center have exactly the librosa.stft meaning,
+and the dB conversion matches librosa.amplitude_to_db(|D|, ref=np.max)
+applied to each clip on its own.
+"""
+
+import numpy as np
+import librosa
+
+from profiling import stage
+
+
+def stft_magnitude_batch(signals, n_fft=1024, hop_length=128, window='hann', center=True):
+    """|STFT| of equal-length signals, shape (batch, 1 + n_fft // 2, frames)."""
+    with stage('stft', clips=len(signals), n_fft=n_fft):
+        y = np.stack([np.asarray(s, dtype=np.float32) for s in signals])
+        D = librosa.stft(y, n_fft=n_fft, hop_length=hop_length, window=window, center=center)
+        return np.abs(D)
+
+
+def amplitude_to_db_batch(S, amin=1e-5, top_db=80.0):
+    """
+    Per-clip librosa.amplitude_to_db(S[i], ref=np.max) for a stacked batch.
+    """
+    S = np.asarray(S)
+    reduce_axes = tuple(range(1, S.ndim))
+    ref = np.max(S, axis=reduce_axes, keepdims=True)
+    log_spec = 20.0 * np.log10(np.maximum(amin, S))
+    log_spec -= 20.0 * np.log10(np.maximum(amin, ref))
+    if top_db is not None:
+        floor = np.max(log_spec, axis=reduce_axes, keepdims=True) - top_db
+        log_spec = np.maximum(log_spec, floor)
+    return log_spec
+
+
+def stft_db_batch(signals, n_fft=1024, hop_length=128, window='hann', center=True):
+    """dB spectrograms (ref = per-clip max) of equal-length signals, shape (batch, bins, frames)."""
+    S = stft_magnitude_batch(signals, n_fft=n_fft, hop_length=hop_length,
+                             window=window, center=center)
+    return amplitude_to_db_batch(S)
+
+
+def group_by_length(signals):
+    """Map signal length -> list of indices into signals."""
+    groups = {}
+    for idx, s in enumerate(signals):
+        groups.setdefault(len(s), []).append(idx)
+    return groups
+
+
+def stft_db_grouped(signals, n_fft=1024, hop_length=128, window='hann', center=True):
+    """
+    dB spectrograms for signals of possibly different lengths.
+
+    Signals are batched per distinct length; the result is a list in input order.
+    """
+    results = [None] * len(signals)
+    for indices in group_by_length(signals).values():
+        batch = stft_db_batch([signals[i] for i in indices], n_fft=n_fft,
+                              hop_length=hop_length, window=window, center=center)
+        for i, S_db in zip(indices, batch):
+            results[i] = S_db
+    return results
@@ -0,0 +1,167 @@
+"""
+Persistent on-disk cache of computed spectrogram matrices, shared by all scripts.
+
+The page spectrograms, the CFG paper figure and both comparison videos
+transform the same handful of WAVs; with this cache each (audio, transform)
+pair is computed once and a warm run of any script goes straight to rendering.
+
+An entry is keyed by the SHA-256 of
+
+  * the content hash of every source file (a clip stitched from several files
+    lists them all), and
+  * the transform parameters as canonical JSON (kind, sr, n_fft, hop_length,
+    window, mel settings, clip offset / duration, ...),
+
+so editing a WAV or changing any parameter simply misses. Matrices are stored
+as float16 .npy files (<root>/<key[:2]>/<key>.npy) and opened with
+mmap_mode='r': a hit reads only the pages the renderer actually samples.
+float16 keeps dB values to within ~0.03 dB, a tenth of a colormap step (a few
+percent of pixels land on the neighbouring colour); only dB-scaled matrices
+should be cached (raw magnitudes underflow float16).
+
+The cache is size-capped: every hit refreshes the entry's mtime, and after a
+store the least recently used entries are deleted until the total is under
+max_bytes. Writes are atomic (temp file + os.replace), so worker processes can
+share one cache directory.
+"""
+
+import hashlib
+import json
+import os
+
+import numpy as np
+
+from build_manifest import file_sha256
+
+DEFAULT_CACHE_DIR = '.spec_cache'
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+CACHE_VERSION = 1
+
+_hashes = {}  # (path, size, mtime_ns) -> sha256, per process
+
+
+def content_hash(path):
+    """SHA-256 of a file, memoised per process by size and mtime."""
+    st = os.stat(path)
+    key = (os.path.abspath(path), st.st_size, st.st_mtime_ns)
+    if key not in _hashes:
+        _hashes[key] = file_sha256(path)
+    return _hashes[key]
+
+
+class SpectrogramCache:
+    """
+    Size-capped LRU store of float16 spectrogram matrices keyed by source content and parameters.
+
+    hasher, if given, is anything with content_hash(path) (e.g. a
+    BuildManifest, whose memo persists across runs).
+    """
+    def __init__(self, root=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES, hasher=None):
+        self.root = root
+        self.max_bytes = max_bytes
+        self._hash = hasher.content_hash if hasher is not None else content_hash
+
+    def key(self, sources, params):
+        """Cache key of the matrix computed from sources (a path or a sequence of paths) with params."""
+        if isinstance(sources, (str, os.PathLike)):
+            sources = [sources]
+        payload = json.dumps({'version': CACHE_VERSION, 'sources': [self._hash(s) for s in sources],
+                              'params': params}, sort_keys=True)
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def path_for(self, key):
+        return os.path.join(self.root, key[:2], key + '.npy')
+
+    def get(self, key):
+        """Read-only float16 memmap of a cached matrix, or None."""
+        path = self.path_for(key)
+        try:
+            array = np.load(path, mmap_mode='r')
+        except (FileNotFoundError, ValueError):
+            return None
+        try:
+            os.utime(path)  # LRU: mark as recently used
+        except OSError:
+            pass
+        return array
+
+    def put(self, key, array, evict=True):
+        """Store a matrix as float16 and return it memory-mapped."""
+        path = self.path_for(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as fh:
+            np.save(fh, np.asarray(array, dtype=np.float16))
+        os.replace(tmp_path, path)
+        stored = np.load(path, mmap_mode='r')  # stays readable even if evicted below
+        if evict:
+            self.evict()
+        return stored
+
+    def get_or_compute(self, sources, params, compute):
+        """Cached matrix for (sources, params); compute() produces it on a miss."""
+        key = self.key(sources, params)
+        cached = self.get(key)
+        return cached if cached is not None else self.put(key, compute())
+
+    def get_or_compute_many(self, requests, compute_missing):
+        """
+        Cached matrices for a list of (sources, params) requests, in order.
+
+        compute_missing(indices) gets the indices of the requests not in the
+        cache and returns their matrices in the same order, so misses can still
+        share one batched computation.
+        """
+        keys = [self.key(sources, params) for sources, params in requests]
+        results = [self.get(key) for key in keys]
+        missing = [i for i, result in enumerate(results) if result is None]
+        if missing:
+            for i, array in zip(missing, compute_missing(missing)):
+                results[i] = self.put(keys[i], array, evict=False)
+            self.evict()
+        if len(missing) < len(requests):
+            print(f"  Spectrogram cache: {len(requests) - len(missing)} hit(s), {len(missing)} computed")
+        return results
+
+    def entries(self):
+        """(mtime_ns, size, path) of every cached matrix."""
+        found = []
+        if not os.path.isdir(self.root):
+            return found
+        for shard in os.scandir(self.root):
+            if not shard.is_dir():
+                continue
+            for entry in os.scandir(shard.path):
+                if entry.name.endswith('.npy'):
+                    try:
+                        st = entry.stat()
+                    except FileNotFoundError:  # evicted by another process
+                        continue
+                    found.append((st.st_mtime_ns, st.st_size, entry.path))
+        return found
+
+    def evict(self):
+        """Delete least recently used entries until the cache fits in max_bytes; returns bytes freed."""
+        entries = sorted(self.entries())
+        total = sum(size for _, size, _ in entries)
+        freed = 0
+        for _, size, path in entries:
+            if total - freed <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            freed += size
+        return freed
+
+
+_default = None
+
+
+def default_cache():
+    """The process-wide cache at DEFAULT_CACHE_DIR."""
+    global _default
+    if _default is None:
+        _default = SpectrogramCache()
+    return _default
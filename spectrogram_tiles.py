@@ -0,0 +1,153 @@
+"""
+Multi-resolution tile pyramids for the spectrogram images on the results page.
+
+Every spectrogram PNG gets a deep-zoom style pyramid next to it:
+
+    static/images/tiles/<image stem>/
+        tiles.json          size, tile size and the size of every level
+        overview.png        the coarsest level as one small image
+        <level>/<col>_<row>.webp
+
+Level 0 is the coarsest; each level doubles the previous one up to the full
+resolution render. The page (static/js/spectrogram-tiles.js) shows the
+overview at once and then fetches only the tiles of the level that matches
+the displayed size, and only those inside the visible part of the panel.
+
+Levels are produced by 2x2 box averaging, column chunk by column chunk, so a
+pyramid can be built from a memory-mapped canvas (streaming_spectrogram.py)
+without loading it.
+"""
+
+import argparse
+import json
+import os
+import shutil
+
+import numpy as np
+from PIL import Image
+
+from profiling import stage
+
+TILE_SIZE = 256
+TILE_FORMAT = 'webp'    # lossless WebP: same pixels as the PNG
+# Fastest lossless WebP effort: ~3x faster to encode than the default for
+# ~40% larger tiles (still about half the size of PNG tiles)
+WEBP_OPTIONS = {'lossless': True, 'method': 0, 'quality': 0}
+MIN_LEVEL_HEIGHT = 64   # stop halving once a level is this short
+DESCRIPTOR = 'tiles.json'
+OVERVIEW = 'overview.png'
+_CHUNK_COLUMNS = 4096   # source columns averaged per downsampling step
+
+
+def tiles_dir_for(image_path):
+    """Pyramid directory of a spectrogram image: <image dir>/tiles/<image stem>."""
+    stem = os.path.splitext(os.path.basename(image_path))[0]
+    return os.path.join(os.path.dirname(image_path), 'tiles', stem)
+
+
+def level_sizes(width, height, min_height=MIN_LEVEL_HEIGHT):
+    """(width, height) of every pyramid level, coarsest first."""
+    sizes = [(width, height)]
+    while sizes[-1][1] > min_height and sizes[-1][0] > 1:
+        w, h = sizes[-1]
+        sizes.append(((w + 1) // 2, (h + 1) // 2))
+    return sizes[::-1]
+
+
+def downsample2(image, out, chunk=_CHUNK_COLUMNS):
+    """
+    2x2 box average of image (H, W, 3) uint8 into out (ceil(H/2), ceil(W/2), 3).
+
+    Odd edges repeat their last row / column. Works chunk by chunk over the
+    columns, so neither array has to be resident as a whole.
+    """
+    h, w, _ = image.shape
+    rows = np.minimum(np.arange(2 * out.shape[0]), h - 1)
+    chunk -= chunk % 2
+    for x0 in range(0, w, chunk):
+        x1 = min(w, x0 + chunk)
+        cols = np.minimum(np.arange(x0, x0 + 2 * ((x1 - x0 + 1) // 2)), w - 1)
+        block = np.asarray(image[:, x0:x1])[rows[:, None], (cols - x0)[None, :]].astype(np.uint16)
+        summed = block[0::2, 0::2] + block[1::2, 0::2] + block[0::2, 1::2] + block[1::2, 1::2]
+        out[:, x0 // 2:x0 // 2 + summed.shape[1]] = ((summed + 2) // 4).astype(np.uint8)
+    return out
+
+
+def _write_tiles(level_image, level_dir, tile_size, fmt):
+    h, w, _ = level_image.shape
+    options = WEBP_OPTIONS if fmt == 'webp' else {'compress_level': 1} if fmt == 'png' else {}
+    os.makedirs(level_dir, exist_ok=True)
+    for col, x0 in enumerate(range(0, w, tile_size)):
+        for row, y0 in enumerate(range(0, h, tile_size)):
+            tile = np.ascontiguousarray(level_image[y0:y0 + tile_size, x0:x0 + tile_size])
+            Image.fromarray(tile).save(os.path.join(level_dir, f"{col}_{row}.{fmt}"), **options)
+
+
+def write_tile_pyramid(image, out_dir, tile_size=TILE_SIZE, fmt=TILE_FORMAT,
+                       min_height=MIN_LEVEL_HEIGHT, allocate=None, release=None):
+    """
+    Write the tile pyramid of an RGB uint8 image (H, W, 3) to out_dir; returns the descriptor.
+
+    allocate(height, width) returns the array each coarser level is built in
+    (default: in memory); release() (if given) is called after every level,
+    e.g. to drop mmap pages. Any previous pyramid in out_dir is replaced.
+    """
+    height, width, _ = image.shape
+    sizes = level_sizes(width, height, min_height)
+    if allocate is None:
+        allocate = lambda h, w: np.empty((h, w, 3), dtype=np.uint8)
+
+    if os.path.isdir(out_dir):
+        shutil.rmtree(out_dir)
+    os.makedirs(out_dir)
+
+    # Finest level first, each one averaged down from the previous
+    level_image = image
+    for level in range(len(sizes) - 1, -1, -1):
+        with stage('tile_encode', level=level):
+            _write_tiles(level_image, os.path.join(out_dir, str(level)), tile_size, fmt)
+        if level == 0:
+            Image.fromarray(np.ascontiguousarray(level_image)).save(os.path.join(out_dir, OVERVIEW))
+        else:
+            w, h = sizes[level - 1]
+            with stage('tile_downsample', level=level):
+                level_image = downsample2(level_image, allocate(h, w))
+        if release is not None:
+            release()
+
+    descriptor = {
+        'width': width,
+        'height': height,
+        'tile_size': tile_size,
+        'format': fmt,
+        'overview': OVERVIEW,
+        'levels': [{'width': w, 'height': h,
+                    'cols': -(-w // tile_size), 'rows': -(-h // tile_size)} for w, h in sizes],
+    }
+    with open(os.path.join(out_dir, DESCRIPTOR), 'w') as fh:
+        json.dump(descriptor, fh, indent=1)
+    return descriptor
+
+
+def tile_image_file(image_path, out_dir=None, **kwargs):
+    """Build the pyramid of an existing spectrogram PNG (default out_dir: tiles_dir_for(image_path))."""
+    with Image.open(image_path) as img:
+        image = np.asarray(img.convert('RGB'))
+    out_dir = out_dir or tiles_dir_for(image_path)
+    descriptor = write_tile_pyramid(image, out_dir, **kwargs)
+    print(f"✓ Tiled {image_path} -> {out_dir} ({len(descriptor['levels'])} levels)")
+    return descriptor
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build tile pyramids for existing spectrogram PNGs.")
+    parser.add_argument('images', nargs='+')
+    parser.add_argument('--tile-size', type=int, default=TILE_SIZE)
+    parser.add_argument('--format', default=TILE_FORMAT, help="Tile image format (webp, png, ...)")
+    args = parser.parse_args(argv)
+    for path in args.images:
+        tile_image_file(path, tile_size=args.tile_size, fmt=args.format)
+
+
+if __name__ == "__main__":
+    main()
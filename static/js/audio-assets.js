@@ -0,0 +1,166 @@
+// Compressed audio sources and precomputed waveforms.
+//
+// generate_audio_assets.py writes <name>.opus, <name>.m4a and <name>.peaks.json
+// next to every WAV in static/audio. <audio> elements list the sources in that
+// order (the WAV stays the last fallback), and waveforms are drawn from the
+// peaks file instead of downloading and decoding the audio.
+//
+// Clips that only play part of a file (the last 5 s of the best-FAD and
+// velocity-sweep outputs) are not trimmed copies: generate_spectrograms.py
+// writes their offset/duration to static/audio/segments.json, and the players
+// are restricted to that window with a media fragment (#t=start,end) plus a
+// seek guard. <audio data-clip="...wav"> elements are set up on load.
+
+const AUDIO_VARIANTS = [
+  { ext: '.opus', type: 'audio/ogg; codecs=opus' },
+  { ext: '.m4a', type: 'audio/mp4; codecs="mp4a.40.2"' },
+  { ext: '.wav', type: 'audio/wav' }
+];
+
+const AUDIO_SEGMENTS_URL = 'static/audio/segments.json';
+let audioSegmentsPromise = null;
+
+function audioVariant(wavPath, ext) {
+  return wavPath.replace(/\.wav$/i, ext);
+}
+
+// { wavPath: { offset, duration } } from segments.json (fetched once)
+function loadAudioSegments() {
+  if (!audioSegmentsPromise) {
+    audioSegmentsPromise = fetch(AUDIO_SEGMENTS_URL)
+      .then(response => response.json())
+      .then(manifest => manifest.segments)
+      .catch(error => {
+        console.error('Audio segments:', error);
+        return {};
+      });
+  }
+  return audioSegmentsPromise;
+}
+
+// Point an <audio> element at a clip: Opus, then AAC, then the WAV.
+// With a segment ({ offset, duration } in seconds) only that window plays.
+function setAudioSource(audioEl, wavPath, segment = null) {
+  const fragment = segment
+    ? '#t=' + segment.offset.toFixed(3) + ',' + (segment.offset + segment.duration).toFixed(3)
+    : '';
+  audioEl.querySelectorAll('source').forEach(source => source.remove());
+  AUDIO_VARIANTS.forEach(({ ext, type }) => {
+    const source = document.createElement('source');
+    source.src = audioVariant(wavPath, ext) + fragment;
+    source.type = type;
+    audioEl.appendChild(source);
+  });
+  audioEl.audioSegment = segment;
+  guardAudioSegment(audioEl);
+  audioEl.load();
+}
+
+// Play wavPath through audioEl, limited to its segment if segments.json lists one.
+function setAudioClip(audioEl, wavPath) {
+  return loadAudioSegments().then(segments => setAudioSource(audioEl, wavPath, segments[wavPath] || null));
+}
+
+// The media fragment sets the start and stop point; this keeps seeking and
+// replay inside the window too.
+function guardAudioSegment(audioEl) {
+  if (audioEl.segmentGuarded) return;
+  audioEl.segmentGuarded = true;
+  const clamp = () => {
+    const segment = audioEl.audioSegment;
+    if (!segment) return;
+    const end = segment.offset + segment.duration;
+    if (audioEl.currentTime < segment.offset - 0.05 || audioEl.currentTime >= end) {
+      audioEl.currentTime = segment.offset;
+    }
+  };
+  audioEl.addEventListener('seeking', clamp);
+  audioEl.addEventListener('play', clamp);
+  audioEl.addEventListener('timeupdate', () => {
+    const segment = audioEl.audioSegment;
+    if (segment && audioEl.currentTime >= segment.offset + segment.duration) {
+      audioEl.pause();
+      audioEl.currentTime = segment.offset;
+    }
+  });
+}
+
+// Canvas waveform from an audiowaveform-style peaks file, with a progress
+// overlay and click-to-seek on the linked <audio> element.
+class PeaksWaveform {
+  constructor(container, wavPath, audioEl, options = {}) {
+    this.container = container;
+    this.audioEl = audioEl;
+    this.options = Object.assign({
+      height: 60,
+      color: '#3273dc',
+      progressColor: '#209cee',
+      backgroundColor: '#f5f5f5',
+      cursorColor: '#363636'
+    }, options);
+    this.peaks = null;
+    this.canvas = document.createElement('canvas');
+    this.canvas.style.cssText = 'width: 100%; display: block; cursor: pointer;';
+    this.canvas.style.height = this.options.height + 'px';
+    container.appendChild(this.canvas);
+
+    this.canvas.addEventListener('click', e => {
+      const rect = this.canvas.getBoundingClientRect();
+      if (this.audioEl && this.audioEl.duration) {
+        this.audioEl.currentTime = (e.clientX - rect.left) / rect.width * this.audioEl.duration;
+      }
+    });
+    if (this.audioEl) {
+      this.audioEl.addEventListener('timeupdate', () => this.draw());
+      this.audioEl.addEventListener('seeked', () => this.draw());
+    }
+    new ResizeObserver(() => this.draw()).observe(container);
+
+    fetch(audioVariant(wavPath, '.peaks.json'))
+      .then(response => response.json())
+      .then(peaks => { this.peaks = peaks; this.draw(); })
+      .catch(error => console.error('Waveform peaks:', error));
+  }
+
+  draw() {
+    const ratio = window.devicePixelRatio || 1;
+    const width = Math.max(1, Math.round(this.canvas.clientWidth * ratio));
+    const height = Math.round(this.options.height * ratio);
+    if (this.canvas.width !== width || this.canvas.height !== height) {
+      this.canvas.width = width;
+      this.canvas.height = height;
+    }
+    const ctx = this.canvas.getContext('2d');
+    ctx.fillStyle = this.options.backgroundColor;
+    ctx.fillRect(0, 0, width, height);
+    if (!this.peaks) return;
+
+    const data = this.peaks.data;
+    const n = this.peaks.length;
+    const scale = 1 << (this.peaks.bits - 1);
+    const progress = this.audioEl && this.audioEl.duration
+      ? this.audioEl.currentTime / this.audioEl.duration : 0;
+    const mid = height / 2;
+    for (let x = 0; x < width; x++) {
+      // Peak pairs that fall into this pixel column
+      const i0 = Math.floor(x * n / width);
+      const i1 = Math.max(i0 + 1, Math.floor((x + 1) * n / width));
+      let lo = 0, hi = 0;
+      for (let i = i0; i < i1 && i < n; i++) {
+        lo = Math.min(lo, data[2 * i]);
+        hi = Math.max(hi, data[2 * i + 1]);
+      }
+      ctx.fillStyle = x / width < progress ? this.options.progressColor : this.options.color;
+      const top = mid - hi / scale * mid;
+      ctx.fillRect(x, top, 1, Math.max(1, (hi - lo) / scale * mid));
+    }
+    if (progress > 0) {
+      ctx.fillStyle = this.options.cursorColor;
+      ctx.fillRect(Math.round(progress * width), 0, Math.max(1, Math.round(ratio)), height);
+    }
+  }
+}
+
+document.addEventListener('DOMContentLoaded', function() {
+  document.querySelectorAll('audio[data-clip]').forEach(el => setAudioClip(el, el.dataset.clip));
+});
@@ -0,0 +1,53 @@
+// Reader for the note indexes written by midi_note_index.py (<name>.notes.bin).
+//
+// The file is one fetch of a few KB: a 32-byte little-endian header followed by
+// start/end (f32), the time-bucket table (u32) and pitch/velocity/drum class
+// (u8), every section 4-byte aligned. The arrays are typed-array views on the
+// downloaded buffer, so nothing is parsed or copied before the first draw.
+
+const NOTE_INDEX_MAGIC = 'MNIX';
+const NOTE_INDEX_VERSION = 1;
+
+class NoteIndex {
+  constructor(buffer) {
+    const view = new DataView(buffer);
+    const magic = String.fromCharCode(...new Uint8Array(buffer, 0, 4));
+    if (magic !== NOTE_INDEX_MAGIC || view.getUint32(4, true) !== NOTE_INDEX_VERSION) {
+      throw new Error('Not a version ' + NOTE_INDEX_VERSION + ' note index');
+    }
+    const n = view.getUint32(8, true);
+    const nBuckets = view.getUint32(12, true);
+    this.count = n;
+    this.bucketSeconds = view.getFloat32(16, true);
+    this.duration = view.getFloat32(20, true);
+    this.classCount = view.getUint32(24, true);
+
+    let offset = 32;
+    const take = (Type, length) => {
+      const array = new Type(buffer, offset, length);
+      offset += array.byteLength;
+      offset += (4 - offset % 4) % 4;
+      return array;
+    };
+    this.start = take(Float32Array, n);
+    this.end = take(Float32Array, n);
+    this.bucket = take(Uint32Array, nBuckets + 1);
+    this.pitch = take(Uint8Array, n);
+    this.velocity = take(Uint8Array, n);
+    this.drum = take(Uint8Array, n);
+  }
+
+  static async load(url) {
+    const response = await fetch(url);
+    if (!response.ok) throw new Error('Cannot load ' + url);
+    return new NoteIndex(await response.arrayBuffer());
+  }
+
+  // Call fn(i) for every note sounding in [t0, t1), in start order.
+  forEachInWindow(t0, t1, fn) {
+    const b = Math.min(this.bucket.length - 1, Math.max(0, Math.floor(t0 / this.bucketSeconds)));
+    for (let i = this.bucket[b]; i < this.count && this.start[i] < t1; i++) {
+      if (this.end[i] > t0) fn(i);
+    }
+  }
+}
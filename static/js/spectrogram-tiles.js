@@ -0,0 +1,175 @@
+// Lazy multi-resolution spectrogram viewer.
+//
+// Reads the tile pyramids written by spectrogram_tiles.py
+// (static/images/tiles/<name>/tiles.json, overview.png, <level>/<col>_<row>.webp).
+// A viewer is a <div class="tiled-spectrogram" data-tiles="static/images/tiles/<name>">
+// sized like the <img> it replaces (height / max-width set by the page's zoom
+// code, width from the CSS aspect-ratio). Nothing is fetched until the element
+// is near the viewport; then the small overview is shown, and only the tiles of
+// the level matching the displayed size that fall inside the visible part of
+// the scroll container are requested.
+
+class TiledSpectrogram {
+  // Largest on-screen stretch of a level's pixels before the next finer level is used
+  static MAX_UPSCALE = 1.25;
+
+  static attach(element) {
+    if (!element.tiledSpectrogram) {
+      element.tiledSpectrogram = new TiledSpectrogram(element);
+    }
+    return element.tiledSpectrogram;
+  }
+
+  constructor(element) {
+    this.el = element;
+    this.el.style.position = 'relative';
+    this.el.style.overflow = 'hidden';
+    this.el.style.backgroundSize = '100% 100%';
+    this.el.style.backgroundRepeat = 'no-repeat';
+    this.scroller = element.parentElement;
+    this.base = null;
+    this.descriptor = null;
+    this.layers = {};
+    this.visible = false;
+    this.pending = false;
+    this.generation = 0;
+    this.loading = -1;
+
+    this.intersection = new IntersectionObserver(entries => {
+      this.visible = entries.some(entry => entry.isIntersecting);
+      this.scheduleUpdate();
+    }, { rootMargin: '200px' });
+    this.intersection.observe(this.el);
+    // Zoom changes the element size: pick the level again
+    this.resize = new ResizeObserver(() => this.scheduleUpdate());
+    this.resize.observe(this.el);
+    this.scroller.addEventListener('scroll', () => this.scheduleUpdate(), { passive: true });
+    window.addEventListener('scroll', () => this.scheduleUpdate(), { passive: true });
+
+    this.setSource(element.dataset.tiles);
+  }
+
+  setSource(base) {
+    if (!base || base === this.base) return;
+    this.base = base;
+    this.el.dataset.tiles = base;
+    this.descriptor = null;
+    this.generation += 1;
+    Object.values(this.layers).forEach(layer => layer.remove());
+    this.layers = {};
+    this.el.style.backgroundImage = 'none';
+    this.scheduleUpdate();
+  }
+
+  scheduleUpdate() {
+    if (this.pending) return;
+    this.pending = true;
+    requestAnimationFrame(() => {
+      this.pending = false;
+      this.update();
+    });
+  }
+
+  async loadDescriptor() {
+    const generation = this.generation;
+    const base = this.base;
+    const response = await fetch(base + '/tiles.json');
+    if (!response.ok) throw new Error('Cannot load ' + base + '/tiles.json');
+    const descriptor = await response.json();
+    if (generation !== this.generation) return;
+    this.descriptor = descriptor;
+    this.el.style.aspectRatio = descriptor.width + ' / ' + descriptor.height;
+    this.el.style.backgroundImage = 'url("' + base + '/' + descriptor.overview + '")';
+    this.scheduleUpdate();
+  }
+
+  update() {
+    if (!this.visible || !this.base) return;
+    if (!this.descriptor) {
+      if (this.loading !== this.generation) {
+        this.loading = this.generation;
+        this.loadDescriptor().catch(error => console.error('Spectrogram tiles:', error));
+      }
+      return;
+    }
+    const rect = this.el.getBoundingClientRect();
+    if (rect.width === 0 || rect.height === 0) return;
+
+    // Coarsest level that is at least as tall as the element on screen, give
+    // or take MAX_UPSCALE: levels halve, so a strict >= would pick the full
+    // resolution for any panel even slightly taller than the next level down
+    // (a 265 px panel on a 450 px image), and cull nothing but off-screen tiles.
+    const levels = this.descriptor.levels;
+    const neededHeight = rect.height * (window.devicePixelRatio || 1) / TiledSpectrogram.MAX_UPSCALE;
+    let level = levels.findIndex(l => l.height >= neededHeight);
+    if (level < 0) level = levels.length - 1;
+
+    // Visible part of the element, as fractions of its size
+    const view = this.scroller.getBoundingClientRect();
+    const left = Math.max(rect.left, view.left, 0);
+    const right = Math.min(rect.right, view.right, window.innerWidth);
+    const top = Math.max(rect.top, view.top, 0);
+    const bottom = Math.min(rect.bottom, view.bottom, window.innerHeight);
+    if (right <= left || bottom <= top) return;
+    const x0 = (left - rect.left) / rect.width;
+    const x1 = (right - rect.left) / rect.width;
+    const y0 = (top - rect.top) / rect.height;
+    const y1 = (bottom - rect.top) / rect.height;
+
+    const info = levels[level];
+    const size = this.descriptor.tile_size;
+    const layer = this.layer(level);
+    const colStart = Math.floor(x0 * info.width / size);
+    const colEnd = Math.min(info.cols - 1, Math.floor(x1 * info.width / size));
+    const rowStart = Math.floor(y0 * info.height / size);
+    const rowEnd = Math.min(info.rows - 1, Math.floor(y1 * info.height / size));
+    for (let col = colStart; col <= colEnd; col++) {
+      for (let row = rowStart; row <= rowEnd; row++) {
+        this.loadTile(layer, level, info, col, row);
+      }
+    }
+  }
+
+  layer(level) {
+    // The current level is stacked on top; coarser layers stay underneath
+    // (and the overview behind them) until its tiles have arrived.
+    let layer = this.layers[level];
+    if (!layer) {
+      layer = document.createElement('div');
+      layer.style.cssText = 'position: absolute; inset: 0;';
+      layer.tiles = new Set();
+      this.layers[level] = layer;
+      this.el.appendChild(layer);
+    }
+    Object.entries(this.layers).forEach(([other, el]) => {
+      el.style.zIndex = Number(other) === level ? 2 : 1;
+      el.style.display = Number(other) <= level ? 'block' : 'none';
+    });
+    return layer;
+  }
+
+  loadTile(layer, level, info, col, row) {
+    const key = col + '_' + row;
+    if (layer.tiles.has(key)) return;
+    layer.tiles.add(key);
+    const size = this.descriptor.tile_size;
+    const w = Math.min(size, info.width - col * size);
+    const h = Math.min(size, info.height - row * size);
+    const tile = document.createElement('img');
+    tile.decoding = 'async';
+    tile.alt = '';
+    tile.draggable = false;
+    tile.style.cssText =
+      'position: absolute; display: block; max-width: none; pointer-events: none;' +
+      'left: ' + (100 * col * size / info.width) + '%;' +
+      'top: ' + (100 * row * size / info.height) + '%;' +
+      'width: ' + (100 * w / info.width) + '%;' +
+      'height: ' + (100 * h / info.height) + '%;';
+    tile.src = this.base + '/' + level + '/' + key + '.' + this.descriptor.format;
+    layer.appendChild(tile);
+  }
+}
+
+document.addEventListener('DOMContentLoaded', function() {
+  document.querySelectorAll('.tiled-spectrogram').forEach(el => TiledSpectrogram.attach(el));
+});
@@ -0,0 +1,245 @@
+"""
+Bounded-memory spectrograms for long recordings (full GMD sessions,
+concatenated evaluation sets).
+
+The audio is read in blocks of STFT frames. Each block reads exactly the
+samples its frames cover (n_fft - hop samples of overlap with the next block)
+and frames them on the global hop grid, so block boundaries are seamless and
+the result equals librosa.stft(center=True, pad_mode='constant').
+
+Two passes keep the librosa.amplitude_to_db(ref=np.max, top_db=80) scaling
+without holding the STFT: the first pass finds the global magnitude range,
+the second colours each block's columns (raster renderer LUT and frequency
+mapping) into a memory-mapped canvas whose pages are released as it goes.
+The PNG is then written in horizontal strips of rows with an incremental
+zlib stream.
+
+Peak memory depends on the block size and image height, not on the length
+of the recording.
+"""
+
+import argparse
+import mmap
+import os
+import struct
+import tempfile
+import zlib
+
+import numpy as np
+import soundfile as sf
+
+from spectrogram_raster import colormap_lut, row_index_map, LUT_SIZE
+from spectrogram_tiles import write_tile_pyramid
+
+BLOCK_FRAMES = 4096   # STFT frames per block (~33s at hop 128 / 16 kHz)
+STRIP_ROWS = 16       # image rows compressed per PNG write
+AMIN = 1e-5
+TOP_DB = 80.0
+
+
+def _hann(n_fft):
+    """Periodic Hann window, as librosa.filters.get_window('hann', n_fft)."""
+    return (0.5 - 0.5 * np.cos(2.0 * np.pi * np.arange(n_fft) / n_fft)).astype(np.float32)
+
+
+def _read_mono(f, start, stop):
+    """Samples [start, stop) of an open SoundFile as mono float32, zero outside the file."""
+    out = np.zeros(stop - start, dtype=np.float32)
+    lo, hi = max(start, 0), min(stop, f.frames)
+    if hi > lo:
+        f.seek(lo)
+        y = f.read(hi - lo, dtype='float32', always_2d=True)
+        out[lo - start:lo - start + len(y)] = y[:, 0] if y.shape[1] == 1 else y.mean(axis=1)
+    return out
+
+
+def iter_stft_blocks(path, n_fft=1024, hop_length=128, block_frames=BLOCK_FRAMES,
+                     start_sample=0, n_samples=None):
+    """
+    Yield (first_frame, |STFT| block of shape (1 + n_fft // 2, frames)) over a file.
+
+    Frames follow librosa.stft(center=True, pad_mode='constant') on the
+    samples [start_sample, start_sample + n_samples).
+    """
+    window = _hann(n_fft)
+    half = n_fft // 2
+    with sf.SoundFile(path) as f:
+        end = f.frames if n_samples is None else min(f.frames, start_sample + n_samples)
+        length = max(0, end - start_sample)
+        n_frames = 1 + length // hop_length
+        for k0 in range(0, n_frames, block_frames):
+            k1 = min(n_frames, k0 + block_frames)
+            # Frame k covers samples [k*hop - n_fft/2, k*hop + n_fft/2) of the (unpadded) clip
+            lo = k0 * hop_length - half
+            hi = (k1 - 1) * hop_length + half
+            x = _read_mono(f, start_sample + lo, start_sample + hi)
+            # Zero out anything past the clip end (the clip may stop before the file does)
+            past_end = length - lo
+            if past_end < len(x):
+                x[max(past_end, 0):] = 0.0
+            frames = np.lib.stride_tricks.sliding_window_view(x, n_fft)[::hop_length]
+            yield k0, np.abs(np.fft.rfft(frames * window, axis=1)).T
+
+
+def _block_columns(k0, k1, n_frames, width):
+    """Pixel columns whose frame lies in [k0, k1), and those frames."""
+    x0 = int(np.ceil(k0 * width / n_frames - 0.5))
+    x1 = int(np.ceil(k1 * width / n_frames - 0.5))
+    xs = np.arange(max(x0, 0), min(x1, width))
+    frames = np.clip(np.floor((xs + 0.5) * n_frames / width).astype(np.intp), k0, k1 - 1)
+    return xs, frames
+
+
+def _png_chunk(fh, tag, data):
+    fh.write(struct.pack('>I', len(data)))
+    fh.write(tag + data)
+    fh.write(struct.pack('>I', zlib.crc32(tag + data) & 0xFFFFFFFF))
+
+
+class _Canvas:
+    """
+    Disk-backed (H, W, 3) uint8 image. Pages are handed back to the OS after
+    every block / strip, so resident memory does not grow with the width.
+    """
+    def __init__(self, path, height, width):
+        self.shape = (height, width, 3)
+        self._fh = open(path, 'w+b')
+        self._fh.truncate(height * width * 3)
+        self._mm = mmap.mmap(self._fh.fileno(), height * width * 3)
+        self.array = np.ndarray(self.shape, dtype=np.uint8, buffer=self._mm)
+
+    def release(self):
+        """Write dirty pages back and drop them from this process's resident set."""
+        self._mm.flush()
+        if hasattr(self._mm, 'madvise') and hasattr(mmap, 'MADV_DONTNEED'):
+            self._mm.madvise(mmap.MADV_DONTNEED)
+
+    def close(self):
+        del self.array
+        self._mm.close()
+        self._fh.close()
+
+
+def write_png_strips(canvas, output_path, strip_rows=STRIP_ROWS, level=6, release=None):
+    """
+    Write an (H, W, 3) uint8 array to PNG, compressing strip_rows rows at a time.
+
+    release() (if given) is called after each strip, e.g. to drop mmap pages.
+    """
+    height, width, _ = canvas.shape
+    comp = zlib.compressobj(level)
+    with open(output_path, 'wb') as fh:
+        fh.write(b'\x89PNG\r\n\x1a\n')
+        _png_chunk(fh, b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0))
+        for r0 in range(0, height, strip_rows):
+            strip = np.asarray(canvas[r0:r0 + strip_rows])
+            # Filter type 0 (None) byte in front of every row
+            rows = np.concatenate([np.zeros((len(strip), 1), np.uint8),
+                                   strip.reshape(len(strip), -1)], axis=1)
+            data = comp.compress(rows.tobytes())
+            if data:
+                _png_chunk(fh, b'IDAT', data)
+            if release is not None:
+                release()
+        _png_chunk(fh, b'IDAT', comp.flush())
+        _png_chunk(fh, b'IEND', b'')
+
+
+def _write_tiles_from_canvas(canvas, tmp, tiles_dir):
+    """Tile pyramid of the canvas, with every coarser level on disk as well."""
+    levels = []
+
+    def allocate(height, width):
+        levels.append(_Canvas(os.path.join(tmp, f"level_{len(levels)}.u8"), height, width))
+        return levels[-1].array
+
+    def release():
+        canvas.release()
+        for level in levels:
+            level.release()
+
+    try:
+        write_tile_pyramid(canvas.array, tiles_dir, allocate=allocate, release=release)
+    finally:
+        for level in levels:
+            level.close()
+
+
+def generate_spectrogram_streaming(audio_path, output_path, px_per_second=180, height=450,
+                                   min_width=1200, n_fft=1024, hop_length=128, y_axis='log',
+                                   cmap='magma', block_frames=BLOCK_FRAMES, last_seconds=None,
+                                   tiles_dir=None):
+    """
+    Render an axis-less spectrogram PNG of any length with bounded memory.
+
+    Defaults match generate_spectrograms.py (1.2 in/s at 150 dpi, 3 in tall,
+    at least 8 in wide). If last_seconds is set, only the end of the file is shown.
+    If tiles_dir is set, the tile pyramid is built from the same canvas.
+    """
+    info = sf.info(audio_path)
+    sr = info.samplerate
+    start_sample, n_samples = 0, info.frames
+    if last_seconds is not None:
+        n_samples = min(info.frames, int(sr * last_seconds))
+        start_sample = info.frames - n_samples
+    n_frames = 1 + n_samples // hop_length
+    duration = n_samples / sr
+    width = max(min_width, int(round(duration * px_per_second)))
+    print(f"Streaming spectrogram: {audio_path} ({duration:.1f}s -> {width}x{height}px)")
+
+    blocks = lambda: iter_stft_blocks(audio_path, n_fft, hop_length, block_frames,
+                                      start_sample, n_samples)
+
+    # Pass 1: global magnitude range (ref=np.max, and the colour range)
+    s_max, s_min = 0.0, np.inf
+    for _, S in blocks():
+        s_max = max(s_max, float(S.max()))
+        s_min = min(s_min, float(S.min()))
+    ref_db = 20.0 * np.log10(max(AMIN, s_max))
+    vmax = 20.0 * np.log10(max(AMIN, s_max)) - ref_db
+    vmin = max(20.0 * np.log10(max(AMIN, s_min)) - ref_db, vmax - TOP_DB)
+    scale = LUT_SIZE / (vmax - vmin) if vmax > vmin else 0.0
+
+    rows = row_index_map(1 + n_fft // 2, height, y_axis, sr, n_fft)
+    lut = colormap_lut(cmap)
+
+    # Pass 2: colour each block's columns into a disk-backed canvas
+    with tempfile.TemporaryDirectory(prefix='midiff_stream_') as tmp:
+        canvas = _Canvas(os.path.join(tmp, 'canvas.u8'), height, width)
+        try:
+            for k0, S in blocks():
+                xs, frames = _block_columns(k0, k0 + S.shape[1], n_frames, width)
+                if xs.size == 0:
+                    continue
+                sampled = S[rows[:, None], (frames - k0)[None, :]]
+                S_db = np.maximum(20.0 * np.log10(np.maximum(AMIN, sampled)) - ref_db, vmax - TOP_DB)
+                idx = np.clip(((S_db - vmin) * scale).astype(np.intp), 0, LUT_SIZE - 1)
+                canvas.array[:, xs[0]:xs[-1] + 1] = lut[idx]
+                canvas.release()
+            write_png_strips(canvas.array, output_path, release=canvas.release)
+            if tiles_dir is not None:
+                _write_tiles_from_canvas(canvas, tmp, tiles_dir)
+        finally:
+            canvas.close()
+
+    print(f"✓ Saved streaming spectrogram: {output_path} ({width}x{height} px)")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Bounded-memory spectrogram for long recordings.")
+    parser.add_argument('audio_path')
+    parser.add_argument('output_path')
+    parser.add_argument('--px-per-second', type=float, default=180)
+    parser.add_argument('--height', type=int, default=450)
+    parser.add_argument('--block-frames', type=int, default=BLOCK_FRAMES)
+    parser.add_argument('--last-seconds', type=float, default=None)
+    parser.add_argument('--tiles-dir', default=None, help="Also write the tile pyramid here")
+    args = parser.parse_args(argv)
+    generate_spectrogram_streaming(args.audio_path, args.output_path,
+                                   px_per_second=args.px_per_second, height=args.height,
+                                   block_frames=args.block_frames, last_seconds=args.last_seconds,
+                                   tiles_dir=args.tiles_dir)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+import itertools
+
+import numpy as np
+import pytest
+
+from frechet_stats import FrechetStats, frechet_distance
+
+
+def _embeddings(seed=0, n=600, dim=8):
+    rng = np.random.default_rng(seed)
+    # Large common offset: the case where sum / sum-of-squares loses precision
+    return rng.normal(size=(n, dim)) @ rng.normal(size=(dim, dim)) + 1e4
+
+
+def _shard_stats(shards):
+    return [FrechetStats().update(shard) for shard in shards]
+
+
+def test_merged_shards_match_concatenated_data():
+    data = _embeddings()
+    shards = np.split(data, [7, 100, 101, 350])  # uneven, one single-row shard
+    stats = FrechetStats.merged(_shard_stats(shards))
+    assert stats.n == len(data)
+    np.testing.assert_allclose(stats.mean, np.mean(data, axis=0), rtol=1e-12)
+    np.testing.assert_allclose(stats.covariance, np.cov(data, rowvar=False), rtol=1e-9, atol=1e-9)
+
+
+def test_batched_updates_match_concatenated_data():
+    data = _embeddings(seed=1)
+    stats = FrechetStats()
+    for batch in np.array_split(data, 13):
+        stats.update(batch)
+    np.testing.assert_allclose(stats.mean, np.mean(data, axis=0), rtol=1e-12)
+    np.testing.assert_allclose(stats.covariance, np.cov(data, rowvar=False), rtol=1e-9, atol=1e-9)
+
+
+def test_merge_is_order_independent():
+    shards = np.array_split(_embeddings(seed=2), 4)
+    reference = FrechetStats.merged(_shard_stats(shards))
+    for order in itertools.permutations(range(len(shards))):
+        stats = FrechetStats.merged(_shard_stats([shards[i] for i in order]))
+        np.testing.assert_allclose(stats.mean, reference.mean, rtol=1e-12)
+        np.testing.assert_allclose(stats.m2, reference.m2, rtol=1e-9)
+
+
+def test_merge_tree_matches_sequential_merge():
+    shards = _shard_stats(np.array_split(_embeddings(seed=3), 4))
+    sequential = FrechetStats.merged(shards)
+    pairwise = FrechetStats.merged([FrechetStats.merged(shards[:2]), FrechetStats.merged(shards[2:])])
+    np.testing.assert_allclose(pairwise.mean, sequential.mean, rtol=1e-12)
+    np.testing.assert_allclose(pairwise.m2, sequential.m2, rtol=1e-9)
+
+
+def test_empty_states_are_ignored():
+    data = _embeddings(seed=4)
+    stats = FrechetStats.merged([FrechetStats(), FrechetStats().update(data), FrechetStats()])
+    stats.update(np.empty((0, data.shape[1])))
+    np.testing.assert_allclose(stats.covariance, np.cov(data, rowvar=False), rtol=1e-9, atol=1e-9)
+
+
+def test_save_load_round_trip(tmp_path):
+    stats = FrechetStats().update(_embeddings(seed=5))
+    stats.save(tmp_path / 'stats.npz')
+    loaded = FrechetStats.load(tmp_path / 'stats.npz')
+    assert loaded.n == stats.n
+    np.testing.assert_array_equal(loaded.mean, stats.mean)
+    np.testing.assert_array_equal(loaded.m2, stats.m2)
+
+
+def test_covariance_needs_two_embeddings():
+    with pytest.raises(ValueError):
+        FrechetStats().update(np.ones((1, 3))).covariance
+
+
+def test_frechet_distance_of_identical_sets_is_not_negative():
+    stats = FrechetStats().update(_embeddings(seed=6))
+    distance = frechet_distance(stats, stats)
+    assert distance >= 0.0
+    assert str(distance) != '-0.0'
+    assert distance == pytest.approx(0.0, abs=1e-6)
+
+
+def test_frechet_distance_of_shifted_set():
+    data = _embeddings(seed=7)
+    shift = np.full(data.shape[1], 0.5)
+    distance = frechet_distance(FrechetStats().update(data), FrechetStats().update(data + shift))
+    # Same covariance: only the squared mean difference remains
+    assert distance == pytest.approx(shift @ shift, rel=1e-6, abs=1e-6)
@@ -0,0 +1,152 @@
+"""
+Scalar reader for TensorBoard event files, without TensorFlow.
+
+An events.out.tfevents.* file is a TFRecord stream:
+
+    uint64 length | uint32 masked crc32c(length) | data | uint32 masked crc32c(data)
+
+and every record is a serialized tensorflow.Event protobuf. Only the fields
+needed for scalars are decoded, straight from the protobuf wire format:
+
+    Event:        1 wall_time (double), 2 step (int64), 5 summary (Summary)
+    Summary:      1 value (repeated Value)
+    Value:        1 tag (string), 2 simple_value (float), 8 tensor (TensorProto)
+    TensorProto:  1 dtype, 4 tensor_content, 5 float_val, 6 double_val
+
+Scalars written as simple_value (PyTorch Lightning / tensorboardX) and as
+rank-0 float tensors (TF2 summaries) are both recognised; images, histograms
+and everything else are skipped without being parsed.
+
+The length CRC of every record is checked, so a truncated or corrupt file
+stops with an error instead of yielding garbage; the data CRC is only checked
+with verify=True.
+"""
+
+import struct
+
+_DT_FLOAT, _DT_DOUBLE = 1, 2
+
+
+def _crc32c_table():
+    table = []
+    for i in range(256):
+        crc = i
+        for _ in range(8):
+            crc = (crc >> 1) ^ 0x82F63B78 if crc & 1 else crc >> 1
+        table.append(crc)
+    return table
+
+
+_CRC_TABLE = _crc32c_table()
+
+
+def masked_crc32c(data):
+    """TFRecord's masked CRC-32C of a bytes object."""
+    crc = 0xFFFFFFFF
+    for byte in data:
+        crc = _CRC_TABLE[(crc ^ byte) & 0xFF] ^ (crc >> 8)
+    crc ^= 0xFFFFFFFF
+    return (((crc >> 15) | (crc << 17)) + 0xA282EAD8) & 0xFFFFFFFF
+
+
+def iter_records(path, verify=False):
+    """Yield the data of every record of a TFRecord file."""
+    with open(path, 'rb') as fh:
+        data = fh.read()
+    offset, end = 0, len(data)
+    while offset < end:
+        if offset + 12 > end:
+            raise ValueError(f"{path}: truncated record header at byte {offset}")
+        header = data[offset:offset + 8]
+        length, = struct.unpack('<Q', header)
+        length_crc, = struct.unpack_from('<I', data, offset + 8)
+        if masked_crc32c(header) != length_crc:
+            raise ValueError(f"{path}: corrupt record length at byte {offset}")
+        start = offset + 12
+        if start + length + 4 > end:
+            raise ValueError(f"{path}: truncated record at byte {offset}")
+        record = data[start:start + length]
+        if verify:
+            data_crc, = struct.unpack_from('<I', data, start + length)
+            if masked_crc32c(record) != data_crc:
+                raise ValueError(f"{path}: corrupt record data at byte {offset}")
+        yield record
+        offset = start + length + 4
+
+
+def _varint(buf, i):
+    result = shift = 0
+    while True:
+        byte = buf[i]
+        i += 1
+        result |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return result, i
+        shift += 7
+
+
+def _fields(buf):
+    """Yield (field number, wire type, value) of a protobuf message; values stay undecoded."""
+    i, end = 0, len(buf)
+    while i < end:
+        key, i = _varint(buf, i)
+        number, wire = key >> 3, key & 7
+        if wire == 0:
+            value, i = _varint(buf, i)
+        elif wire == 1:
+            value, i = buf[i:i + 8], i + 8
+        elif wire == 2:
+            length, i = _varint(buf, i)
+            value, i = buf[i:i + length], i + length
+        elif wire == 5:
+            value, i = buf[i:i + 4], i + 4
+        else:
+            raise ValueError(f"Unsupported protobuf wire type {wire}")
+        yield number, wire, value
+
+
+def _tensor_scalar(buf):
+    """Value of a rank-0 float/double TensorProto, or None."""
+    dtype, value = None, None
+    for number, wire, field in _fields(buf):
+        if number == 1:
+            dtype = field
+        elif number == 5:
+            value = struct.unpack('<f', field)[0] if wire == 5 else struct.unpack_from('<f', field)[0]
+        elif number == 6:
+            value = struct.unpack('<d', field)[0] if wire == 1 else struct.unpack_from('<d', field)[0]
+        elif number == 4 and value is None:
+            content = field
+            if dtype == _DT_DOUBLE and len(content) == 8:
+                value = struct.unpack('<d', content)[0]
+            elif len(content) == 4:
+                value = struct.unpack('<f', content)[0]
+    return value if dtype in (None, _DT_FLOAT, _DT_DOUBLE) else None
+
+
+def iter_scalars(path, verify=False):
+    """Yield (tag, step, wall_time, value) for every scalar in an event file."""
+    for record in iter_records(path, verify):
+        wall_time, step, summary = 0.0, 0, None
+        for number, _, value in _fields(record):
+            if number == 1:
+                wall_time = struct.unpack('<d', value)[0]
+            elif number == 2:
+                step = value
+            elif number == 5:
+                summary = value
+        if summary is None:
+            continue
+        for number, _, value_msg in _fields(summary):
+            if number != 1:
+                continue
+            tag, scalar = None, None
+            for field, wire, value in _fields(value_msg):
+                if field == 1:
+                    tag = value.decode('utf-8')
+                elif field == 2 and wire == 5:
+                    scalar = struct.unpack('<f', value)[0]
+                elif field == 8:
+                    scalar = _tensor_scalar(value)
+            if tag is not None and scalar is not None:
+                yield tag, step, wall_time, scalar
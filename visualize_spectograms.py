@@ -7,27 +7,19 @@ This framework generates a 10-second composite video visualizing the progression
 of drum audio enhancement across different guidance scales.
 """
 
+import argparse
 import os
 import tempfile
 import numpy as np
 import librosa
-import librosa.display
-import matplotlib.pyplot as plt
-import soundfile as sf
-from moviepy import (
-    VideoClip, AudioFileClip, ImageClip, CompositeVideoClip, 
-    TextClip, ColorClip, concatenate_videoclips
-)
-from io import BytesIO
-from PIL import Image
-
-def mplfig_to_npimage(fig):
-    """Convert matplotlib figure to numpy array."""
-    buf = BytesIO()
-    fig.savefig(buf, format='png', dpi=fig.dpi, bbox_inches='tight', pad_inches=0)
-    buf.seek(0)
-    img = Image.open(buf)
-    return np.array(img.convert('RGB'))
+
+import profiling
+from audio_io import load_audio
+from batch_runner import default_jobs, run_batch
+from midi_onsets import MIDI_DIR, Onsets, as_onsets, groove_midi, overlay_colors, window_onsets
+from ffmpeg_render import concat_videos, render_sections_video, sawtooth_cursor_x
+from spectrogram_cache import default_cache
+from spectrogram_raster import burn_vlines, colorize, draw_label
 
 # ==========================================
 # 1. Configuration & Constants
@@ -55,11 +47,16 @@ class VizConfig:
     DPI = 100
     FPS = 30
     COLORMAP = 'magma'      # Perceptually uniform, good for dark backgrounds
+    RENDERER = 'raster'     # 'raster' (direct colormap lookup) or 'matplotlib' (specshow)
     
     # Cursor Params
     CURSOR_COLOR = (255, 255, 255) # White
     CURSOR_WIDTH = 4        # Pixels
     CURSOR_ALPHA = 0.8      # Opacity
+    
+    # MIDI Onset Overlay
+    MIDI_DIR = MIDI_DIR     # Groove .mid files (onsets read via their .notes.bin index)
+    ONSET_ALPHA = 0.3
 
 # ==========================================
 # 2. Signal Processing Engine
@@ -75,8 +72,8 @@ class AudioEngine:
         Loads audio, resamples, and pads/trims to exact duration.
         """
         try:
-            # Load with Librosa (handles resampling)
-            y, sr = librosa.load(filepath, sr=target_sr)
+            # Read only the first `duration` seconds (resamples only if the rate differs)
+            y, sr = load_audio(filepath, sr=target_sr, duration=duration)
             
             # Calculate target samples
             target_samples = int(target_sr * duration)
@@ -104,22 +101,30 @@ class AudioEngine:
         Computes the Log-Mel Spectrogram.
         """
         # 1. Compute Mel Spectrogram
-        S = librosa.feature.melspectrogram(
-            y=y, 
-            sr=sr, 
-            n_fft=config.N_FFT, 
-            hop_length=config.HOP_LENGTH, 
-            n_mels=config.N_MELS,
-            fmin=config.FMIN, 
-            fmax=config.FMAX
-        )
+        with profiling.stage('mel'):
+            S = librosa.feature.melspectrogram(
+                y=y, 
+                sr=sr, 
+                n_fft=config.N_FFT, 
+                hop_length=config.HOP_LENGTH, 
+                n_mels=config.N_MELS,
+                fmin=config.FMIN, 
+                fmax=config.FMAX
+            )
         
-        # 2. Convert to Decibels (Log Scale)
-        # We use top_db=80 to visualize the noise floor clearly
-        S_db = librosa.power_to_db(S, ref=np.max, top_db=80)
+            # 2. Convert to Decibels (Log Scale)
+            # We use top_db=80 to visualize the noise floor clearly
+            S_db = librosa.power_to_db(S, ref=np.max, top_db=80)
         
         return S_db
 
+    @staticmethod
+    def cache_params(sr, config):
+        """Everything that determines a segment's mel spectrogram, as keyed in the spectrogram cache."""
+        return {'kind': 'mel_db', 'sr': sr, 'duration': config.DURATION_PER_CLIP, 'n_fft': config.N_FFT,
+                'hop_length': config.HOP_LENGTH, 'n_mels': config.N_MELS, 'fmin': config.FMIN,
+                'fmax': config.FMAX, 'top_db': 80, 'normalize': 0.9}
+
 # ==========================================
 # 3. Visualization Renderer (Matplotlib)
 # ==========================================
@@ -135,7 +140,18 @@ class FrameRenderer:
         """
         Draws the spectrogram and overlays text/MIDI grid.
         Returns a NumPy array representing the RGB image.
+
+        midi_overlays: onset times in seconds (cyan lines), or a midi_onsets.Onsets
+        whose lines are coloured by drum class.
         """
+        if self.config.RENDERER == 'raster':
+            return self.render_spectrogram_raster(S_db, label_text, midi_overlays)
+
+        # Matplotlib is only loaded for this renderer
+        import librosa.display
+        import matplotlib.pyplot as plt
+        from figure_utils import figure_to_array
+
         # Calculate Figure Size in Inches
         w_in = self.config.RESOLUTION[0] / self.config.DPI
         h_in = self.config.RESOLUTION[1] / self.config.DPI
@@ -144,17 +160,18 @@ class FrameRenderer:
         ax = fig.add_axes([0, 0, 1, 1]) # Full bleed, no margins
         
         # Render Spectrogram
-        img = librosa.display.specshow(
-            S_db, 
-            sr=self.config.SR, 
-            hop_length=self.config.HOP_LENGTH, 
-            x_axis='time', 
-            y_axis='mel', 
-            fmin=self.config.FMIN, 
-            fmax=self.config.FMAX,
-            cmap=self.config.COLORMAP,
-            ax=ax
-        )
+        with profiling.stage('specshow'):
+            img = librosa.display.specshow(
+                S_db, 
+                sr=self.config.SR, 
+                hop_length=self.config.HOP_LENGTH, 
+                x_axis='time', 
+                y_axis='mel', 
+                fmin=self.config.FMIN, 
+                fmax=self.config.FMAX,
+                cmap=self.config.COLORMAP,
+                ax=ax
+            )
         
         # Overlay Label (e.g., "CFG Scale: 2.0")
         # We use Matplotlib text here for better positioning relative to data
@@ -169,20 +186,50 @@ class FrameRenderer:
             bbox=dict(facecolor='black', alpha=0.5, edgecolor='none')
         )
 
-        # Optional: Overlay MIDI Grid if provided
-        if midi_overlays:
-            # midi_overlays should be a list of onset times in seconds
-            for onset in midi_overlays:
-                ax.axvline(x=onset, color='cyan', linestyle='--', alpha=0.3, linewidth=1)
+        # Optional: Overlay MIDI Grid if provided, all lines in one collection
+        if midi_overlays is not None:
+            onsets = as_onsets(midi_overlays)
+            colors = overlay_colors(onsets, by_class=isinstance(midi_overlays, Onsets)) / 255.0
+            ax.vlines(onsets.times, 0, 1, transform=ax.get_xaxis_transform(), colors=colors,
+                      linestyles='--', alpha=self.config.ONSET_ALPHA, linewidth=1)
 
         ax.axis('off') # Hide axes
         
-        # Convert to NumPy Image (RGB)
-        image_np = mplfig_to_npimage(fig)
+        # Read the Agg buffer directly at the exact resolution (no PNG round trip)
+        with profiling.stage('figure_draw'):
+            image_np = figure_to_array(fig, size=self.config.RESOLUTION)
         plt.close(fig)
         
         return image_np
 
+    def render_spectrogram_raster(self, S_db, label_text, midi_overlays=None):
+        """
+        Same image as the matplotlib path, built directly from the colormap
+        lookup table at the target resolution.
+        """
+        w, h = self.config.RESOLUTION
+        image = colorize(
+            S_db, (w, h),
+            y_axis='mel',
+            sr=self.config.SR,
+            fmin=self.config.FMIN,
+            fmax=self.config.FMAX,
+            cmap=self.config.COLORMAP
+        )
+
+        # Optional: Overlay MIDI Grid if provided, burned in with one vectorized blend
+        if midi_overlays is not None:
+            onsets = as_onsets(midi_overlays)
+            n_frames = S_db.shape[1]
+            frames = onsets.times * self.config.SR / self.config.HOP_LENGTH
+            xs = (frames + 0.5) / n_frames * w
+            burn_vlines(image, xs, color=overlay_colors(onsets, by_class=isinstance(midi_overlays, Onsets)),
+                        alpha=self.config.ONSET_ALPHA, width=1, dash=(4, 2))
+
+        # 24pt label at DPI 100, like the matplotlib text
+        font_px = int(round(24 * self.config.DPI / 72))
+        return draw_label(image, label_text, xy=(0.02, 0.05), font_size=font_px)
+
 # ==========================================
 # 4. Animation Orchestrator (MoviePy)
 # ==========================================
@@ -196,9 +243,10 @@ class AnimationOrchestrator:
         self.audio_engine = AudioEngine()
         self.renderer = FrameRenderer(config)
 
-    def create_segment(self, audio_path, label, midi_data=None):
+    def prepare_segment(self, audio_path, label, midi_data=None):
         """
-        Creates a single 2.5s Audio-Visual segment.
+        Loads the audio of a 2.5s segment and renders its background image.
+        Returns (audio samples, sample rate, RGB image).
         """
         print(f"Processing Segment: {label}")
         
@@ -209,20 +257,46 @@ class AnimationOrchestrator:
             self.config.DURATION_PER_CLIP
         )
         
-        # 2. Compute Spectrogram
-        S_db = self.audio_engine.compute_mel_spectrogram(y, sr, self.config)
+        # 2. Compute Spectrogram (or reuse it from the on-disk cache)
+        compute = lambda: self.audio_engine.compute_mel_spectrogram(y, sr, self.config)
+        if os.path.exists(audio_path):
+            S_db = default_cache().get_or_compute(audio_path, self.audio_engine.cache_params(sr, self.config), compute)
+        else:
+            S_db = compute()
         
         # 3. Render Background Image
         bg_image = self.renderer.render_spectrogram_image(S_db, label, midi_data)
+        return y, sr, bg_image
+
+    def midi_overlay(self, audio_path, by_class=False):
+        """
+        Onsets of the groove MIDI of audio_path inside the segment window
+        (the first DURATION_PER_CLIP seconds), or None if it has no MIDI.
+        Plain onset times draw cyan lines; by_class keeps the drum classes.
+        """
+        midi_path = groove_midi(audio_path, self.config.MIDI_DIR)
+        if midi_path is None:
+            print(f"Warning: no groove MIDI for {audio_path}; rendering without onsets.")
+            return None
+        onsets = window_onsets(midi_path, 0.0, self.config.DURATION_PER_CLIP)
+        print(f"MIDI overlay: {len(onsets.times)} onsets from {midi_path}")
+        return onsets if by_class else onsets.times
+
+    def create_segment(self, audio_path, label, midi_data=None):
+        """
+        Creates a single 2.5s Audio-Visual segment.
+        """
+        from moviepy import ImageClip
+        from moviepy.audio.AudioClip import AudioArrayClip
+
+        y, sr, bg_image = self.prepare_segment(audio_path, label, midi_data)
         
         # 4. Create Video Clip from Image
         video_clip = ImageClip(bg_image).with_duration(self.config.DURATION_PER_CLIP)
         
         # 5. Attach Audio
-        # We write a temp file to ensure FFmpeg compatibility
-        temp_wav = os.path.join(tempfile.gettempdir(), f"temp_{label.replace(' ', '_')}.wav")
-        sf.write(temp_wav, y, sr)
-        audio_clip = AudioFileClip(temp_wav)
+        # Straight from the NumPy buffer: no temp WAV, so concurrent renders can't collide
+        audio_clip = AudioArrayClip(np.asarray(y, dtype=np.float32)[:, None], fps=sr)
         
         video_clip = video_clip.with_audio(audio_clip)
         
@@ -232,6 +306,7 @@ class AnimationOrchestrator:
         """
         Concatenates segments into a single timeline.
         """
+        from moviepy import concatenate_videoclips
         return concatenate_videoclips(clips, method="compose")
 
     def add_cursor_overlay(self, base_video):
@@ -240,6 +315,8 @@ class AnimationOrchestrator:
         Crucial Logic: The cursor resets every 2.5 seconds to indicate 
         that we are viewing a specific 2.5s window of data.
         """
+        from moviepy import CompositeVideoClip, ImageClip
+
         # Create a vertical line clip
         cursor_surface = np.zeros(
             (self.config.RESOLUTION[1], self.config.CURSOR_WIDTH, 4), 
@@ -268,26 +345,103 @@ class AnimationOrchestrator:
         final_video = CompositeVideoClip([base_video, cursor_clip])
         return final_video
 
+    def render_ffmpeg(self, files, output_path, midi_data=None, fps=30):
+        """
+        Renders the same video as the moviepy path in a single ffmpeg filtergraph:
+        segment images as looped stills, audio piped in, cursor as an overlay
+        whose x position is a sawtooth expression in t.
+        """
+        audio, sections = [], []
+        for f in files:
+            y, sr, bg_image = self.prepare_segment(f['path'], f['label'], midi_data)
+            audio.append(y)
+            sections.append((bg_image, self.config.DURATION_PER_CLIP))
+        
+        print(f"Rendering final composition to {output_path} (ffmpeg)...")
+        render_sections_video(
+            sections,
+            np.concatenate(audio),
+            self.config.SR,
+            output_path,
+            cursor_x=sawtooth_cursor_x(self.config.RESOLUTION[0], self.config.DURATION_PER_CLIP),
+            fps=fps,
+            cursor_color=self.config.CURSOR_COLOR,
+            cursor_width=self.config.CURSOR_WIDTH,
+            cursor_alpha=self.config.CURSOR_ALPHA
+        )
+
+    def render_segment_file(self, audio_path, segment_path, label, midi_data=None, fps=30):
+        """
+        Renders and encodes one segment (video only) on its own and returns
+        its audio samples. The cursor sawtooth resets every DURATION_PER_CLIP,
+        so a segment starting at t=0 is exactly its slice of the full video.
+        """
+        y, sr, bg_image = self.prepare_segment(audio_path, label, midi_data)
+        render_sections_video(
+            [(bg_image, self.config.DURATION_PER_CLIP)],
+            None,  # video only; the audio track is encoded once after the concat
+            sr,
+            segment_path,
+            cursor_x=sawtooth_cursor_x(self.config.RESOLUTION[0], self.config.DURATION_PER_CLIP),
+            fps=fps,
+            cursor_color=self.config.CURSOR_COLOR,
+            cursor_width=self.config.CURSOR_WIDTH,
+            cursor_alpha=self.config.CURSOR_ALPHA
+        )
+        return y
+
+    def render_parallel(self, files, output_path, midi_data=None, fps=30, n_jobs=None):
+        """
+        Renders and encodes each segment in its own worker process, then joins
+        the encoded segments with a stream-copy concat (no video re-encode)
+        and adds the audio track in the same pass.
+        """
+        with tempfile.TemporaryDirectory(prefix='midiff_segments_') as tmp:
+            jobs = [
+                (f['path'], os.path.join(tmp, f"segment_{i:03d}.mp4"), f['label'], midi_data, fps)
+                for i, f in enumerate(files)
+            ]
+            outcomes = run_batch(render_segment_worker, jobs, n_jobs=n_jobs, title="Rendering segments")
+            if any(error is not None for _, _, error in outcomes):
+                raise RuntimeError("Segment rendering failed; see errors above")
+            audio = np.concatenate([result for _, result, _ in outcomes])
+            concat_videos([job[1] for job in jobs], output_path, audio=audio, sr=self.config.SR)
+
     def render(self, output_path, fps=30):
         print(f"Rendering final composition to {output_path}...")
-        self.final_composition.write_videofile(
-            output_path, 
-            fps=fps, 
-            codec='libx264', 
-            audio_codec='aac',
-            bitrate="8000k", # High bitrate for sharp spectrograms
-            preset='medium',
-            threads=4
-        )
+        # moviepy muxes audio through a temp file named after the output;
+        # a private directory keeps concurrent renders apart
+        with profiling.stage('moviepy_encode', path=output_path):
+            with tempfile.TemporaryDirectory(prefix='midiff_render_') as tmp:
+                self.final_composition.write_videofile(
+                    output_path, 
+                    fps=fps, 
+                    codec='libx264', 
+                    audio_codec='aac',
+                    bitrate="8000k", # High bitrate for sharp spectrograms
+                    preset='medium',
+                    threads=4,
+                    temp_audiofile_path=tmp
+                )
+
+def render_segment_worker(audio_path, segment_path, label, midi_data=None, fps=30):
+    """Process-pool entry point: render one segment file with a fresh orchestrator."""
+    return AnimationOrchestrator(VizConfig()).render_segment_file(
+        audio_path, segment_path, label, midi_data, fps
+    )
 
 # ==========================================
 # 5. Execution Logic
 # ==========================================
 
-def run_pipeline():
+def run_pipeline(backend='ffmpeg', output_path="cfg_analysis_comparison.mp4", parallel=False, n_jobs=None,
+                 midi=True, midi_colors=False):
     """
     Main entry point. 
     Generates comparison video for CFG ablation study.
+    backend='ffmpeg' encodes through one filtergraph; 'moviepy' composites frames in Python.
+    parallel=True encodes every segment in its own process (ffmpeg) and concatenates them.
+    midi=True overlays the groove's MIDI onsets; midi_colors colours them by drum class.
     """
     
     # --- CFG Audio Files ---
@@ -302,23 +456,28 @@ def run_pipeline():
         {'path': f"{cfg_folder}/w_3.0/{audio_filename}", 'label': 'CFG w=3.0'},
     ]
     
-    # Optional: If you have midi onset times (in seconds) for the 2.5s clip
-    # midi_data = [0.1, 0.6, 1.2, 1.8] 
-    midi_data = None 
-    
     # --- PIPELINE ---
     config = VizConfig()
     orchestrator = AnimationOrchestrator(config)
     
+    # Every segment shows the same window of the same groove: one onset lookup
+    midi_data = orchestrator.midi_overlay(audio_filename, by_class=midi_colors) if midi else None
+    
+    if backend == 'ffmpeg' or parallel:
+        for f in files:
+            if not os.path.exists(f['path']):
+                print(f"Warning: {f['path']} not found. Using silence for demo.")
+        if parallel:
+            orchestrator.render_parallel(files, output_path, midi_data, fps=config.FPS, n_jobs=n_jobs)
+        else:
+            orchestrator.render_ffmpeg(files, output_path, midi_data, fps=config.FPS)
+        return
+    
     clips = []
     for f in files:
-        # Check if file exists to avoid crashes
+        # Missing files render as silence (load_and_prep falls back to zeros)
         if not os.path.exists(f['path']):
-            print(f"Warning: {f['path']} not found. Generating silence for demo.")
-            # Generate dummy silence file
-            sr = 16000
-            dummy = np.zeros(int(sr * 2.5))
-            sf.write(f['path'], dummy, sr)
+            print(f"Warning: {f['path']} not found. Using silence for demo.")
             
         segment = orchestrator.create_segment(f['path'], f['label'], midi_data)
         clips.append(segment)
@@ -329,7 +488,26 @@ def run_pipeline():
     orchestrator.final_composition = orchestrator.add_cursor_overlay(base_timeline)
     
     # Render
-    orchestrator.render("cfg_analysis_comparison.mp4")
+    orchestrator.render(output_path)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Render the CFG comparison video.")
+    parser.add_argument('--backend', choices=['ffmpeg', 'moviepy'], default='ffmpeg',
+                        help="ffmpeg: single filtergraph encode (default); moviepy: per-frame compositing")
+    parser.add_argument('-o', '--output', default="cfg_analysis_comparison.mp4")
+    parser.add_argument('--parallel', action='store_true',
+                        help="Encode each segment in its own process and join them without re-encoding")
+    parser.add_argument('-j', '--jobs', type=int, default=default_jobs(),
+                        help="Worker processes for --parallel (default: all cores)")
+    parser.add_argument('--no-midi', action='store_true', help="Don't overlay the groove's MIDI onsets")
+    parser.add_argument('--midi-colors', action='store_true', help="Colour MIDI onsets by drum class")
+    profiling.add_profile_argument(parser)
+    args = parser.parse_args(argv)
+    profiling.start(args.profile)
+    run_pipeline(backend=args.backend, output_path=args.output,
+                 parallel=args.parallel, n_jobs=args.jobs,
+                 midi=not args.no_midi, midi_colors=args.midi_colors)
+    return 0
 
 if __name__ == "__main__":
-    run_pipeline()
\ No newline at end of file
+    raise SystemExit(main())
\ No newline at end of file
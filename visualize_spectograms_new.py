@@ -6,29 +6,18 @@ Generates a 10-second video with a single composite spectrogram background.
 Active sections are highlighted ("bolded") while others are dimmed.
 """
 
+import argparse
 import os
 import tempfile
 import numpy as np
 import librosa
-import librosa.display
-import matplotlib.pyplot as plt
-import soundfile as sf
-from moviepy import (
-    AudioFileClip, ImageClip, CompositeVideoClip, 
-    TextClip, concatenate_videoclips
-)
-from io import BytesIO
-from PIL import Image
 
-def mplfig_to_npimage(fig, target_size=None):
-    """Convert matplotlib figure to numpy array with exact target size."""
-    buf = BytesIO()
-    fig.savefig(buf, format='png', dpi=fig.dpi, bbox_inches='tight', pad_inches=0)
-    buf.seek(0)
-    img = Image.open(buf)
-    if target_size:
-        img = img.resize(target_size, Image.LANCZOS)
-    return np.array(img.convert('RGB'))
+import profiling
+from audio_io import load_audio
+from ffmpeg_render import linear_cursor_x, render_sections_video
+from midi_onsets import MIDI_DIR, Onsets, as_onsets, groove_midi, overlay_colors, window_onsets
+from spectrogram_cache import default_cache
+from spectrogram_raster import burn_vlines, colorize, draw_label
 
 # ==========================================
 # 1. Configuration & Constants
@@ -49,6 +38,7 @@ class VizConfig:
     DPI = 100
     FPS = 30
     COLORMAP = 'magma'      
+    RENDERER = 'raster'     # 'raster' (direct colormap lookup) or 'matplotlib' (specshow)
     
     # UI Elements
     CURSOR_COLOR = (255, 255, 255) 
@@ -60,6 +50,10 @@ class VizConfig:
     
     # Dimming factor for inactive sections
     DIM_FACTOR = 0.35
+    
+    # MIDI Onset Overlay
+    MIDI_DIR = MIDI_DIR
+    ONSET_ALPHA = 0.3
 
 # ==========================================
 # 2. Signal Processing Engine
@@ -76,15 +70,13 @@ class AudioEngine:
         
         for i, f in enumerate(files):
             try:
-                y, _ = librosa.load(f['path'], sr=config.SR)
-                start_sample = int(i * config.CLIP_DURATION * config.SR)
-                end_sample = start_sample + samples_per_clip
-                
-                if end_sample <= len(y):
-                    y_slice = y[start_sample:end_sample]
-                else:
-                    available = y[start_sample:] if start_sample < len(y) else np.array([])
-                    y_slice = np.pad(available, (0, samples_per_clip - len(available)))
+                # Seek straight to this clip's window instead of decoding the whole file
+                y_slice, _ = load_audio(f['path'], sr=config.SR,
+                                        offset=i * config.CLIP_DURATION,
+                                        duration=config.CLIP_DURATION)
+                y_slice = y_slice[:samples_per_clip]
+                if len(y_slice) < samples_per_clip:
+                    y_slice = np.pad(y_slice, (0, samples_per_clip - len(y_slice)))
                 
                 stitched_audio.append(y_slice)
                 print(f"  {f['label']}: {i * config.CLIP_DURATION:.1f}s - {(i+1) * config.CLIP_DURATION:.1f}s")
@@ -103,34 +95,77 @@ class FrameRenderer:
     def __init__(self, config):
         self.config = config
 
-    def render_composite_spectrogram(self, y_full):
+    def composite_db(self, y_full, sources=None):
+        """
+        dB STFT of the stitched audio. With the source paths (clip i is
+        [i, i + 1) * CLIP_DURATION of sources[i]) it is kept in the on-disk cache.
+        """
+        def compute():
+            D = librosa.stft(y_full, n_fft=self.config.N_FFT, hop_length=self.config.HOP_LENGTH)
+            return librosa.amplitude_to_db(np.abs(D), ref=np.max)
+        
+        if not sources or not all(os.path.exists(s) for s in sources):
+            return compute()
+        params = {'kind': 'stft_db', 'sr': self.config.SR, 'n_fft': self.config.N_FFT,
+                  'hop_length': self.config.HOP_LENGTH, 'window': 'hann', 'center': True,
+                  'stitch': 'consecutive', 'clip_duration': self.config.CLIP_DURATION}
+        return default_cache().get_or_compute(list(sources), params, compute)
+
+    def render_composite_spectrogram(self, y_full, midi_overlays=None, sources=None):
         """
         Renders the full 10s STFT spectrogram to exact resolution.
+        midi_overlays: onset times in seconds (cyan lines), or a midi_onsets.Onsets
+        whose lines are coloured by drum class. sources: the stitched files, for the cache.
         """
         w, h = self.config.RESOLUTION
         w_in = w / self.config.DPI
         h_in = h / self.config.DPI
         
         # Compute STFT
-        D = librosa.stft(y_full, n_fft=self.config.N_FFT, hop_length=self.config.HOP_LENGTH)
-        S_db = librosa.amplitude_to_db(np.abs(D), ref=np.max)
+        S_db = self.composite_db(y_full, sources)
+        
+        onsets = None if midi_overlays is None else as_onsets(midi_overlays)
+        colors = None if onsets is None else overlay_colors(onsets, by_class=isinstance(midi_overlays, Onsets))
+        
+        if self.config.RENDERER == 'raster':
+            # Pixels straight from the colormap lookup table, already at (w, h)
+            image = colorize(S_db, (w, h), y_axis='log', sr=self.config.SR,
+                             n_fft=self.config.N_FFT, cmap=self.config.COLORMAP)
+            if onsets is not None:
+                frames = onsets.times * self.config.SR / self.config.HOP_LENGTH
+                burn_vlines(image, (frames + 0.5) / S_db.shape[1] * w, color=colors,
+                            alpha=self.config.ONSET_ALPHA, width=1, dash=(4, 2))
+            return image
         
+        # Matplotlib is only loaded for this renderer
+        import librosa.display
+        import matplotlib.pyplot as plt
+        from figure_utils import figure_to_array
+
         fig = plt.figure(figsize=(w_in, h_in), dpi=self.config.DPI)
         ax = fig.add_axes([0, 0, 1, 1])
         
-        librosa.display.specshow(
-            S_db, 
-            sr=self.config.SR, 
-            hop_length=self.config.HOP_LENGTH, 
-            x_axis='time', 
-            y_axis='log', 
-            cmap=self.config.COLORMAP,
-            ax=ax
-        )
+        with profiling.stage('specshow'):
+            librosa.display.specshow(
+                S_db, 
+                sr=self.config.SR, 
+                hop_length=self.config.HOP_LENGTH, 
+                x_axis='time', 
+                y_axis='log', 
+                cmap=self.config.COLORMAP,
+                ax=ax
+            )
+        
+        if onsets is not None:
+            # Every onset line in one collection
+            ax.vlines(onsets.times, 0, 1, transform=ax.get_xaxis_transform(), colors=colors / 255.0,
+                      linestyles='--', alpha=self.config.ONSET_ALPHA, linewidth=1)
         
         ax.axis('off')
         
-        image_np = mplfig_to_npimage(fig, target_size=(w, h))
+        # Agg buffer at exactly (w, h): no PNG round trip, no resample
+        with profiling.stage('figure_draw'):
+            image_np = figure_to_array(fig, size=(w, h))
         plt.close(fig)
         
         return image_np
@@ -163,14 +198,31 @@ class AnimationOrchestrator:
         self.audio_engine = AudioEngine()
         self.renderer = FrameRenderer(config)
 
-    def create_composite_video(self, files):
+    def midi_overlay(self, audio_path, by_class=False):
+        """
+        Onsets of the groove MIDI of audio_path over the whole composite
+        (clip i is the groove's [i, i + 1) * CLIP_DURATION window), or None.
+        Plain onset times draw cyan lines; by_class keeps the drum classes.
+        """
+        midi_path = groove_midi(audio_path, self.config.MIDI_DIR)
+        if midi_path is None:
+            print(f"Warning: no groove MIDI for {audio_path}; rendering without onsets.")
+            return None
+        onsets = window_onsets(midi_path, 0.0, self.config.TOTAL_DURATION)
+        print(f"MIDI overlay: {len(onsets.times)} onsets from {midi_path}")
+        return onsets if by_class else onsets.times
+
+    def create_composite_video(self, files, midi_data=None):
+        from moviepy import CompositeVideoClip, ImageClip, TextClip, concatenate_videoclips
+        from moviepy.audio.AudioClip import AudioArrayClip
+
         # 1. Load and stitch audio
         print("Loading audio clips...")
         y_full, audio_clips = self.audio_engine.load_and_stitch(files, self.config)
         
         # 2. Render full spectrogram
         print("Rendering composite spectrogram...")
-        base_img = self.renderer.render_composite_spectrogram(y_full)
+        base_img = self.renderer.render_composite_spectrogram(y_full, midi_data, [f['path'] for f in files])
         
         # 3. Create state-based clips
         print("Creating video clips...")
@@ -200,10 +252,8 @@ class AnimationOrchestrator:
         # 4. Concatenate
         final_video = concatenate_videoclips(clips)
         
-        # 5. Add audio
-        temp_wav = os.path.join(tempfile.gettempdir(), "temp_stitched.wav")
-        sf.write(temp_wav, y_full, self.config.SR)
-        audio_track = AudioFileClip(temp_wav)
+        # 5. Add audio (in memory: no shared temp WAV between concurrent renders)
+        audio_track = AudioArrayClip(np.asarray(y_full, dtype=np.float32)[:, None], fps=self.config.SR)
         final_video = final_video.with_audio(audio_track)
         
         # 6. Add cursor
@@ -223,11 +273,55 @@ class AnimationOrchestrator:
         final_output = CompositeVideoClip([final_video, cursor_clip], size=(w, h))
         return final_output
 
+    def render_composite_ffmpeg(self, files, output_path, midi_data=None):
+        """
+        Renders the composite video in a single ffmpeg filtergraph: the state
+        images (labels burned in) become looped stills, the stitched audio is
+        piped in and the cursor is an overlay moving linearly with t.
+        """
+        print("Loading audio clips...")
+        y_full, _ = self.audio_engine.load_and_stitch(files, self.config)
+        
+        print("Rendering composite spectrogram...")
+        base_img = self.renderer.render_composite_spectrogram(y_full, midi_data, [f['path'] for f in files])
+        
+        w, h = self.config.RESOLUTION
+        sections = []
+        for i, file_info in enumerate(files):
+            state_img = self.renderer.create_state_image(base_img, i, self.config.NUM_CLIPS)
+            # Label box centered, 50px from the top, like the TextClip
+            state_img = draw_label(
+                state_img, file_info['label'],
+                xy=(0.0, 50 / h),
+                font_size=self.config.TEXT_SIZE,
+                bg_alpha=1.0,
+                padding=0,
+                center_x=True
+            )
+            sections.append((state_img, self.config.CLIP_DURATION))
+        
+        print("Writing video file (ffmpeg)...")
+        render_sections_video(
+            sections,
+            y_full,
+            self.config.SR,
+            output_path,
+            cursor_x=linear_cursor_x(w, self.config.TOTAL_DURATION),
+            fps=self.config.FPS,
+            cursor_color=self.config.CURSOR_COLOR,
+            cursor_width=self.config.CURSOR_WIDTH,
+            cursor_alpha=200 / 255
+        )
+
 # ==========================================
 # 5. Execution Logic
 # ==========================================
 
-def run_pipeline():
+def run_pipeline(backend='ffmpeg', output_path="cfg_composite_analysis_16k.mp4", midi=True, midi_colors=False):
+    """
+    backend='ffmpeg' encodes through one filtergraph; 'moviepy' composites frames in Python.
+    midi=True overlays the groove's MIDI onsets; midi_colors colours them by drum class.
+    """
     cfg_folder = "static/audio/midi_conditioned/cfg"
     baseline_folder = "static/audio/baseline/version_83/enhancement/use_midi=False_epoch_50"
     audio_filename = "drummer1_1_funk-groove1_138_beat_4-4_bluebird.wav"
@@ -241,17 +335,40 @@ def run_pipeline():
     
     config = VizConfig()
     orchestrator = AnimationOrchestrator(config)
+    midi_data = orchestrator.midi_overlay(audio_filename, by_class=midi_colors) if midi else None
+    
+    if backend == 'ffmpeg':
+        orchestrator.render_composite_ffmpeg(file_list, output_path, midi_data)
+        return
     
-    video = orchestrator.create_composite_video(file_list)
+    video = orchestrator.create_composite_video(file_list, midi_data)
     
     print("Writing video file...")
-    video.write_videofile(
-        "cfg_composite_analysis_16k.mp4", 
-        fps=config.FPS, 
-        codec='libx264', 
-        audio_codec='aac',
-        bitrate='8000k'
-    )
+    # Private directory for moviepy's temp audio file, so concurrent renders don't collide
+    with profiling.stage('moviepy_encode', path=output_path):
+        with tempfile.TemporaryDirectory(prefix='midiff_render_') as tmp:
+            video.write_videofile(
+                output_path, 
+                fps=config.FPS, 
+                codec='libx264', 
+                audio_codec='aac',
+                bitrate='8000k',
+                temp_audiofile_path=tmp
+            )
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Render the composite CFG spectrogram video.")
+    parser.add_argument('--backend', choices=['ffmpeg', 'moviepy'], default='ffmpeg',
+                        help="ffmpeg: single filtergraph encode (default); moviepy: per-frame compositing")
+    parser.add_argument('-o', '--output', default="cfg_composite_analysis_16k.mp4")
+    parser.add_argument('--no-midi', action='store_true', help="Don't overlay the groove's MIDI onsets")
+    parser.add_argument('--midi-colors', action='store_true', help="Colour MIDI onsets by drum class")
+    profiling.add_profile_argument(parser)
+    args = parser.parse_args(argv)
+    profiling.start(args.profile)
+    run_pipeline(backend=args.backend, output_path=args.output,
+                 midi=not args.no_midi, midi_colors=args.midi_colors)
+    return 0
 
 if __name__ == "__main__":
-    run_pipeline()
+    raise SystemExit(main())